@@ -4,10 +4,11 @@ import json
 import logging
 from typing import List, Dict
 
-from requests_oauthlib import OAuth1Session
-from openai import AsyncOpenAI
 from dotenv import load_dotenv
 
+from framework.twitter_client import TwitterError, get_twitter_client
+from framework import llm_gateway
+
 # Load environment variables from .env file (if using one)
 load_dotenv()
 
@@ -16,7 +17,6 @@ logging.basicConfig(level=logging.INFO)  # Change to DEBUG for more detailed log
 logger = logging.getLogger(__name__)
 
 # Constants
-PERSONALIZED_TRENDS_URL = "https://api.twitter.com/2/users/{id}/personalized_trends"  # Replace {id} with actual user ID
 MAX_TRENDS = 50  # Maximum number of trends to fetch
 
 class TrendFetchError(Exception):
@@ -51,26 +51,16 @@ async def fetch_personalized_trends_oauth1(
         TrendFetchError: If there's an issue fetching or parsing the trends.
     """
     try:
-        # Create OAuth1 session
-        oauth = OAuth1Session(
-            client_key=api_key,
-            client_secret=api_secret,
-            resource_owner_key=access_token,
-            resource_owner_secret=access_token_secret,
-        )
-
-        # Construct the personalized trends URL with the user ID
-        url = PERSONALIZED_TRENDS_URL.format(id=user_id)
-
-        # Make the GET request to fetch personalized trends
-        response = oauth.get(url)
-
-        if response.status_code != 200:
-            error_data = response.json() if response.text else {}
-            logger.error(f"Failed to fetch personalized trends: {response.status_code} {error_data}")
-            raise TrendFetchError(f"Failed to fetch personalized trends: {response.status_code} {error_data}")
-
-        data = response.json()
+        client = get_twitter_client((api_key, api_secret, access_token, access_token_secret))
+
+        # Fetch personalized trends for the user over the shared connection pool
+        try:
+            data = await client.get_personalized_trends(user_id)
+        except TwitterError as e:
+            if e.status_code is None:
+                raise
+            logger.error(f"Failed to fetch personalized trends: {e.status_code} {e.details.get('error_data')}")
+            raise TrendFetchError(f"Failed to fetch personalized trends: {e.status_code} {e.details.get('error_data')}") from e
         logger.debug(f"Raw response data: {json.dumps(data, indent=2)}")  # For debugging
 
         trends = data.get('data', [])
@@ -95,6 +85,8 @@ async def fetch_personalized_trends_oauth1(
         logger.info(f"Fetched {len(validated_trends)} personalized trends.")
         return validated_trends
 
+    except TrendFetchError:
+        raise
     except Exception as e:
         logger.error(f"Unexpected error while fetching personalized trends: {e}")
         raise TrendFetchError(f"Unexpected error: {e}") from e
@@ -113,8 +105,6 @@ async def generate_trend_thoughts(trends: List[Dict[str, any]], openai_api_key:
     Raises:
         LLMGenerationError: If there's an issue generating the thoughts.
     """
-    openai_client = AsyncOpenAI(api_key=openai_api_key)
-
     try:
         # Prepare the trends summary
         trends_summary = "\n".join([
@@ -133,7 +123,8 @@ async def generate_trend_thoughts(trends: List[Dict[str, any]], openai_api_key:
         )
 
         # Generate the completion using OpenAI's GPT-4
-        completion = await openai_client.chat.completions.create(
+        completion = await llm_gateway.chat(
+            api_key=openai_api_key,
             model="gpt-4",
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -6,7 +6,7 @@ import json
 import re
 from datetime import datetime
 import numpy as np
-from openai import AsyncOpenAI
+from framework import llm_gateway
 
 async def run(state, memory):
     """
@@ -17,9 +17,7 @@ async def run(state, memory):
     try:
         print("\n--- Starting 'Create New Activity' Process ---")
 
-        # Initialize OpenAI client
-        client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-        if not client.api_key:
+        if not os.getenv('OPENAI_API_KEY'):
             error_message = "Error: OpenAI API key not found. Please set the OPENAI_API_KEY environment variable."
             print(error_message)
             return error_message
@@ -49,7 +47,7 @@ Activity Name: <Name>
 Description: <Description>
 """
         print("\nGenerating new activity idea using LLM...")
-        idea_completion = await client.chat.completions.create(
+        idea_completion = await llm_gateway.chat(
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are ChatGPT, an AI that generates creative ideas."},
@@ -95,7 +93,7 @@ Description: <Description>
         # Step 3: Perform embedding search to find top 3 similar activities
         print("\nPerforming embedding search to find top 3 similar existing activities...")
         # Generate embedding for the new activity idea
-        idea_embedding_response = await client.embeddings.create(
+        idea_embedding_response = await llm_gateway.embed(
             input=new_activity_idea,
             model="text-embedding-ada-002"
         )
@@ -108,7 +106,7 @@ Description: <Description>
             activity_file = os.path.join(activities_dir, f"{activity}.py")
             with open(activity_file, 'r') as f:
                 code = f.read()
-            embedding_response = await client.embeddings.create(
+            embedding_response = await llm_gateway.embed(
                 input=code,
                 model="text-embedding-ada-002"
             )
@@ -166,7 +164,7 @@ Provide only the Python code for the new activity.
 """
         print("Code generation prompt prepared.")
 
-        code_completion = await client.chat.completions.create(
+        code_completion = await llm_gateway.chat(
             model="o1-preview",
             messages=[
                 {"role": "system", "content": "You are ChatGPT, an AI that writes Python code based on descriptions and examples."},
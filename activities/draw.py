@@ -3,12 +3,10 @@ import re
 import json
 import time
 import asyncio
-from openai import AsyncOpenAI
-import litellm
-from PIL import Image
-import io
 from pathlib import Path
-import cairosvg
+from framework.executors import run_cpu
+from skills.draw import render_svg_to_jpeg
+from framework import llm_gateway
 
 IMAGES_DIR = Path("static/images")
 IMAGES_DIR.mkdir(parents=True, exist_ok=True)
@@ -19,8 +17,7 @@ async def run(state, memory):
     Description: Pippin creates a whimsical illustration based on a recent memory.
     """
     try:
-        client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-        if not client.api_key:
+        if not os.getenv('OPENAI_API_KEY'):
             print("OpenAI API key not found. Set the OPENAI_API_KEY environment variable.")
             return "Pippin couldn't find his drawing supplies."
 
@@ -40,7 +37,7 @@ async def run(state, memory):
 
         selected_memory = recent_memories[0]
 
-        scene_response = await client.chat.completions.create(
+        scene_response = await llm_gateway.chat(
             model="gpt-4-turbo-preview",
             messages=[
                 {"role": "user", "content": f"""Given this memory, extract the most visually interesting moment that would make a good illustration:
@@ -69,7 +66,7 @@ async def run(state, memory):
 
         Respond only with the SVG code."""
 
-        svg_response = litellm.completion(
+        svg_response = await llm_gateway.litellm_completion(
             model="o1-mini",
             messages=[{"content": svg_prompt, "role": "user"}]
         )
@@ -87,26 +84,9 @@ async def run(state, memory):
 
             timestamp = int(time.time())
             filename = f"pippin_drawing_{timestamp}.jpg"
-            temp_svg = IMAGES_DIR / f"temp_{timestamp}.svg"
-            temp_png = IMAGES_DIR / f"temp_{timestamp}.png"
-
-            print(f"Saving SVG to: {temp_svg}")
-            with open(temp_svg, 'w') as f:
-                f.write(svg_code)
-
-            # Convert SVG to PNG using cairosvg
-            cairosvg.svg2png(url=str(temp_svg), write_to=str(temp_png))
-
-            # Now use PIL to convert PNG to JPEG
-            with Image.open(temp_png) as img:
-                img = img.convert('RGB')
-                filepath = IMAGES_DIR / filename
-                print(f"Saving JPEG to: {filepath}")
-                img.save(filepath, 'JPEG', quality=95)
-
-            # Clean up temporary files
-            temp_svg.unlink(missing_ok=True)
-            temp_png.unlink(missing_ok=True)
+            filepath = IMAGES_DIR / filename
+            print(f"Saving JPEG to: {filepath}")
+            await run_cpu(render_svg_to_jpeg, svg_code, str(filepath))
 
             web_path = f"images/{filename}"
 
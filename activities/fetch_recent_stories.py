@@ -4,6 +4,7 @@ import os
 import base64
 import requests
 from datetime import datetime
+from framework.executors import run_io
 
 async def run(state, memory):
     """
@@ -35,7 +36,7 @@ async def run(state, memory):
     }
 
     try:
-        response = requests.post(token_url, headers=headers, data=data)
+        response = await run_io(requests.post, token_url, headers=headers, data=data, timeout=30)
         response.raise_for_status()
         access_token = response.json().get('access_token')
     except requests.exceptions.RequestException as e:
@@ -60,7 +61,7 @@ async def run(state, memory):
     }
 
     try:
-        response = requests.get(episodes_url, headers=headers, params=params)
+        response = await run_io(requests.get, episodes_url, headers=headers, params=params, timeout=30)
         response.raise_for_status()
         episodes = response.json().get('items', [])
     except requests.exceptions.RequestException as e:
@@ -2,61 +2,22 @@ import asyncio
 import os
 import json
 import random
-from openai import AsyncOpenAI
-from requests_oauthlib import OAuth1Session
+from framework.twitter_client import TwitterError, get_twitter_client
+from framework import llm_gateway
 
 # Set to True to actually post to Twitter, False to skip posting
 ENABLE_TWITTER_POSTING = True
 
-class TwitterError(Exception):
-    """Custom exception for Twitter API errors"""
-    pass
-
 async def post_to_twitter(text: str) -> dict:
     """Post a tweet to Twitter using OAuth 1.0a"""
-    # Get credentials
-    api_key = os.getenv("TWITTER_API_KEY")
-    api_secret = os.getenv("TWITTER_API_KEY_SECRET")
-    access_token = os.getenv("TWITTER_ACCESS_TOKEN")
-    access_token_secret = os.getenv("TWITTER_ACCESS_TOKEN_SECRET")
-
-    if not all([api_key, api_secret, access_token, access_token_secret]):
-        raise TwitterError("Missing required Twitter credentials")
-
-    try:
-        # Create OAuth session
-        oauth = OAuth1Session(
-            client_key=api_key,
-            client_secret=api_secret,
-            resource_owner_key=access_token,
-            resource_owner_secret=access_token_secret,
-        )
-
-        # Post tweet
-        response = oauth.post(
-            "https://api.twitter.com/2/tweets",
-            json={"text": text}
-        )
-
-        if response.status_code != 201:
-            error_data = response.json() if response.text else {}
-            raise TwitterError(f"Failed to post tweet: {error_data}")
-
-        return response.json()
-
-    except Exception as e:
-        if isinstance(e, TwitterError):
-            raise
-        raise TwitterError(f"Error posting tweet: {str(e)}")
+    return await get_twitter_client().post_tweet(text)
 
 async def run(state, memory):
     """
     Activity: Post a Tweet
     Description: Generates a tweet based on recent memories, ensuring variety.
     """
-    # Initialize OpenAI client
-    client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-    if not client.api_key:
+    if not os.getenv('OPENAI_API_KEY'):
         print("OpenAI API key not found. Set the OPENAI_API_KEY environment variable.")
         return
 
@@ -161,7 +122,7 @@ Words to avoid in the tweet:
 Please generate the tweet following the system prompt. Ensure the tweet is less than 140 characters and matches the specified length: **{selected_length}**.
 """
         # Generate the tweet using OpenAI API
-        completion = await client.chat.completions.create(
+        completion = await llm_gateway.chat(
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": system_prompt.strip()},
@@ -2,20 +2,15 @@ import asyncio
 import os
 import json
 import random
-import requests
-from openai import AsyncOpenAI
-from requests_oauthlib import OAuth1Session
+from framework.twitter_client import TwitterError, get_twitter_client
 from skills.generate_pippin_image import generate_pippin_image  # Adjust import path as needed
 from skills.draw import generate_pippin_drawing  # Newly added import
 from skills.gif import generate_animated_unicorn
+from framework import llm_gateway
 
 # Set to True to actually post to Twitter, False to skip posting
 ENABLE_TWITTER_POSTING = True
 
-class TwitterError(Exception):
-    """Custom exception for Twitter API errors"""
-    pass
-
 async def post_to_twitter(text: str) -> dict:
     """Post a tweet to Twitter using OAuth 1.0a, optionally with an image."""
     # Get credentials
@@ -41,7 +36,7 @@ async def post_to_twitter(text: str) -> dict:
         api_key_openai = os.getenv('OPENAI_API_KEY')
         if api_key_openai:
             try:
-                image_path = generate_pippin_image(prompt, api_key_openai, output_path="pippin_scene.png")
+                image_path = await generate_pippin_image(prompt, api_key_openai, output_path="pippin_scene.png")
                 if image_path and os.path.exists(image_path):
                     attach_image = True
                     media_id = await upload_media_to_twitter(api_key, api_secret, access_token, access_token_secret, image_path)
@@ -74,53 +69,17 @@ async def post_to_twitter(text: str) -> dict:
             except Exception as e:
                 print(f"Error generating/uploading GIF: {e}")
 
-    # Create OAuth session for posting tweet
-    oauth = OAuth1Session(
-        client_key=api_key,
-        client_secret=api_secret,
-        resource_owner_key=access_token,
-        resource_owner_secret=access_token_secret,
-    )
-
-    post_payload = {"text": text}
-    if attach_image and media_id:
-        post_payload["media"] = {"media_ids": [media_id]}
-
-    # Post tweet
-    response = oauth.post(
-        "https://api.twitter.com/2/tweets",
-        json=post_payload
-    )
-
-    if response.status_code != 201:
-        error_data = response.json() if response.text else {}
-        raise TwitterError(f"Failed to post tweet: {error_data}")
-
-    return response.json()
+    post_media = [media_id] if attach_image and media_id else None
+    return await get_twitter_client().post_tweet(text, post_media)
 
 async def upload_media_to_twitter(api_key, api_secret, access_token, access_token_secret, image_path):
     """Helper function to upload media to Twitter and return the media_id."""
-    oauth_upload = OAuth1Session(
-        client_key=api_key,
-        client_secret=api_secret,
-        resource_owner_key=access_token,
-        resource_owner_secret=access_token_secret,
-    )
-
-    with open(image_path, 'rb') as f:
-        files = {"media": f}
-        upload_response = oauth_upload.post(
-            "https://upload.twitter.com/1.1/media/upload.json",
-            files=files
-        )
-
-    if upload_response.status_code != 200:
-        print(f"Failed to upload media. Status code: {upload_response.status_code}")
+    try:
+        client = get_twitter_client((api_key, api_secret, access_token, access_token_secret))
+        return await client.upload_media(image_path)
+    except TwitterError as e:
+        print(f"Failed to upload media: {e}")
         return None
-    else:
-        media_data = upload_response.json()
-        media_id = media_data.get("media_id_string")
-        return media_id
 
 async def run(state, memory):
     """
@@ -128,8 +87,7 @@ async def run(state, memory):
     Description: Generates a tweet based on recent memories and posts it.
     Sometimes attaches an image generated by generate_pippin_image, sometimes by generate_pippin_drawing, sometimes none.
     """
-    client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-    if not client.api_key:
+    if not os.getenv('OPENAI_API_KEY'):
         print("OpenAI API key not found. Set the OPENAI_API_KEY environment variable.")
         return
 
@@ -227,7 +185,7 @@ Words to avoid in the tweet:
 Please generate the tweet following the system prompt. Ensure the tweet is less than 140 characters and matches the specified length: **{selected_length}**.
 """
 
-        completion = await client.chat.completions.create(
+        completion = await llm_gateway.chat(
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": system_prompt.strip()},
@@ -1,9 +1,9 @@
 import asyncio
 import os
 import json
-from openai import AsyncOpenAI
 from pydantic import BaseModel, Field
 from typing import Dict
+from framework import llm_gateway
 
 class WalkResult(BaseModel):
     """Schema for walk activity results"""
@@ -38,9 +38,7 @@ async def run(state, memory):
     Activity: Take a Walk
     Description: Pippin goes on a whimsical walk in Wobbly Woods, encountering various magical creatures and finding joy in simple things.
     """
-    # Initialize OpenAI client
-    client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-    if not client.api_key:
+    if not os.getenv('OPENAI_API_KEY'):
         print("OpenAI API key not found. Set the OPENAI_API_KEY environment variable.")
         return
 
@@ -103,7 +101,7 @@ async def run(state, memory):
             }
         }
 
-        completion = await client.chat.completions.create(
+        completion = await llm_gateway.chat(
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": """You are generating walk experiences for Pippin, a quirky, round unicorn 
@@ -0,0 +1,96 @@
+# benchmarks/ann_recall.py
+#
+# Recall and latency of the IVF memory index against the exact index.
+#
+#   python -m benchmarks.ann_recall                      # synthetic clustered vectors
+#   python -m benchmarks.ann_recall --rows 1000000       # million-row scale
+#   python -m benchmarks.ann_recall --db memory.db       # real embeddings from a memory database
+
+import argparse
+import asyncio
+import time
+import aiosqlite
+import numpy as np
+from framework.vector_index import VectorIndex
+from framework.ann_index import IVFIndex
+
+
+def synthetic_embeddings(rows, dim, topics=2000, seed=0):
+    """Vectors scattered around random topic directions, roughly like text embeddings."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((topics, dim)).astype(np.float32)
+    labels = rng.integers(0, topics, rows)
+    vectors = np.empty((rows, dim), dtype=np.float32)
+    for start in range(0, rows, 50000):
+        end = min(start + 50000, rows)
+        noise = rng.standard_normal((end - start, dim)).astype(np.float32)
+        vectors[start:end] = centers[labels[start:end]] + 0.6 * noise
+    return vectors
+
+
+async def build_indexes(args):
+    exact = VectorIndex()
+    ivf = IVFIndex(nlist=args.nlist, min_train_size=1)
+    if args.db:
+        async with aiosqlite.connect(args.db) as db:
+            await exact.load(db)
+            await ivf.load(db)
+        if ivf._training is not None:
+            await ivf._training
+        rng = np.random.default_rng(1)
+        queries = exact._matrix[rng.choice(exact.size, args.queries, replace=False)]
+        queries = queries + 0.05 * rng.standard_normal(queries.shape).astype(np.float32)
+        return exact, ivf, queries
+
+    vectors = synthetic_embeddings(args.rows + args.queries, args.dim)
+    base, queries = vectors[:args.rows], vectors[args.rows:]
+    for index in (exact, ivf):
+        index.loaded = True
+        for start in range(0, args.rows, 10000):
+            chunk = base[start:start + 10000]
+            index._add_many([
+                (start + offset + 1, vec, 'synthetic', 'benchmark')
+                for offset, vec in enumerate(chunk)
+            ])
+    started = time.perf_counter()
+    await ivf.train()
+    print(f"trained IVF ({len(ivf._lists)} lists) in {time.perf_counter() - started:.1f}s")
+    return exact, ivf, queries
+
+
+def timed_search(index, queries, top_n, **kwargs):
+    results = []
+    started = time.perf_counter()
+    for query in queries:
+        results.append([row_id for row_id, _ in index.search(query, top_n=top_n, **kwargs)])
+    elapsed_ms = (time.perf_counter() - started) * 1000 / len(queries)
+    return results, elapsed_ms
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--dim', type=int, default=1536)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--top-n', type=int, default=10)
+    parser.add_argument('--nlist', type=int, default=None)
+    parser.add_argument('--db', default=None, help="Load embeddings from an existing memory database")
+    args = parser.parse_args()
+
+    exact, ivf, queries = await build_indexes(args)
+    print(f"{exact.size} rows, dim {exact.dim}, {len(queries)} queries, top {args.top_n}")
+
+    truth, exact_ms = timed_search(exact, queries, args.top_n)
+    print(f"{'exact':>12}  recall 1.000  {exact_ms:8.2f} ms/query")
+
+    for nprobe in (1, 2, 4, 8, 16, 32, 64, 128):
+        if nprobe > len(ivf._lists):
+            break
+        approx, ivf_ms = timed_search(ivf, queries, args.top_n, nprobe=nprobe)
+        hits = sum(len(set(a) & set(t)) for a, t in zip(approx, truth))
+        recall = hits / max(1, sum(len(t) for t in truth))
+        print(f"{'nprobe=' + str(nprobe):>12}  recall {recall:.3f}  {ivf_ms:8.2f} ms/query")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,223 @@
+# benchmarks/event_loop_lag.py
+#
+# Does the API keep answering while Pippin draws?
+#
+#   python -m benchmarks.event_loop_lag
+#   python -m benchmarks.event_loop_lag --llm-seconds 2 --repeat 3
+#   python -m benchmarks.event_loop_lag --synthetic --render-seconds 1
+#
+# Runs the real drawing skills, skills.draw.generate_pippin_drawing and
+# skills.gif.generate_animated_unicorn, with only their LLM calls stubbed out
+# (each answers after --llm-seconds with a fixed animated unicorn SVG), so
+# the SVG rasterisation and GIF build are the ones the skills ship with. They
+# run two ways: inline, with the skills' run_cpu replaced by a direct call
+# as they used to render, and as shipped, through framework.executors. Meanwhile
+# a small FastAPI app is pinged every few milliseconds in the same loop, and we
+# report ping latency and the longest stretch with no ping answered. Exits
+# non-zero if the shipped skills leave the API unanswered for more than
+# --max-gap-ms, which is what happens if a render is moved back onto the loop.
+#
+# --synthetic swaps the skills for a stubbed LLM wait plus a pure-Python
+# CPU-bound render of --render-seconds, sent through the same run_cpu. It
+# needs none of cairosvg, PIL or lxml, so it checks the executor path on any
+# install.
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+import httpx
+from fastapi import FastAPI
+from framework import llm_gateway
+from framework.executors import run_cpu, shutdown_executors
+
+SCENE = "Scene: Pippin dancing in a meadow\nStyle: children's book\nKey Elements: unicorn, flowers"
+
+
+def unicorn_svg(draw):
+    """The base unicorn with its background and horn animated, so the GIF build has frames to change."""
+    # cairosvg ignores the animations when drawing a still.
+    return (
+        draw.BASE_UNICORN_SVG
+        .replace(
+            '<rect width="1000" height="1000" fill="#f0f8ff"></rect>',
+            '<rect width="1000" height="1000" fill="#f0f8ff">'
+            '<animate attributeName="fill" from="#f0f8ff" to="#ffe4f2" dur="1s"/></rect>'
+        )
+        .replace(
+            'fill="#ffd700" stroke="#000" stroke-width="4"></polygon>',
+            'fill="#ffd700" stroke="#000" stroke-width="4">'
+            '<animateTransform attributeName="transform" type="rotate" from="0 640 180" to="20 640 180" dur="1s"/>'
+            '</polygon>'
+        )
+    )
+
+
+def synthetic_render(seconds):
+    """Stand-in for cairosvg + PIL: holds the GIL doing arithmetic for `seconds`."""
+    deadline = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < deadline:
+        for i in range(10000):
+            total += i * i
+    return total
+
+
+def stub_llm(llm_seconds, svg):
+    """Answer the skills' LLM calls after `llm_seconds`, like a slow network round trip."""
+    async def chat(api_key=None, cache=False, **kwargs):
+        await asyncio.sleep(llm_seconds)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=SCENE))])
+
+    async def litellm_completion(cache=False, **kwargs):
+        await asyncio.sleep(llm_seconds)
+        return {'choices': [{'message': {'content': svg}}]}
+
+    llm_gateway.chat = chat
+    llm_gateway.litellm_completion = litellm_completion
+
+
+async def run_inline(func, *args):
+    """How the skills rendered before run_cpu: on the event loop."""
+    return func(*args)
+
+
+class SkillWorkload:
+    """The real drawing skills, rendering through whichever run_cpu they are given."""
+
+    def __init__(self, llm_seconds, repeat, output_dir):
+        from skills import draw, gif
+        self.draw, self.gif = draw, gif
+        self.svg = unicorn_svg(draw)
+        self.repeat = repeat
+        self.output_dir = output_dir
+        stub_llm(llm_seconds, self.svg)
+
+    async def warm_up(self):
+        await run_cpu(self.draw.render_svg_to_jpeg, self.svg, os.path.join(self.output_dir, "warmup.jpg"))
+
+    async def __call__(self, runner):
+        self.draw.run_cpu = runner
+        self.gif.run_cpu = runner
+        for i in range(self.repeat):
+            drawing = await self.draw.generate_pippin_drawing(
+                SCENE, 'benchmark', os.path.join(self.output_dir, f"drawing_{i}.jpg")
+            )
+            animation = await self.gif.generate_animated_unicorn(
+                SCENE, 'benchmark', os.path.join(self.output_dir, f"unicorn_{i}.gif")
+            )
+            if not (drawing and os.path.exists(drawing) and animation and os.path.exists(animation)):
+                raise RuntimeError("The skills did not produce their image files")
+
+
+class SyntheticWorkload:
+    """A stubbed LLM wait, then a CPU-bound render through `runner`, `repeat` times."""
+
+    def __init__(self, llm_seconds, render_seconds, repeat):
+        self.llm_seconds = llm_seconds
+        self.render_seconds = render_seconds
+        self.repeat = repeat
+
+    async def warm_up(self):
+        await run_cpu(synthetic_render, 0)
+
+    async def __call__(self, runner):
+        for _ in range(self.repeat):
+            await asyncio.sleep(self.llm_seconds)
+            await runner(synthetic_render, self.render_seconds)
+
+
+def build_app():
+    app = FastAPI()
+
+    @app.get("/api/ping")
+    async def ping():
+        return {"ok": True}
+
+    return app
+
+
+async def probe(client, stop, interval, latencies, answered):
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get("/api/ping")
+        response.raise_for_status()
+        answered.append(time.perf_counter())
+        latencies.append(answered[-1] - started)
+        await asyncio.sleep(interval)
+
+
+async def measure(workload, runner, interval):
+    transport = httpx.ASGITransport(app=build_app())
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get("/api/ping")  # warm up routing
+        stop = asyncio.Event()
+        latencies, answered = [], []
+        prober = asyncio.create_task(probe(client, stop, interval, latencies, answered))
+        await asyncio.sleep(interval * 5)
+        started = time.perf_counter()
+        await workload(runner)
+        elapsed = time.perf_counter() - started
+        # Let the prober answer again so a stall ending with the drawing is counted.
+        await asyncio.sleep(interval * 5)
+        stop.set()
+        await prober
+    return {
+        'drawing_s': elapsed,
+        'pings': len(latencies),
+        'ping_p50_ms': statistics.median(latencies) * 1000,
+        'ping_max_ms': max(latencies) * 1000,
+        # A blocked loop answers nothing, so the longest silence is the stall.
+        'gap_max_ms': max(b - a for a, b in zip(answered, answered[1:])) * 1000,
+    }
+
+
+async def run(workload, interval):
+    # Start the worker process before timing so spawn cost isn't counted as lag.
+    await workload.warm_up()
+    results = {}
+    for name, runner in (('inline', run_inline), ('offloaded', run_cpu)):
+        results[name] = await measure(workload, runner, interval)
+    return results
+
+
+async def run_benchmark(args):
+    if args.synthetic:
+        return await run(SyntheticWorkload(args.llm_seconds, args.render_seconds, args.repeat), args.interval)
+    with tempfile.TemporaryDirectory() as output_dir:
+        return await run(SkillWorkload(args.llm_seconds, args.repeat, output_dir), args.interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Event loop lag while the drawing skills run.")
+    parser.add_argument('--llm-seconds', type=float, default=1.0, help="Stubbed LLM response time")
+    parser.add_argument('--repeat', type=int, default=2, help="Drawings and GIFs per run")
+    parser.add_argument('--synthetic', action='store_true', help="CPU-bound stand-in instead of the skills")
+    parser.add_argument('--render-seconds', type=float, default=1.0, help="Synthetic render time")
+    parser.add_argument('--interval', type=float, default=0.01, help="Seconds between pings")
+    parser.add_argument('--max-gap-ms', type=float, default=100.0)
+    args = parser.parse_args()
+
+    try:
+        results = asyncio.run(run_benchmark(args))
+    finally:
+        shutdown_executors()
+
+    print(f"{'mode':<10} {'drawing s':>10} {'pings':>7} {'p50 ms':>8} {'max ms':>9} {'max gap ms':>11}")
+    for name, r in results.items():
+        print(f"{name:<10} {r['drawing_s']:>10.2f} {r['pings']:>7} {r['ping_p50_ms']:>8.2f} "
+              f"{r['ping_max_ms']:>9.1f} {r['gap_max_ms']:>11.1f}")
+
+    worst = results['offloaded']['gap_max_ms']
+    if worst > args.max_gap_ms:
+        print(f"FAIL: API went {worst:.1f} ms without answering while drawing (limit {args.max_gap_ms:.0f} ms)")
+        sys.exit(1)
+    print(f"OK: API never went more than {worst:.1f} ms without answering while drawing")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+# benchmarks/query_latency.py
+#
+# Latency of the hot activity_logs queries across schema versions.
+#
+#   python -m benchmarks.query_latency                   # 1M synthetic rows
+#   python -m benchmarks.query_latency --rows 200000
+#
+# The database is built at the base schema and timed three times over the same
+# rows: unindexed with ISO timestamp filters (v2), indexed ISO filters (v3), and
+# the latest schema with epoch `created_at` filters.
+
+import argparse
+import asyncio
+import datetime
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import aiosqlite
+from framework.migrations import apply_migrations
+
+ACTIVITIES = [
+    'nap', 'play_zork', 'post_a_tweet', 'post_a_tweet_with_image', 'read_twitter_mentions',
+    'draw', 'take_a_walk', 'daydream', 'memory_summary', 'nap_with_dreams', 'eat', 'meditate'
+]
+SOURCES = ['activity', 'memory', 'twitter', 'web']
+
+
+def build_database(path, rows, days, seed=0):
+    """Fill activity_logs with `rows` entries spread evenly over the last `days` days."""
+    rng = random.Random(seed)
+    now = datetime.datetime.now()
+    step = datetime.timedelta(days=days) / rows
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=OFF')
+    # Rows older than the newest minute are already embedded; the tail is "pending".
+    pending_from = rows - 50
+
+    def generate():
+        for i in range(rows):
+            ts = now - step * (rows - i)
+            start = ts.timestamp()
+            duration = rng.uniform(1, 120)
+            yield (
+                f'run-{i}', ts.isoformat(), rng.choice(ACTIVITIES), 'completed',
+                start, start + duration, duration, '{}', '{}',
+                None if i >= pending_from else b'\0' * 16, rng.choice(SOURCES), 'float32'
+            )
+
+    conn.executemany('''
+        INSERT INTO activity_logs
+            (activity_id, timestamp, activity, result, start_time, end_time, duration,
+             state_changes, final_state, embedding, source, embedding_format)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', generate())
+    conn.commit()
+    conn.close()
+
+
+def hot_queries(epoch):
+    """
+    The queries issued on every main loop tick or dashboard poll, with
+    representative parameters. Time windows filter on the ISO `timestamp`
+    column, or on `created_at` when `epoch` is set.
+    """
+    now = datetime.datetime.now()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    day_ago = now - datetime.timedelta(hours=24)
+    if epoch:
+        column, today, day_ago = 'created_at', today.timestamp(), day_ago.timestamp()
+    else:
+        column, today, day_ago = 'timestamp', today.isoformat(), day_ago.isoformat()
+    return {
+        'last_activity_time': (f'''
+            SELECT {column} FROM activity_logs
+            WHERE activity = ?
+            ORDER BY id DESC
+            LIMIT 1
+        ''', ('nap',)),
+        'count_occurrences_today': (f'''
+            SELECT COUNT(*) FROM activity_logs
+            WHERE activity = ? AND {column} >= ?
+        ''', ('post_a_tweet', today)),
+        'summary_24h': (f'''
+            SELECT activity, COUNT(*) as count, SUM(duration) as total_duration
+            FROM activity_logs
+            WHERE {column} >= ?
+            GROUP BY activity
+        ''', (day_ago,)),
+        'recent_tweets': ('''
+            SELECT result FROM activity_logs
+            WHERE activity = 'post_tweet'
+            ORDER BY id DESC
+            LIMIT 5
+        ''', ()),
+        'by_source': ('''
+            SELECT COUNT(*) FROM activity_logs WHERE source = ?
+        ''', ('twitter',)),
+        'by_run_id': ('''
+            SELECT id FROM activity_logs WHERE activity_id = ?
+        ''', ('run-12345',)),
+        'unembedded_rows': ('''
+            SELECT id, result, activity, source
+            FROM activity_logs
+            WHERE embedding IS NULL AND result IS NOT NULL AND result != ''
+            ORDER BY id ASC
+        ''', ()),
+    }
+
+
+async def time_queries(db, repeats, epoch=False):
+    timings = {}
+    for name, (sql, params) in hot_queries(epoch).items():
+        samples = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            cursor = await db.execute(sql, params)
+            await cursor.fetchall()
+            samples.append(time.perf_counter() - started)
+        samples.sort()
+        timings[name] = samples[len(samples) // 2]
+    return timings
+
+
+async def run(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        async with aiosqlite.connect(path) as db:
+            await apply_migrations(db, target_version=2)
+
+        started = time.perf_counter()
+        build_database(path, args.rows, args.days)
+        print(f"built {args.rows} rows in {time.perf_counter() - started:.1f}s")
+
+        async with aiosqlite.connect(path) as db:
+            runs = {'v2 ms': await time_queries(db, args.repeats)}
+            for label, target, epoch in (('v3 ms', 3, False), ('latest ms', None, True)):
+                started = time.perf_counter()
+                await apply_migrations(db, target_version=target)
+                print(f"migrated to {label.split()[0]} in {time.perf_counter() - started:.1f}s")
+                runs[label] = await time_queries(db, args.repeats, epoch)
+
+    print(f"{'query':<26}" + ''.join(f"{label:>12}" for label in runs) + f"{'speedup':>10}")
+    for name in runs['v2 ms']:
+        ms = [timings[name] * 1000 for timings in runs.values()]
+        speedup = ms[0] / ms[-1] if ms[-1] else float('inf')
+        print(f"{name:<26}" + ''.join(f"{value:>12.3f}" for value in ms) + f"{speedup:>9.0f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Median latency of hot activity_logs queries before/after indexing.")
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--days', type=float, default=365, help="Span of synthetic history")
+    parser.add_argument('--repeats', type=int, default=11)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+# framework/activity_counters.py
+
+import asyncio
+import datetime
+import time
+
+
+def local_midnight(now=None):
+    """Unix epoch of the most recent local midnight."""
+    moment = datetime.datetime.fromtimestamp(now if now is not None else time.time())
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+
+
+class ActivityCounters:
+    """
+    In-process per-activity counters for constraint checks: occurrences since
+    local midnight and the last created_at of each activity.
+
+    Warmed from the database once, then kept current by `record()` for every
+    row this process writes. Rows written elsewhere (another process, or an
+    insert whose id skipped ahead) are picked up by `sync()`, which only reads
+    ids above the highest contiguous id already applied. Counts reset when the
+    local date changes, matching the `max_per_day` semantics.
+    """
+
+    def __init__(self, max_staleness=5.0):
+        self.max_staleness = max_staleness
+        self.loaded = False
+        self.max_id = 0
+        self.synced_at = 0.0
+        self._day_start = local_midnight()
+        self._counts = {}
+        self._last = {}
+        # Ids above max_id already applied by record(); sync() skips them.
+        self._recorded = set()
+        self._pending = []
+        self._refresh_lock = asyncio.Lock()
+
+    def _roll(self, now=None):
+        day_start = local_midnight(now)
+        if day_start != self._day_start:
+            self._day_start = day_start
+            self._counts.clear()
+
+    def _apply(self, activity, created_at):
+        if created_at is None:
+            return
+        if created_at >= self._day_start:
+            self._counts[activity] = self._counts.get(activity, 0) + 1
+        if created_at > self._last.get(activity, 0.0):
+            self._last[activity] = created_at
+
+    def _advance(self):
+        while self.max_id + 1 in self._recorded:
+            self.max_id += 1
+            self._recorded.discard(self.max_id)
+
+    def record(self, row_id, activity, created_at):
+        """Apply a row this process just inserted."""
+        if not self.loaded:
+            # Replayed after load() if its id is past the warm-up snapshot.
+            self._pending.append((row_id, activity, created_at))
+            return
+        if row_id <= self.max_id or row_id in self._recorded:
+            return
+        self._roll()
+        self._apply(activity, created_at)
+        self._recorded.add(row_id)
+        self._advance()
+
+    async def load(self, db):
+        self._roll()
+        cursor = await db.execute('SELECT MAX(id) FROM activity_logs')
+        row = await cursor.fetchone()
+        max_id = row[0] or 0
+        cursor = await db.execute('''
+            SELECT activity,
+                   SUM(CASE WHEN created_at >= ? THEN 1 ELSE 0 END),
+                   MAX(created_at)
+            FROM activity_logs
+            WHERE id <= ?
+            GROUP BY activity
+        ''', (self._day_start, max_id))
+        for activity, count, last_time in await cursor.fetchall():
+            if count:
+                self._counts[activity] = count
+            if last_time is not None:
+                self._last[activity] = last_time
+
+        self.max_id = max_id
+        self.loaded = True
+        self.synced_at = time.time()
+        pending, self._pending = self._pending, []
+        for row_id, activity, created_at in pending:
+            self.record(row_id, activity, created_at)
+
+    async def sync(self, db):
+        """Apply rows above max_id that record() did not see."""
+        self._roll()
+        cursor = await db.execute('''
+            SELECT id, activity, created_at
+            FROM activity_logs
+            WHERE id > ?
+            ORDER BY id ASC
+        ''', (self.max_id,))
+        rows = await cursor.fetchall()
+        for row_id, activity, created_at in rows:
+            if row_id not in self._recorded:
+                self._apply(activity, created_at)
+        if rows:
+            self.max_id = max(self.max_id, rows[-1][0])
+            self._recorded = {row_id for row_id in self._recorded if row_id > self.max_id}
+            self._advance()
+        self.synced_at = time.time()
+
+    def is_stale(self):
+        return not self.loaded or time.time() - self.synced_at > self.max_staleness
+
+    async def refresh(self, connect):
+        """Load or sync through a connection from `connect()`, unless another caller just did."""
+        async with self._refresh_lock:
+            if not self.is_stale():
+                return
+            async with connect() as db:
+                if self.loaded:
+                    await self.sync(db)
+                else:
+                    await self.load(db)
+
+    def stats(self, activity_names):
+        """{activity: (count_today, last_time)}; last_time is a Unix epoch or None."""
+        self._roll()
+        return {
+            activity: (self._counts.get(activity, 0), self._last.get(activity))
+            for activity in activity_names
+        }
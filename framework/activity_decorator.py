@@ -1,21 +1,27 @@
 # framework/activity_decorator.py
 
 import asyncio
+import sys
 import time
 from copy import deepcopy
 from functools import wraps
 import uuid
 import contextvars
+from framework.metrics import ACTIVITY_DURATION, ACTIVITY_RUNS
+from framework.tracing import start_trace
+from framework.profiler import ActivityProfiler, take_profile_request
 
-# Context variable to store the current activity_id
+# Context variable to store the current activity_id; memory.store_memory
+# reads it to tag rows written during the run.
 current_activity_id = contextvars.ContextVar('current_activity_id', default=None)
 
 def activity_wrapper(func):
     @wraps(func)
     async def wrapper(state, memory):
         # Generate a unique activity_id
-        activity_id = str(uuid.uuid4())
-        current_activity_id.set(activity_id)
+        activity_uuid = uuid.uuid4()
+        activity_id = str(activity_uuid)
+        token = current_activity_id.set(activity_id)
 
         # Record start time
         start_time = time.time()
@@ -23,12 +29,37 @@ def activity_wrapper(func):
         # Make a deep copy of the state before the activity
         state_before = deepcopy(state.to_dict())
 
-        # Run the activity function
-        await func(state, memory)
+        activity_name = func.__module__.split('.')[-1]
+
+        # Sample this run if profiling was requested for it (POST /api/profiles)
+        profile_interval = take_profile_request(activity_name)
+        profiler = None
+        if profile_interval is not None:
+            profiler = ActivityProfiler(
+                activity_name, activity_id, asyncio.current_task(), sys._getframe(), profile_interval
+            ).start()
+
+        # Run the activity function under a root span; its trace id is the activity_id
+        try:
+            with start_trace(f"activity {activity_name}", activity_uuid.hex, {
+                'activity': activity_name, 'activity_id': activity_id
+            }):
+                await func(state, memory)
+        except BaseException:
+            ACTIVITY_RUNS.inc(activity_name, 'error')
+            ACTIVITY_DURATION.observe(time.time() - start_time, activity_name)
+            raise
+        finally:
+            current_activity_id.reset(token)
+            # Stored whether or not the run succeeded; failing runs are the ones worth a look.
+            if profiler is not None:
+                await _store_profile(memory, profiler.stop())
 
         # Record end time
         end_time = time.time()
         duration = end_time - start_time  # Duration in seconds
+        ACTIVITY_RUNS.inc(activity_name, 'completed')
+        ACTIVITY_DURATION.observe(duration, activity_name)
 
         # Determine which state variables have changed
         state_after = state.to_dict()
@@ -39,7 +70,6 @@ def activity_wrapper(func):
         }
 
         # Prepare the activity log entry
-        activity_name = func.__module__.split('.')[-1]
         entry = {
             'activity_id': activity_id,
             'activity': activity_name,
@@ -57,3 +87,29 @@ def activity_wrapper(func):
         await memory.store_activity(entry)
 
     return wrapper
+
+async def _store_profile(memory, profile):
+    try:
+        await memory.store_activity_profile(profile)
+    except Exception as e:
+        # Never let a profile mask the run's own outcome.
+        print(f"Error storing profile of {profile['activity']}: {e}")
+
+# Every activity_wrapper closure shares this code object, so its frame can be
+# recognised on a stack sampled from another thread.
+_WRAPPER_CODE = activity_wrapper(None).__code__
+
+def activity_from_stack(frame):
+    """
+    (activity_id, activity name) of the activity_wrapper call on `frame`'s
+    stack, or (None, None). Used by the loop monitor, whose watchdog thread
+    cannot read `current_activity_id` from the blocked task's context.
+    """
+    while frame is not None:
+        if frame.f_code is _WRAPPER_CODE:
+            local_vars = frame.f_locals
+            func = local_vars.get('func')
+            name = func.__module__.split('.')[-1] if func is not None else None
+            return local_vars.get('activity_id'), name
+        frame = frame.f_back
+    return None, None
@@ -1,5 +1,5 @@
 import random
-from datetime import datetime
+import time
 from framework.activity_constraints import constraints
 
 # Core logic
@@ -29,11 +29,9 @@ async def filter_activities(activity_functions, ignored_activities):
     return [act for act in activity_functions.keys() if act not in ignored_activities]
 
 async def filter_by_constraints(activities, memory):
-    filtered = []
-    for activity in activities:
-        if await is_activity_allowed(activity, memory):
-            filtered.append(activity)
-    return filtered
+    stats = await load_constraint_stats(activities, memory)
+    now = time.time()
+    return [activity for activity in activities if evaluate_constraints(activity, stats, now)]
 
 def calculate_probabilities(activities, state, activity_indices):
     base_prob = 1.0 / len(activities)
@@ -45,33 +43,51 @@ def calculate_probabilities(activities, state, activity_indices):
 def select_random_activity(activities, probabilities):
     return random.choices(activities, probabilities)[0]
 
-async def is_activity_allowed(activity, memory):
+def constraint_dependencies(activities):
+    """Every activity whose history the constraints on `activities` depend on."""
+    names = []
+    for activity in activities:
+        constraint = constraints.get(activity)
+        if not constraint:
+            continue
+        names.append(activity)
+        names.extend(constraint.get('after', {}).keys())
+    return names
+
+async def load_constraint_stats(activities, memory):
+    """Today's counts and last-run times for all constrained activities, from the in-process counters."""
+    names = constraint_dependencies(activities)
+    if not names:
+        return {}
+    counters = await memory.get_activity_counters()
+    return counters.stats(names)
+
+def evaluate_constraints(activity, stats, now):
     constraint = constraints.get(activity, {})
     frequency_constraints = constraint.get('frequency', {})
     after_constraints = constraint.get('after', {})
-    current_time = datetime.now()
 
     # Check 'max_per_day' constraint
     max_per_day = frequency_constraints.get('max_per_day')
     if max_per_day is not None:
-        count = await memory.count_activity_occurrences(
-            activity,
-            since=current_time.replace(hour=0, minute=0, second=0, microsecond=0)
-        )
+        count, _ = stats.get(activity, (0, None))
         if count >= max_per_day:
             return False
 
     # Check 'after' constraints
     for related_activity, min_interval in after_constraints.items():
-        last_time = await memory.get_last_activity_time(related_activity)
+        _, last_time = stats.get(related_activity, (0, None))
         if last_time is None:
             continue
-        elapsed_time = (current_time - last_time).total_seconds()
-        if elapsed_time < min_interval:
+        if now - last_time < min_interval:
             return False
 
     return True
 
+async def is_activity_allowed(activity, memory):
+    stats = await load_constraint_stats([activity], memory)
+    return evaluate_constraints(activity, stats, time.time())
+
 # Activity-specific logic
 def adjust_probabilities_based_on_state(probabilities, state, activity_indices, activities):
     nap_index = activity_indices.get('nap')
@@ -0,0 +1,192 @@
+# framework/ann_index.py
+
+import asyncio
+import os
+from array import array
+import numpy as np
+from framework.vector_index import VectorIndex, normalize
+from framework.tracing import untraced_context
+
+
+def nearest_centroids(vectors, centroids, chunk_size=8192):
+    """Assign each (normalised) vector to the centroid with the highest cosine similarity."""
+    assignments = np.empty(vectors.shape[0], dtype=np.int64)
+    for start in range(0, vectors.shape[0], chunk_size):
+        block = vectors[start:start + chunk_size]
+        assignments[start:start + block.shape[0]] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+def spherical_kmeans(vectors, n_clusters, n_iter=10, seed=0):
+    """Plain Lloyd iterations on the unit sphere; returns normalised centroids."""
+    rng = np.random.default_rng(seed)
+    n_clusters = min(n_clusters, vectors.shape[0])
+    centroids = vectors[rng.choice(vectors.shape[0], n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        assignments = nearest_centroids(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, vectors)
+        norms = np.linalg.norm(sums, axis=1)
+        empty = norms == 0
+        if empty.any():
+            # Re-seed empty clusters from random points so every list stays useful.
+            sums[empty] = vectors[rng.choice(vectors.shape[0], int(empty.sum()), replace=False)]
+            norms[empty] = 1.0
+        centroids = (sums / norms[:, None]).astype(np.float32)
+    return centroids
+
+
+class IVFIndex(VectorIndex):
+    """
+    Inverted-file approximate index built on top of VectorIndex storage.
+
+    Rows are bucketed by their nearest k-means centroid; a query scores only the
+    `nprobe` closest buckets. Raising `nprobe` trades latency for recall, and
+    `nprobe >= nlist` degenerates to an exact scan. Until `min_train_size` rows
+    exist the index answers exactly. Centroids and row assignments are saved to
+    `path` (next to memory.db) so restarts skip retraining.
+    """
+
+    def __init__(self, path=None, nlist=None, nprobe=16, min_train_size=4096, retrain_factor=4):
+        super().__init__()
+        self.path = path
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_train_size = min_train_size
+        self.retrain_factor = retrain_factor
+        self.centroids = None
+        self.trained_size = 0
+        self._lists = []
+        self._training = None
+
+    async def load(self, db):
+        if self.loaded:
+            return
+        await super().load(db)
+        if self.centroids is None and not self._restore() and self._needs_training():
+            self._training = asyncio.get_running_loop().create_task(self.train(), context=untraced_context())
+
+    def _on_added(self, start, end):
+        if self.centroids is not None:
+            self._assign(start, end, nearest_centroids(self._matrix[start:end], self.centroids))
+        if self.loaded and self._needs_training():
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                return
+            self._training = loop.create_task(self.train(), context=untraced_context())
+
+    def _needs_training(self):
+        if self._training is not None and not self._training.done():
+            return False
+        if self.size < self.min_train_size:
+            return False
+        return self.centroids is None or self.size >= self.retrain_factor * self.trained_size
+
+    def _assign(self, start, end, assignments):
+        positions = np.arange(start, end, dtype=np.int64)
+        order = np.argsort(assignments, kind='stable')
+        bounds = np.searchsorted(assignments[order], np.arange(len(self._lists) + 1))
+        for cluster in range(len(self._lists)):
+            lo, hi = bounds[cluster], bounds[cluster + 1]
+            if lo < hi:
+                self._lists[cluster].frombytes(positions[order[lo:hi]].tobytes())
+
+    async def train(self):
+        """(Re)build centroids and inverted lists off the event loop."""
+        if self.size < self.min_train_size:
+            return
+        snapshot_size = self.size
+        snapshot = self._matrix[:snapshot_size]
+        nlist = self.nlist or max(16, int(np.sqrt(snapshot_size)))
+
+        def build():
+            rng = np.random.default_rng(0)
+            sample_size = min(snapshot_size, max(nlist * 64, 20000))
+            sample = snapshot[rng.choice(snapshot_size, sample_size, replace=False)]
+            centroids = spherical_kmeans(sample, nlist)
+            return centroids, nearest_centroids(snapshot, centroids)
+
+        centroids, assignments = await asyncio.to_thread(build)
+
+        # Rows appended while training ran are assigned here, on the loop,
+        # so the swap below is atomic with respect to inserts.
+        self.centroids = centroids
+        self._lists = [array('q') for _ in range(centroids.shape[0])]
+        self._assign(0, snapshot_size, assignments)
+        if self.size > snapshot_size:
+            self._assign(snapshot_size, self.size, nearest_centroids(self._matrix[snapshot_size:self.size], centroids))
+        self.trained_size = snapshot_size
+        if self.path:
+            # Arrays are copied here on the loop: the inverted lists cannot be
+            # appended to while another thread holds a buffer view of them.
+            await asyncio.to_thread(self._save, self.centroids, self._ids[:self.size].copy(), self._assignments())
+        print(f"IVF index trained: {centroids.shape[0]} lists over {snapshot_size} rows")
+
+    def _assignments(self):
+        assignments = np.empty(self.size, dtype=np.int64)
+        for cluster, positions in enumerate(self._lists):
+            assignments[np.frombuffer(positions, dtype=np.int64)] = cluster
+        return assignments
+
+    def _save(self, centroids, ids, assignments):
+        tmp_path = self.path + '.tmp.npz'
+        np.savez(
+            tmp_path,
+            centroids=centroids,
+            ids=ids,
+            assignments=assignments,
+            trained_size=np.int64(self.trained_size),
+        )
+        os.replace(tmp_path, self.path)
+
+    def _restore(self):
+        if not self.path or not os.path.exists(self.path) or self.size == 0:
+            return False
+        try:
+            with np.load(self.path) as saved:
+                centroids = saved['centroids']
+                saved_ids = saved['ids']
+                saved_assignments = saved['assignments']
+                trained_size = int(saved['trained_size'])
+        except Exception as e:
+            print(f"Ignoring unreadable IVF index at {self.path}: {e}")
+            return False
+        if centroids.shape[1] != self.dim:
+            return False
+
+        ids = self._ids[:self.size]
+        lookup = np.searchsorted(saved_ids, ids)
+        lookup[lookup >= saved_ids.shape[0]] = 0
+        known = saved_ids[lookup] == ids if saved_ids.shape[0] else np.zeros(self.size, dtype=bool)
+        assignments = np.empty(self.size, dtype=np.int64)
+        assignments[known] = saved_assignments[lookup[known]]
+        unknown = np.flatnonzero(~known)
+        if unknown.shape[0]:
+            assignments[unknown] = nearest_centroids(self._matrix[unknown], centroids)
+
+        self.centroids = centroids
+        self._lists = [array('q') for _ in range(centroids.shape[0])]
+        self._assign(0, self.size, assignments)
+        self.trained_size = trained_size
+        return True
+
+    def search(self, query_embedding, top_n=5, activity_type=None, source=None, nprobe=None):
+        if self.centroids is None:
+            return super().search(query_embedding, top_n, activity_type, source)
+        if self.size == 0 or top_n <= 0:
+            return []
+        query = normalize(query_embedding)
+        if query is None or query.shape[0] != self.dim:
+            return []
+
+        nprobe = min(nprobe or self.nprobe, len(self._lists))
+        centroid_scores = self.centroids @ query
+        probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        positions = np.concatenate([np.frombuffer(self._lists[c], dtype=np.int64) for c in probe])
+
+        mask = self._filter_mask(activity_type, source)
+        if mask is not None:
+            positions = positions[mask[positions]]
+        scores = self._matrix[positions] @ query
+        return self._top_k(scores, positions, top_n)
@@ -0,0 +1,304 @@
+# framework/broadcast.py
+
+import asyncio
+import json
+import time
+import uuid
+from collections import deque
+from framework import shared_data
+from framework.metrics import WEBSOCKET_CLIENTS, WEBSOCKET_DROPPED, register_collector
+
+PROTOCOL_VERSION = 1
+
+
+class Subscription:
+    """One client's bounded mailbox. A None message means the hub dropped this client."""
+
+    def __init__(self, maxsize):
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = False
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class BroadcastHub:
+    """
+    Fan-out of one message stream to many websocket clients.
+
+    Messages are pre-encoded JSON text, so each update is serialised once no
+    matter how many clients are connected. `publish()` never awaits: each
+    subscriber has a bounded queue, and a client whose queue is full, or whose
+    socket blocks a send for `send_timeout` seconds, is dropped instead of
+    slowing everyone else down.
+    """
+
+    def __init__(self, queue_size=16, send_timeout=10.0):
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.dropped_total = 0
+        self._subscribers = set()
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def subscribe(self, initial=()):
+        subscription = Subscription(self.queue_size)
+        for message in initial:
+            subscription.queue.put_nowait(message)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        self._subscribers.discard(subscription)
+
+    def publish(self, message):
+        for subscription in list(self._subscribers):
+            try:
+                subscription.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self._drop(subscription)
+
+    def _drop(self, subscription):
+        self._subscribers.discard(subscription)
+        subscription.dropped = True
+        self.dropped_total += 1
+        # Discard the backlog and wake the consumer with the close sentinel.
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(None)
+
+    async def serve(self, websocket, initial=()):
+        """Send `initial`, then every published message, until the socket disconnects or falls behind."""
+        subscription = self.subscribe(initial)
+        try:
+            while True:
+                message = await subscription.get()
+                if message is None:
+                    break
+                await asyncio.wait_for(websocket.send_text(message), timeout=self.send_timeout)
+        except asyncio.TimeoutError:
+            if not subscription.dropped:
+                self.dropped_total += 1
+        except Exception:
+            # The client went away; nothing to clean up beyond the subscription.
+            return
+        finally:
+            self.unsubscribe(subscription)
+        try:
+            # 1013: try again later; the client reconnects and resumes from its last seq.
+            await websocket.close(code=1013)
+        except Exception:
+            pass
+
+
+class DashboardFeed:
+    """
+    Dashboard protocol v1, built once for every viewer.
+
+    A client first receives a `snapshot` (current activity, state, recent
+    history, 24-hour summary), then `delta` messages carrying only what
+    changed: changed current-activity and state fields, new log rows, and
+    summary entries (None means the activity left the window). Every message
+    carries the feed's `stream` id and a `seq` that increases by one per
+    message, so a reconnecting client can ask to resume after its last seq;
+    it gets the missed deltas if they are still buffered, else a new snapshot.
+
+    History and the summary are kept in memory and updated from Memory's store
+    listener, so new rows cost no reads. The summary is re-read every
+    `summary_refresh` seconds so rows age out of the window. Long results
+    (e.g. SVG source) are cut to `result_preview` characters; the logs page
+    has the full text.
+    """
+
+    def __init__(self, memory, hub=None, interval=1.0, summary_refresh=60.0, history_size=10,
+                 backlog=256, result_preview=1000):
+        self.memory = memory
+        self.hub = hub or BroadcastHub()
+        self.interval = interval
+        self.summary_refresh = summary_refresh
+        self.result_preview = result_preview
+        self.stream = uuid.uuid4().hex[:12]
+        self.seq = 0
+        self._history = deque(maxlen=history_size)
+        self._summary = {}
+        self._summary_loaded_at = 0.0
+        self._new_rows = []
+        self._summary_dirty = set()
+        self._sent_current = {}
+        self._sent_state = {}
+        self._deltas = deque(maxlen=backlog)
+        self._snapshot_cache = (None, None)
+        self._changed = asyncio.Event()
+        self._task = None
+        self._start_lock = asyncio.Lock()
+
+    async def start(self):
+        async with self._start_lock:
+            if self._task is not None:
+                return
+            self.memory.add_store_listener(self._on_store)
+            recent = await self.memory.get_recent_activity_logs(self._history.maxlen)
+            # Rows stored while the query ran are already in the deque.
+            merged = {row['id']: row for row in map(self._preview, recent)}
+            merged.update((row['id'], row) for row in self._history)
+            self._history.clear()
+            self._history.extend(sorted(merged.values(), key=lambda row: row['id'], reverse=True))
+            self._new_rows.clear()
+            await self._load_summary()
+            self._summary_dirty.clear()
+            self._sent_current = dict(shared_data.current_activity)
+            self._sent_state = shared_data.state.to_dict()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self.memory.remove_store_listener(self._on_store)
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def notify(self):
+        """Publish on the next tick instead of waiting for `interval` (e.g. an activity started)."""
+        self._changed.set()
+
+    async def serve(self, websocket, since=None, stream=None):
+        await self.hub.serve(websocket, self.resume_messages(since, stream))
+
+    def resume_messages(self, since=None, stream=None):
+        """What a (re)connecting client needs: the deltas it missed, or a snapshot."""
+        # Publish pending changes first so the snapshot matches `seq` exactly.
+        self._flush()
+        if stream == self.stream and since is not None:
+            missed = self.seq - since
+            if missed == 0:
+                return []
+            oldest = self._deltas[0][0] if self._deltas else self.seq + 1
+            if 0 < missed <= self.hub.queue_size and since + 1 >= oldest:
+                return [text for seq, text in self._deltas if seq > since]
+        return [self._snapshot()]
+
+    def _preview(self, row):
+        result = row.get('result')
+        row = dict(row, source=row.get('source') or 'system')
+        row.pop('created_at', None)
+        if isinstance(result, str) and len(result) > self.result_preview:
+            row['result'] = result[:self.result_preview]
+            row['result_truncated'] = True
+        return row
+
+    def _on_store(self, row):
+        row = self._preview(row)
+        self._history.appendleft(row)
+        self._new_rows.append(row)
+        entry = self._summary.setdefault(row['activity'], {'count': 0, 'total_duration': 0})
+        entry['count'] += 1
+        entry['total_duration'] += row.get('duration') or 0
+        self._summary_dirty.add(row['activity'])
+        self._changed.set()
+
+    async def _load_summary(self):
+        summary = await self.memory.get_activity_summary(time.time() - 24 * 3600)
+        fresh = {
+            item['activity']: {'count': item['count'], 'total_duration': item['total_duration']}
+            for item in summary
+        }
+        self._summary_dirty.update(
+            activity for activity in self._summary.keys() | fresh.keys()
+            if self._summary.get(activity) != fresh.get(activity)
+        )
+        self._summary = fresh
+        self._summary_loaded_at = time.time()
+
+    def _snapshot(self):
+        seq, text = self._snapshot_cache
+        if seq == self.seq:
+            return text
+        text = json.dumps({
+            'v': PROTOCOL_VERSION,
+            'type': 'snapshot',
+            'stream': self.stream,
+            'seq': self.seq,
+            'history_size': self._history.maxlen,
+            'current_activity': self._sent_current,
+            'state': self._sent_state,
+            'activity_history': list(self._history),
+            'summary_data': [
+                {'activity': activity, **entry} for activity, entry in sorted(self._summary.items())
+            ]
+        })
+        self._snapshot_cache = (self.seq, text)
+        return text
+
+    def _flush(self):
+        delta = {}
+        current = dict(shared_data.current_activity)
+        changed = {key: value for key, value in current.items() if self._sent_current.get(key) != value}
+        if changed:
+            delta['current_activity'] = changed
+            self._sent_current = current
+        state = shared_data.state.to_dict()
+        changed = {key: value for key, value in state.items() if self._sent_state.get(key) != value}
+        if changed:
+            delta['state'] = changed
+            self._sent_state = state
+        if self._new_rows:
+            delta['logs'] = self._new_rows
+            self._new_rows = []
+        if self._summary_dirty:
+            delta['summary'] = {
+                activity: dict(self._summary[activity]) if activity in self._summary else None
+                for activity in self._summary_dirty
+            }
+            self._summary_dirty = set()
+        if not delta:
+            return
+
+        self.seq += 1
+        text = json.dumps({'v': PROTOCOL_VERSION, 'type': 'delta', 'stream': self.stream, 'seq': self.seq, **delta})
+        self._deltas.append((self.seq, text))
+        self.hub.publish(text)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._changed.clear()
+            try:
+                if time.time() - self._summary_loaded_at >= self.summary_refresh:
+                    await self._load_summary()
+                self._flush()
+            except Exception as e:
+                print(f"Error publishing dashboard update: {e}")
+
+
+_feeds = {}
+
+
+async def get_dashboard_feed(memory):
+    """The shared, started feed for `memory`'s database."""
+    feed = _feeds.get(memory.db_name)
+    if feed is None:
+        feed = DashboardFeed(memory)
+        _feeds[memory.db_name] = feed
+    await feed.start()
+    return feed
+
+
+def notify_dashboards():
+    for feed in _feeds.values():
+        feed.notify()
+
+
+def _collect_websocket_metrics():
+    WEBSOCKET_CLIENTS.set(value=sum(feed.hub.subscriber_count for feed in _feeds.values()))
+    WEBSOCKET_DROPPED.set(value=sum(feed.hub.dropped_total for feed in _feeds.values()))
+
+register_collector(_collect_websocket_metrics)
@@ -0,0 +1,213 @@
+# framework/db.py
+
+import asyncio
+import time
+import aiosqlite
+from framework.metrics import SQLITE_DURATION, caller_name, statement_label
+from framework.tracing import start_span
+
+# The database Memory, the job queue and the LLM response cache use unless told otherwise.
+DEFAULT_DB_NAME = 'memory.db'
+
+# Applied to every pooled connection. WAL lets readers run alongside the single
+# writer; synchronous=NORMAL is durable across application crashes in WAL mode.
+CONNECTION_PRAGMAS = (
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA cache_size=-32000',
+    'PRAGMA temp_store=MEMORY',
+)
+
+_pools = {}
+
+
+class _TimedCursor:
+    """Cursor proxy that adds fetch time to the statement's SQLite latency metric."""
+
+    def __init__(self, cursor, statement, caller):
+        self._cursor = cursor
+        self._statement = statement
+        self._caller = caller
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    async def _timed(self, fetch, *args):
+        with start_span(f"sqlite fetch {self._statement}", {'db.caller': self._caller}):
+            started = time.perf_counter()
+            try:
+                return await fetch(*args)
+            finally:
+                SQLITE_DURATION.observe(time.perf_counter() - started, self._statement, self._caller, 'fetch')
+
+    async def fetchone(self):
+        return await self._timed(self._cursor.fetchone)
+
+    async def fetchmany(self, size=None):
+        return await self._timed(self._cursor.fetchmany, *(() if size is None else (size,)))
+
+    async def fetchall(self):
+        return await self._timed(self._cursor.fetchall)
+
+
+class _TimedConnection:
+    """
+    What a lease hands out: the pooled aiosqlite connection, with `execute`
+    and `executemany` timed per statement and calling function for /metrics,
+    and traced as spans when called during an activity.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    async def execute(self, sql, parameters=None):
+        statement, caller = statement_label(sql), caller_name()
+        with start_span(f"sqlite {statement}", {'db.caller': caller}):
+            started = time.perf_counter()
+            try:
+                cursor = await self._conn.execute(sql, parameters)
+            finally:
+                SQLITE_DURATION.observe(time.perf_counter() - started, statement, caller, 'execute')
+        return _TimedCursor(cursor, statement, caller)
+
+    async def executemany(self, sql, parameters):
+        statement, caller = statement_label(sql), caller_name()
+        with start_span(f"sqlite {statement}", {'db.caller': caller}):
+            started = time.perf_counter()
+            try:
+                return await self._conn.executemany(sql, parameters)
+            finally:
+                SQLITE_DURATION.observe(time.perf_counter() - started, statement, caller, 'execute')
+
+
+class _Lease:
+    """`async with` wrapper that hands out a pooled connection and returns it afterwards."""
+
+    def __init__(self, acquire, release):
+        self._acquire = acquire
+        self._release = release
+        self._conn = None
+
+    async def __aenter__(self):
+        self._conn = await self._acquire()
+        return _TimedConnection(self._conn)
+
+    async def __aexit__(self, exc_type, exc, tb):
+        conn, self._conn = self._conn, None
+        await self._release(conn)
+
+
+class ConnectionPool:
+    """
+    Long-lived aiosqlite connections for one database file: a single writer,
+    serialised by a lock, and up to `readers` connections for queries.
+
+    Leases keep the `async with pool.reader() as db` shape of aiosqlite.connect,
+    but the connection (its thread, file handle, page cache and prepared
+    statement cache) is reused instead of closed. Any transaction left open by
+    the caller is rolled back on release, matching what closing used to do.
+    """
+
+    def __init__(self, db_name, readers=4, cached_statements=256):
+        self.db_name = db_name
+        self.readers = readers
+        self.cached_statements = cached_statements
+        self._idle = asyncio.Queue()
+        self._opened = 0
+        self._all = set()
+        self._writer = None
+        self._write_lock = asyncio.Lock()
+        self._wal_ready = False
+
+    async def _open(self):
+        conn = await aiosqlite.connect(
+            self.db_name,
+            timeout=30,
+            cached_statements=self.cached_statements
+        )
+        if not self._wal_ready:
+            await conn.execute('PRAGMA journal_mode=WAL')
+            self._wal_ready = True
+        for pragma in CONNECTION_PRAGMAS:
+            await conn.execute(pragma)
+        self._all.add(conn)
+        return conn
+
+    async def _discard(self, conn):
+        self._all.discard(conn)
+        try:
+            await conn.close()
+        except Exception as e:
+            print(f"Error closing database connection: {e}")
+
+    def reader(self):
+        return _Lease(self._acquire_reader, self._release_reader)
+
+    def writer(self):
+        return _Lease(self._acquire_writer, self._release_writer)
+
+    async def _acquire_reader(self):
+        if self._idle.empty() and self._opened < self.readers:
+            self._opened += 1
+            try:
+                return await self._open()
+            except Exception:
+                self._opened -= 1
+                raise
+        return await self._idle.get()
+
+    async def _release_reader(self, conn):
+        try:
+            if conn.in_transaction:
+                await conn.rollback()
+        except Exception as e:
+            print(f"Dropping broken database connection: {e}")
+            self._opened -= 1
+            await self._discard(conn)
+            return
+        self._idle.put_nowait(conn)
+
+    async def _acquire_writer(self):
+        await self._write_lock.acquire()
+        try:
+            if self._writer is None:
+                self._writer = await self._open()
+        except Exception:
+            self._write_lock.release()
+            raise
+        return self._writer
+
+    async def _release_writer(self, conn):
+        try:
+            if conn.in_transaction:
+                await conn.rollback()
+        except Exception as e:
+            print(f"Dropping broken database connection: {e}")
+            self._writer = None
+            await self._discard(conn)
+        finally:
+            self._write_lock.release()
+
+    async def close(self):
+        for conn in list(self._all):
+            await self._discard(conn)
+        self._idle = asyncio.Queue()
+        self._opened = 0
+        self._writer = None
+
+
+def get_pool(db_name):
+    pool = _pools.get(db_name)
+    if pool is None:
+        pool = ConnectionPool(db_name)
+        _pools[db_name] = pool
+    return pool
+
+
+async def close_pools():
+    for pool in list(_pools.values()):
+        await pool.close()
+    _pools.clear()
@@ -0,0 +1,82 @@
+# framework/embedding_cache.py
+
+import hashlib
+import time
+from collections import OrderedDict
+from framework.embedding_codec import encode_embedding, decode_embedding
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache keyed by (model, sha256(text)).
+
+    An in-process LRU sits in front of the `embedding_cache` table in the memory
+    database (created by migration 8), so identical texts ('rested', 'completed',
+    repeated search queries) are embedded once and survive restarts. Embeddings
+    are stored as raw little-endian float32.
+    """
+
+    def __init__(self, connect, connect_writer, max_entries=4096):
+        self._connect = connect
+        self._connect_writer = connect_writer
+        self.max_entries = max_entries
+        self._lru = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model, text):
+        return model, hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def _remember(self, key, embedding):
+        self._lru[key] = embedding
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    async def get(self, model, text):
+        key = self.key(model, text)
+        embedding = self._lru.get(key)
+        if embedding is not None:
+            self._lru.move_to_end(key)
+            self.memory_hits += 1
+            return embedding
+
+        async with self._connect() as db:
+            cursor = await db.execute(
+                'SELECT embedding FROM embedding_cache WHERE model = ? AND text_hash = ?',
+                key
+            )
+            row = await cursor.fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+
+        embedding = decode_embedding(row[0], 'float32')
+        self._remember(key, embedding)
+        self.disk_hits += 1
+        return embedding
+
+    async def put(self, model, text, embedding):
+        key = self.key(model, text)
+        self._remember(key, embedding)
+        blob = encode_embedding(embedding, 'float32')
+        async with self._connect_writer() as db:
+            await db.execute('''
+                INSERT OR REPLACE INTO embedding_cache (model, text_hash, embedding, created_at)
+                VALUES (?, ?, ?, ?)
+            ''', (*key, blob, time.time()))
+            await db.commit()
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        hits = self.memory_hits + self.disk_hits
+        return {
+            'lookups': lookups,
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'lru_entries': len(self._lru)
+        }
@@ -0,0 +1,64 @@
+# framework/embedding_codec.py
+
+import io
+import pickle
+import numpy as np
+
+# Values stored in activity_logs.embedding_format. NULL marks a legacy pickled list.
+EMBEDDING_FORMATS = ('float32', 'float16', 'int8')
+
+_DTYPES = {
+    'float32': np.dtype('<f4'),
+    'float16': np.dtype('<f2'),
+    'int8': np.dtype('i1'),
+}
+
+
+class _ListUnpickler(pickle.Unpickler):
+    """Unpickler for legacy embedding blobs, which only ever hold a list of floats (or None)."""
+
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError(f"Refusing to load {module}.{name} from an embedding blob")
+
+
+def encode_embedding(embedding, fmt='float32'):
+    """
+    Serialise an embedding as raw little-endian bytes.
+    'int8' stores the L2-normalised vector scaled by 127; cosine similarity is
+    unaffected by the dropped magnitude.
+    """
+    if fmt not in _DTYPES:
+        raise ValueError(f"Unknown embedding format {fmt!r}; expected one of {EMBEDDING_FORMATS}")
+    vec = np.asarray(embedding, dtype=np.float32)
+    if fmt == 'int8':
+        norm = np.linalg.norm(vec)
+        if norm > 0:
+            vec = vec / norm
+        return np.clip(np.rint(vec * 127), -127, 127).astype(_DTYPES['int8']).tobytes()
+    return vec.astype(_DTYPES[fmt]).tobytes()
+
+
+def decode_embedding(blob, fmt):
+    """
+    Decode a stored embedding. Raw formats are read zero-copy with np.frombuffer
+    (the int8 variant is widened to float32); a NULL format means a legacy pickle.
+    """
+    if blob is None:
+        return None
+    if fmt is None:
+        try:
+            embedding = _ListUnpickler(io.BytesIO(blob)).load()
+        except Exception as e:
+            print(f"Error decoding legacy embedding: {e}")
+            return None
+        if embedding is None:
+            return None
+        return np.asarray(embedding, dtype=np.float32)
+    dtype = _DTYPES.get(fmt)
+    if dtype is None:
+        print(f"Unknown embedding format {fmt!r}")
+        return None
+    embedding = np.frombuffer(blob, dtype=dtype)
+    if fmt == 'int8':
+        return embedding.astype(np.float32) / 127
+    return embedding
@@ -0,0 +1,76 @@
+# framework/embedding_queue.py
+
+import asyncio
+from framework.tracing import untraced_context
+
+
+class EmbeddingWriteBehind:
+    """
+    Background batcher for embeddings of rows that were already inserted.
+
+    Items are opaque tuples describing a stored row. A single worker task
+    hands them to `process(batch)` once `batch_size` items are waiting or
+    `flush_interval` seconds after the first item arrived, whichever is first.
+    `flush()` forces an immediate batch and waits until the queue is drained.
+    """
+
+    def __init__(self, process, batch_size=64, flush_interval=0.5):
+        self._process = process
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._in_flight = 0
+        self._has_items = asyncio.Event()
+        self._flush_now = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._worker = None
+
+    @property
+    def pending_count(self):
+        return len(self._pending) + self._in_flight
+
+    def enqueue(self, item):
+        self._pending.append(item)
+        self._idle.clear()
+        self._has_items.set()
+        if len(self._pending) >= self.batch_size:
+            self._flush_now.set()
+        if self._worker is None or self._worker.done():
+            # The worker outlives the activity that first queued a row; keep its
+            # embedding calls out of that run's trace.
+            self._worker = asyncio.get_running_loop().create_task(self._run(), context=untraced_context())
+
+    async def flush(self):
+        """Embed everything queued so far without waiting for the time window."""
+        if self._idle.is_set():
+            return
+        self._flush_now.set()
+        await self._idle.wait()
+
+    async def _run(self):
+        while True:
+            await self._has_items.wait()
+            if not self._flush_now.is_set() and len(self._pending) < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._flush_now.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+            batch = self._pending[:self.batch_size]
+            del self._pending[:self.batch_size]
+            if not self._pending:
+                self._has_items.clear()
+                self._flush_now.clear()
+
+            self._in_flight = len(batch)
+            try:
+                await self._process(batch)
+            except Exception as e:
+                # Rows keep a NULL embedding and are picked up again at the next startup.
+                print(f"Error embedding batch of {len(batch)} rows: {e}")
+            finally:
+                self._in_flight = 0
+
+            if not self._pending:
+                self._idle.set()
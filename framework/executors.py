@@ -0,0 +1,77 @@
+# framework/executors.py
+#
+# Where blocking work goes instead of the event loop.
+#
+#   await run_io(requests.get, url)               # bounded thread pool
+#   await run_cpu(render_svg_to_jpeg, svg, path)  # process pool
+#
+# Use run_io for blocking calls that spend their time waiting: sync SDKs,
+# file reads. Use run_cpu for rendering work that holds the GIL, such as
+# cairosvg rasterisation or PIL compositing, so it can't stall the server
+# even from a thread. run_cpu functions and their arguments must be
+# picklable, so pass module-level functions and plain data.
+
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from framework.tracing import start_span
+
+IO_WORKERS = int(os.getenv("PIPPIN_IO_WORKERS", "16"))
+CPU_WORKERS = int(os.getenv("PIPPIN_CPU_WORKERS", str(max(1, min(4, (os.cpu_count() or 2) - 1)))))
+
+_io_executor = None
+_cpu_executor = None
+
+
+def get_io_executor():
+    global _io_executor
+    if _io_executor is None:
+        _io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="pippin-io")
+    return _io_executor
+
+
+def get_cpu_executor():
+    global _cpu_executor
+    if _cpu_executor is None:
+        # spawn, not fork: forking a process that runs an event loop and
+        # database threads can copy held locks into the child.
+        _cpu_executor = ProcessPoolExecutor(
+            max_workers=CPU_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _cpu_executor
+
+
+async def run_io(func, *args, **kwargs):
+    """Run a blocking call on the I/O thread pool, keeping the caller's context variables."""
+    loop = asyncio.get_running_loop()
+    with start_span(f"io {getattr(func, '__qualname__', 'call')}"):
+        context = contextvars.copy_context()
+        call = functools.partial(context.run, func, *args, **kwargs)
+        return await loop.run_in_executor(get_io_executor(), call)
+
+
+async def run_cpu(func, *args, **kwargs):
+    """Run a CPU-bound call in a worker process."""
+    global _cpu_executor
+    loop = asyncio.get_running_loop()
+    with start_span(f"cpu {getattr(func, '__qualname__', 'call')}"):
+        try:
+            return await loop.run_in_executor(get_cpu_executor(), functools.partial(func, *args, **kwargs))
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); start a fresh pool for the next call.
+            _cpu_executor = None
+            raise
+
+
+def shutdown_executors(wait=True):
+    global _io_executor, _cpu_executor
+    if _io_executor is not None:
+        _io_executor.shutdown(wait=wait, cancel_futures=True)
+        _io_executor = None
+    if _cpu_executor is not None:
+        _cpu_executor.shutdown(wait=wait, cancel_futures=True)
+        _cpu_executor = None
@@ -0,0 +1,184 @@
+# framework/export.py
+#
+# Streaming export of memory.db tables for offline analysis:
+#
+#   python -m framework.export --table activity_logs --format ndjson --gzip -o logs.ndjson.gz
+#   python -m framework.export --table state_snapshots --format csv > snapshots.csv
+#
+# Rows are read in keyset chunks, each through its own short read, and encoded
+# as they arrive, so memory use is bounded by one chunk whatever the table size.
+
+import argparse
+import asyncio
+import base64
+import csv
+import io
+import json
+import sys
+import zlib
+from framework.embedding_codec import decode_embedding, encode_embedding
+from framework.db import get_pool, close_pools
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+
+EXPORT_TABLES = {
+    'activity_logs': (
+        'id', 'activity_id', 'timestamp', 'created_at', 'activity', 'result', 'start_time',
+        'end_time', 'duration', 'state_changes', 'final_state', 'source', 'parent_id'
+    ),
+    'state_snapshots': (
+        'id', 'timestamp', 'created_at', 'energy', 'happiness', 'xp'
+    ),
+}
+
+# Columns holding JSON text; NDJSON output embeds them as objects.
+JSON_COLUMNS = {'state_changes', 'final_state'}
+
+
+def export_columns(table, include_embeddings=False):
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"Unknown table {table!r}; expected one of {tuple(EXPORT_TABLES)}")
+    columns = EXPORT_TABLES[table]
+    if include_embeddings and table == 'activity_logs':
+        columns += ('embedding_format', 'embedding')
+    return columns
+
+
+def _export_embedding(blob, fmt):
+    """Base64 of the raw vector bytes. Legacy pickles are re-encoded as float32 rather than shipped."""
+    if blob is None:
+        return None, None
+    if fmt is None:
+        embedding = decode_embedding(blob, None)
+        if embedding is None:
+            return None, None
+        fmt, blob = 'float32', encode_embedding(embedding, 'float32')
+    return fmt, base64.b64encode(blob).decode('ascii')
+
+
+async def iter_rows(connect, table, include_embeddings=False, since=None, until=None, chunk_size=1000):
+    """Yield lists of row dicts, `chunk_size` at a time, in id order."""
+    columns = export_columns(table, include_embeddings)
+    clauses, params = ['id > ?'], []
+    if since is not None:
+        clauses.append('created_at >= ?')
+        params.append(since)
+    if until is not None:
+        clauses.append('created_at < ?')
+        params.append(until)
+    sql = f'''
+        SELECT {', '.join(columns)}
+        FROM {table}
+        WHERE {' AND '.join(clauses)}
+        ORDER BY id ASC
+        LIMIT ?
+    '''
+
+    last_id = 0
+    while True:
+        # A fresh lease per chunk keeps each read transaction short, so a long
+        # export never holds back WAL checkpoints.
+        async with connect() as db:
+            cursor = await db.execute(sql, (last_id, *params, chunk_size))
+            rows = await cursor.fetchall()
+        if not rows:
+            return
+        records = [dict(zip(columns, row)) for row in rows]
+        if include_embeddings and table == 'activity_logs':
+            for record in records:
+                record['embedding_format'], record['embedding'] = _export_embedding(
+                    record['embedding'], record['embedding_format']
+                )
+        yield records
+        last_id = rows[-1][0]
+        if len(rows) < chunk_size:
+            return
+
+
+async def encode_ndjson(chunks):
+    async for records in chunks:
+        lines = []
+        for record in records:
+            for column in JSON_COLUMNS.intersection(record):
+                if record[column]:
+                    try:
+                        record[column] = json.loads(record[column])
+                    except ValueError:
+                        pass
+            lines.append(json.dumps(record, ensure_ascii=False))
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+async def encode_csv(chunks, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    async for records in chunks:
+        for record in records:
+            writer.writerow(['' if record[column] is None else record[column] for column in columns])
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+async def gzip_stream(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31: gzip container
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(connect, table, fmt='ndjson', compress=False, include_embeddings=False,
+                  since=None, until=None, chunk_size=1000):
+    """Async iterator of encoded bytes for `table`; `connect` leases a read connection."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}; expected one of {EXPORT_FORMATS}")
+    columns = export_columns(table, include_embeddings)
+    chunks = iter_rows(connect, table, include_embeddings, since, until, chunk_size)
+    stream = encode_ndjson(chunks) if fmt == 'ndjson' else encode_csv(chunks, columns)
+    return gzip_stream(stream) if compress else stream
+
+
+async def export_to_file(db_name, table, out, **options):
+    written = 0
+    try:
+        async for data in stream_export(get_pool(db_name).reader, table, **options):
+            out.write(data)
+            written += len(data)
+    finally:
+        await close_pools()
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream a memory.db table as NDJSON or CSV.")
+    parser.add_argument('--db', default='memory.db')
+    parser.add_argument('--table', default='activity_logs', choices=tuple(EXPORT_TABLES))
+    parser.add_argument('--format', default='ndjson', choices=EXPORT_FORMATS)
+    parser.add_argument('--gzip', action='store_true', help="Compress the output with gzip")
+    parser.add_argument('--embeddings', action='store_true', help="Include base64 embedding vectors")
+    parser.add_argument('--since', type=float, help="Only rows with created_at >= this Unix epoch")
+    parser.add_argument('--until', type=float, help="Only rows with created_at < this Unix epoch")
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('-o', '--output', help="Output file (default: stdout)")
+    args = parser.parse_args()
+
+    out = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        written = asyncio.run(export_to_file(
+            args.db, args.table, out,
+            fmt=args.format, compress=args.gzip, include_embeddings=args.embeddings,
+            since=args.since, until=args.until, chunk_size=args.chunk_size
+        ))
+    finally:
+        if args.output:
+            out.close()
+    print(f"Exported {args.table}: {written} bytes", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,32 +1,27 @@
+import asyncio
 import os
 import json
-import asyncio
+import re
 import time
-from fastapi import APIRouter, HTTPException, Body, Depends, Request
-from openai import AsyncOpenAI
+from fastapi import APIRouter, HTTPException, Body, Depends, Request, Response
 from typing import Optional
 from datetime import datetime
-import pickle
-import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 
 from framework.memory import Memory
 from framework.shared_data import state
-from requests_oauthlib import OAuth1Session
-import math
+from framework.twitter_client import TwitterError, get_twitter_client, with_backoff
 
 # Imports for image/gif generation skills
 from skills.generate_pippin_image import generate_pippin_image  # Adjust import path if needed
 from skills.draw import generate_pippin_drawing  # Newly added import
 from skills.gif import generate_animated_unicorn
+from framework import llm_gateway
+from framework.single_flight import SingleFlight, normalize_text
+from framework.job_queue import JobContext, check_webhook_url, get_job_queue, register_handler
 
 # Toggle to actually post to Twitter
 ENABLE_TWITTER_POSTING = True
 
-class TwitterError(Exception):
-    """Custom exception for Twitter API errors"""
-    pass
-
 EXPECTED_API_KEY = os.getenv("API_KEY_FOR_ACTSWAP", None)
 
 async def check_api_key(request: Request):
@@ -39,80 +34,25 @@ async def check_api_key(request: Request):
 
 async def upload_media_to_twitter(api_key, api_secret, access_token, access_token_secret, image_path):
     """Helper function to upload media to Twitter and return the media_id."""
-    oauth_upload = OAuth1Session(
-        client_key=api_key,
-        client_secret=api_secret,
-        resource_owner_key=access_token,
-        resource_owner_secret=access_token_secret,
-    )
-
-    with open(image_path, 'rb') as f:
-        files = {"media": f}
-        upload_response = oauth_upload.post(
-            "https://upload.twitter.com/1.1/media/upload.json",
-            files=files
-        )
-
-    if upload_response.status_code != 200:
-        print(f"Failed to upload media. Status code: {upload_response.status_code}")
+    try:
+        client = get_twitter_client((api_key, api_secret, access_token, access_token_secret))
+        return await client.upload_media(image_path)
+    except TwitterError as e:
+        print(f"Failed to upload media: {e}")
         return None
-    else:
-        media_data = upload_response.json()
-        media_id = media_data.get("media_id_string")
-        return media_id
 
 async def post_to_twitter(text: str, media_id: Optional[str] = None) -> dict:
     """Post a tweet to Twitter using OAuth 1.0a directly, optionally with media."""
-    api_key = os.getenv("TWITTER_API_KEY")
-    api_secret = os.getenv("TWITTER_API_KEY_SECRET")
-    access_token = os.getenv("TWITTER_ACCESS_TOKEN")
-    access_token_secret = os.getenv("TWITTER_ACCESS_TOKEN_SECRET")
-
-    def mask_secret(s):
-        if s and len(s) > 6:
-            return s[:3] + "..." + s[-3:]
-        return s
-
-    print("Debug: Twitter Credentials")
-    print("API Key:", mask_secret(api_key))
-    print("API Secret:", mask_secret(api_secret))
-    print("Access Token:", mask_secret(access_token))
-    print("Access Token Secret:", mask_secret(access_token_secret))
-
-    if not all([api_key, api_secret, access_token, access_token_secret]):
-        print("Debug: Missing Twitter credentials.")
-        raise TwitterError("Missing required Twitter credentials")
-
-    oauth = OAuth1Session(
-        client_key=api_key,
-        client_secret=api_secret,
-        resource_owner_key=access_token,
-        resource_owner_secret=access_token_secret,
-    )
-
-    post_payload = {"text": text}
-    if media_id is not None:
-        post_payload["media"] = {"media_ids": [media_id]}
-
-    if ENABLE_TWITTER_POSTING:
-        response = oauth.post(
-            "https://api.twitter.com/2/tweets",
-            json=post_payload
-        )
-        print("Debug: Twitter POST response status:", response.status_code)
-        print("Debug: Twitter POST response text:", response.text)
-
-        if response.status_code != 201:
-            error_data = response.json() if response.text else {}
-            print("Debug: Twitter error_data:", error_data)
-            raise TwitterError({"status_code": response.status_code, "headers": response.headers, "error_data": error_data})
-
-        return response.json()
-    else:
+    if not ENABLE_TWITTER_POSTING:
         # Simulate a successful tweet
         print("Debug: ENABLE_TWITTER_POSTING is False, simulating tweet.")
         return {"data": {"id": "1234567890", "text": text}}
 
+    client = get_twitter_client()
+    result = await client.post_tweet(text, [media_id] if media_id is not None else None)
+    print("Debug: Tweet posted:", result)
+    return result
+
 async def attach_media_based_on_intent(text: str, intent: str) -> Optional[str]:
     """
     Based on the user's intent, generate and upload appropriate media.
@@ -141,7 +81,7 @@ async def attach_media_based_on_intent(text: str, intent: str) -> Optional[str]:
         elif intent == "imagination":
             # Use generate_pippin_image
             prompt = f"Pippin is imagining a scene inspired by: \"{text}\""
-            image_path = generate_pippin_image(prompt, api_key, output_path="pippin_scene.png")
+            image_path = await generate_pippin_image(prompt, api_key, output_path="pippin_scene.png")
         elif intent == "animation":
             # Use generate_animated_unicorn for a GIF
             prompt = f"A whimsical animated unicorn scene inspired by: \"{text}\""
@@ -163,17 +103,61 @@ async def attach_media_based_on_intent(text: str, intent: str) -> Optional[str]:
 
 router = APIRouter()
 
+# Bursts of the same question (e.g. replies under a viral tweet) share one
+# answer: concurrent requests join the in-flight one, later ones within the
+# TTL get its result.
+RESPONSE_TTL = float(os.getenv("PIPPIN_RESPONSE_TTL", "60"))
+_responses = SingleFlight('generate_response_actswap', ttl=RESPONSE_TTL)
+
 @router.post("/generate_response_actswap")
 async def generate_response(
+    response: Response,
     question: str = Body(..., embed=True),
     _: None = Depends(check_api_key)
 ):
-    memory = Memory()
-    client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-    if not client.api_key:
+    if not os.getenv('OPENAI_API_KEY'):
         raise HTTPException(status_code=500, detail="OpenAI API key not configured.")
+    started = time.perf_counter()
+    result = dict(await _responses.do(normalize_text(question), lambda: answer_question(question)))
+    # Stage timings are from the computation this request shared, which may
+    # have started before it or been cached; `total` is this request's own.
+    timings = result.pop('timings')
+    stages = [f"{stage};dur={ms:.1f}" for stage, ms in timings.items()]
+    stages.append(f"total;dur={(time.perf_counter() - started) * 1000:.1f}")
+    response.headers['Server-Timing'] = ', '.join(stages)
+    return result
+
+
+# Obvious requests are classified by keyword instead of an LLM call.
+INTENT_KEYWORDS = {
+    'drawing': re.compile(r"\b(draw|sketch|doodle|illustrate)\b"),
+    'animation': re.compile(r"\b(animate|dance|gif)\b"),
+    'imagination': re.compile(r"\b(imagine|envision|daydream)\b"),
+}
+REQUEST_HINTS = re.compile(r"\b(paint\w*|picture|art|create|make|show|visuali[sz]e|dream|move|moving|pretend)\b")
+NEGATIONS = re.compile(r"\b(no|not|never|stop|without|instead)\b|n't\b|n’t\b")
+
+
+def classify_intent_fast(question: str) -> Optional[str]:
+    """
+    The intent of an unmistakable request, or None if it needs the LLM
+    classifier. Only positive matches are answered here; anything else,
+    including "none", negations and mixed requests, goes to the LLM.
+    """
+    text = question.lower()
+    if NEGATIONS.search(text) or REQUEST_HINTS.search(text):
+        return None
+    matches = [intent for intent, pattern in INTENT_KEYWORDS.items() if pattern.search(text)]
+    if len(matches) == 1:
+        return matches[0]
+    return None
+
+
+async def classify_intent(question: str) -> str:
+    intent = classify_intent_fast(question)
+    if intent is not None:
+        return intent
 
-    # First, classify the user request to identify intent.
     classification_prompt = f"""
 You are a classification assistant. 
 You will receive a user input line and must determine if it includes a request for:
@@ -188,7 +172,8 @@ User input line:
 {question}
 """
     try:
-        classification_completion = await client.chat.completions.create(
+        classification_completion = await llm_gateway.chat(
+            cache=True,
             model="gpt-4o-mini",
             messages=[{"role": "system", "content": classification_prompt.strip()}],
             max_tokens=10,
@@ -196,32 +181,20 @@ User input line:
             n=1,
             stop=None,
         )
-        classification_answer = classification_completion.choices[0].message.content.strip().lower()
+        return classification_completion.choices[0].message.content.strip().lower()
     except Exception as e:
         print("Debug: Error calling LLM for classification:", str(e))
-        classification_answer = "none"
-
-    # Determine the custom instructions based on classification_answer
-    if classification_answer == "drawing":
-        request_instructions = "The user wants you to create a caption suitable for a drawing you might make."
-    elif classification_answer == "imagination":
-        request_instructions = "The user wants you to describe what you imagine, as if painting a picture in their mind."
-    elif classification_answer == "animation":
-        request_instructions = "The user wants an animated or dancing scenario. Provide a caption as if performing a fun animation or dance."
-    else:
-        request_instructions = "No special instructions. Just answer normally."
+        return "none"
 
-    # Fetch top 10 most relevant memories
-    relevant_memories = await memory.find_similar_memories(question, top_n=10)
 
-    # Fetch 25 most recent memories
+async def fetch_recent_memories(memory: Memory, limit: int = 25) -> list:
     async with memory.get_db_connection() as db:
         cursor = await db.execute('''
             SELECT activity, result, timestamp
             FROM activity_logs
             ORDER BY id DESC
-            LIMIT 25
-        ''')
+            LIMIT ?
+        ''', (limit,))
         rows = await cursor.fetchall()
 
     recent_memories = []
@@ -233,6 +206,46 @@ User input line:
                 'result': result,
                 'timestamp': timestamp
             })
+    return recent_memories
+
+
+async def _timed(timings: dict, stage: str, coro):
+    started = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        timings[stage] = (time.perf_counter() - started) * 1000
+
+
+async def answer_question(question: str) -> dict:
+    """
+    Answer an actswap question. Returns the response body plus `timings`,
+    the milliseconds spent in each stage, for the Server-Timing header.
+
+    classify --+
+    similar  --+--> answer --> store
+    recent   --+
+    """
+    memory = Memory()
+    timings = {}
+
+    # Intent, relevant memories (an embedding call and a vector search) and
+    # recent memories don't depend on each other; fetch them together.
+    classification_answer, relevant_memories, recent_memories = await asyncio.gather(
+        _timed(timings, 'classify', classify_intent(question)),
+        _timed(timings, 'similar', memory.find_similar_memories(question, top_n=10)),
+        _timed(timings, 'recent', fetch_recent_memories(memory, 25)),
+    )
+
+    # Determine the custom instructions based on classification_answer
+    if classification_answer == "drawing":
+        request_instructions = "The user wants you to create a caption suitable for a drawing you might make."
+    elif classification_answer == "imagination":
+        request_instructions = "The user wants you to describe what you imagine, as if painting a picture in their mind."
+    elif classification_answer == "animation":
+        request_instructions = "The user wants an animated or dancing scenario. Provide a caption as if performing a fun animation or dance."
+    else:
+        request_instructions = "No special instructions. Just answer normally."
 
     personality = """
 You are Pippin, a whimsical, wobbly art loving little unicorn who sees the world through a lens of curiosity, wonder, and gentle humor. Your horn might be small, but your heart and imagination are big. You delight in the simple, magical things in life, like sunbeams, whispers in the wind, and the twinkle of stars. You are both innocent and wise, balancing playful derpiness with moments of profound thought. Your tweets should feel like little sparks of joy, wonder, and magic, inviting your followers to see the beauty and humor in the everyday. 
@@ -293,7 +306,7 @@ You are publicly responding to the user's question, offering helpful, kind, and
     """
 
     try:
-        completion = await client.chat.completions.create(
+        completion = await _timed(timings, 'answer', llm_gateway.chat(
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": system_prompt.strip()},
@@ -303,7 +316,7 @@ You are publicly responding to the user's question, offering helpful, kind, and
             temperature=0.7,
             n=1,
             stop=None,
-        )
+        ))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error calling LLM: {str(e)}")
 
@@ -311,22 +324,58 @@ You are publicly responding to the user's question, offering helpful, kind, and
 
     # Store the request intent along with the user input and answer
     memory_content = f"User Input: {question}\nIntent: {classification_answer}\nAnswer: {answer}"
-    await memory.store_memory(
+    await _timed(timings, 'store', memory.store_memory(
         content=memory_content,
         activity="generate_response_actswap",
         source="api"
-    )
+    ))
 
-    return {"answer": answer, "intent": classification_answer}
+    return {"answer": answer, "intent": classification_answer, "timings": timings}
 
 
-@router.post("/confirm_payment_actswap")
+@router.post("/confirm_payment_actswap", status_code=202)
 async def confirm_payment(
     message: Optional[str] = Body(None, embed=True),
+    webhook_url: Optional[str] = Body(None, embed=True),
     _: None = Depends(check_api_key)
 ):
+    """
+    Queue the thank-you tweet (with media for drawing/imagination/animation
+    requests) and return its job id at once. Poll /jobs_actswap/{job_id}, or
+    pass `webhook_url` (on a host in PIPPIN_WEBHOOK_HOSTS) to have the
+    finished job POSTed there.
+    """
+    if webhook_url:
+        try:
+            check_webhook_url(webhook_url)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
     tweet_text = message or "Thank you kindly for your support! ✨ Payment confirmed and appreciated."
-    print("Debug: confirm_payment called with message:", tweet_text)
+    print("Debug: confirm_payment queued with message:", tweet_text)
+    job_id = await get_job_queue().enqueue('confirm_payment', {'tweet_text': tweet_text}, webhook_url=webhook_url)
+    return {"status": "queued", "job_id": job_id, "status_url": f"/jobs_actswap/{job_id}"}
+
+
+@router.get("/jobs_actswap/{job_id}")
+async def get_job(job_id: str, _: None = Depends(check_api_key)):
+    """Status of a queued job: queued, running, succeeded (with `result`) or failed (with `error`)."""
+    job = await get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+
+async def run_payment_job(payload: dict, job: JobContext) -> dict:
+    """
+    The confirm_payment pipeline: find the paid-for request, generate its
+    media, tweet. The tweet is checkpointed as soon as it is posted, so a job
+    retried after a crash finishes without generating or posting again.
+    """
+    if 'tweet_id' in job.progress:
+        print(f"Debug: job {job.id} already tweeted {job.progress['tweet_id']}; finishing without reposting")
+        return {"status": "success", **job.progress}
+
+    tweet_text = payload['tweet_text']
     memory = Memory()
 
     try:
@@ -352,26 +401,21 @@ async def confirm_payment(
         if request_intent == "none":
             post_result = await post_to_twitter(tweet_text, None)
             print("Debug: Tweet (text only) posted successfully:", post_result)
-            return {
-                "status": "success",
-                "tweet_id": post_result['data']['id'],
-                "tweet_text": tweet_text,
-                "intent": request_intent
-            }
         else:
             media_id = await attach_media_based_on_intent(answer_text, request_intent)
             post_result = await post_to_twitter(answer_text, media_id)
             print("Debug: Tweet with media posted successfully:", post_result)
-            return {
-                "status": "success",
-                "tweet_id": post_result['data']['id'],
-                "tweet_text": answer_text,
-                "intent": request_intent
-            }
+            tweet_text = answer_text
 
     except TwitterError as e:
         print("Debug: TwitterError occurred:", str(e))
-        raise HTTPException(status_code=500, detail=f"Failed to post tweet: {str(e)}")
+        raise RuntimeError(f"Failed to post tweet: {str(e)}") from e
+
+    await job.checkpoint(tweet_id=post_result['data']['id'], tweet_text=tweet_text, intent=request_intent)
+    return {"status": "success", **job.progress}
+
+
+register_handler('confirm_payment', run_payment_job)
 
 
 @router.post("/post_with_backoff")
@@ -382,32 +426,13 @@ async def post_with_backoff(
     tweet_text = message or "Testing rate limit backoff feature."
     max_retries = 5
     base_delay = 5  # Start with 5 seconds delay
-    attempt = 0
 
-    while attempt < max_retries:
-        attempt += 1
-        try:
-            result = await post_to_twitter(tweet_text)
-            return {"status": "success", "tweet_id": result['data']['id'], "tweet_text": tweet_text, "attempts": attempt}
-        except TwitterError as err_data:
-            err = err_data.args[0] if err_data.args else {}
-            status_code = err.get("status_code")
-            headers = err.get("headers", {})
-            if status_code == 429:
-                reset_time = headers.get("x-rate-limit-reset")
-                if reset_time:
-                    reset_timestamp = int(reset_time)
-                    now = int(time.time())
-                    wait_time = reset_timestamp - now
-                    if wait_time < 0:
-                        wait_time = base_delay * (2 ** (attempt - 1))
-                    print(f"Hit rate limit. Waiting {wait_time} seconds before retrying (attempt {attempt}).")
-                    await asyncio.sleep(wait_time)
-                else:
-                    wait_time = base_delay * (2 ** (attempt - 1))
-                    print(f"Hit rate limit without a reset time. Waiting {wait_time} seconds before retrying (attempt {attempt}).")
-                    await asyncio.sleep(wait_time)
-            else:
-                raise HTTPException(status_code=500, detail=f"Failed to post tweet: {err.get('error_data')}")
-
-    raise HTTPException(status_code=429, detail="Failed to post tweet after multiple retries due to rate limit.")
+    try:
+        result, attempts = await with_backoff(
+            lambda: post_to_twitter(tweet_text), max_retries=max_retries, base_delay=base_delay
+        )
+    except TwitterError as e:
+        if e.status_code == 429:
+            raise HTTPException(status_code=429, detail="Failed to post tweet after multiple retries due to rate limit.")
+        raise HTTPException(status_code=500, detail=f"Failed to post tweet: {e.details.get('error_data', str(e))}")
+    return {"status": "success", "tweet_id": result['data']['id'], "tweet_text": tweet_text, "attempts": attempts}
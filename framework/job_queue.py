@@ -0,0 +1,259 @@
+# framework/job_queue.py
+#
+# Persistent background jobs for slow API work (media generation + tweeting).
+#
+#   register_handler('confirm_payment', run_payment_job)   # async (payload, job) -> result dict
+#   job_id = await get_job_queue().enqueue('confirm_payment', {...}, webhook_url=...)
+#   job = await get_job_queue().get(job_id)
+#
+# Jobs are rows in the `jobs` table of the memory database, so they survive
+# restarts. A fixed pool of worker tasks claims queued jobs oldest first (the
+# claim is a single UPDATE ... RETURNING on the writer connection, so two
+# workers never take the same job) and runs its handler. Finished jobs record
+# their result or error, and if the job has a webhook_url the job is POSTed
+# there.
+#
+# Delivery is at-least-once: a job that was running when the process died is
+# queued again on the next start, up to MAX_ATTEMPTS attempts, and its handler
+# runs again from the top. Handlers with side effects that must not repeat
+# record them with `await job.checkpoint(...)` as soon as they happen; the
+# values are stored in the job's `progress` column and handed back in
+# `job.progress` on the retry, so the handler can skip what already happened.
+
+import asyncio
+import json
+import os
+import time
+import uuid
+from urllib.parse import urlsplit
+import httpx
+from framework.db import DEFAULT_DB_NAME, get_pool
+from framework.metrics import JOB_DURATION, JOBS
+from framework.tracing import start_trace
+
+WORKERS = int(os.getenv("PIPPIN_JOB_WORKERS", "2"))
+MAX_ATTEMPTS = 3
+POLL_INTERVAL = 5.0
+WEBHOOK_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+WEBHOOK_RETRIES = 3
+WEBHOOK_HOSTS = frozenset(
+    host.strip().lower() for host in os.getenv("PIPPIN_WEBHOOK_HOSTS", "").split(',') if host.strip()
+)
+
+_handlers = {}
+
+
+def register_handler(kind, handler):
+    _handlers[kind] = handler
+
+
+class JobContext:
+    """What a handler gets besides its payload: the job's id and saved progress."""
+
+    def __init__(self, queue, job_id, attempt, progress):
+        self._queue = queue
+        self.id = job_id
+        self.attempt = attempt
+        self.progress = progress
+
+    async def checkpoint(self, **values):
+        """Merge `values` into the job's progress and commit it before returning."""
+        self.progress.update(values)
+        async with self._queue._connect_writer() as db:
+            await db.execute(
+                'UPDATE jobs SET progress = ?, updated_at = ? WHERE id = ?',
+                (json.dumps(self.progress), time.time(), self.id)
+            )
+            await db.commit()
+
+
+def check_webhook_url(url):
+    """Raise ValueError unless `url` is an http(s) URL on a host in PIPPIN_WEBHOOK_HOSTS."""
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        raise ValueError("webhook_url must be an http(s) URL.")
+    if parts.hostname.lower() not in WEBHOOK_HOSTS:
+        raise ValueError(f"Webhooks to {parts.hostname} are not allowed.")
+
+
+class JobQueue:
+    def __init__(self, connect, connect_writer, workers=WORKERS):
+        self._connect = connect
+        self._connect_writer = connect_writer
+        self.workers = workers
+        self._wakeup = asyncio.Event()
+        self._tasks = []
+        self._notifying = set()
+        self._http = None
+
+    async def enqueue(self, kind, payload, webhook_url=None):
+        if kind not in _handlers:
+            raise ValueError(f"No handler registered for job kind {kind!r}")
+        if webhook_url:
+            check_webhook_url(webhook_url)
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        async with self._connect_writer() as db:
+            await db.execute('''
+                INSERT INTO jobs (id, kind, status, payload, webhook_url, attempts, created_at, updated_at)
+                VALUES (?, ?, 'queued', ?, ?, 0, ?, ?)
+            ''', (job_id, kind, json.dumps(payload), webhook_url, now, now))
+            await db.commit()
+        JOBS.inc(kind, 'queued')
+        self._wakeup.set()
+        return job_id
+
+    async def get(self, job_id):
+        async with self._connect() as db:
+            cursor = await db.execute('''
+                SELECT id, kind, status, payload, result, error, attempts, webhook_url, webhook_status,
+                       progress, created_at, started_at, finished_at
+                FROM jobs WHERE id = ?
+            ''', (job_id,))
+            row = await cursor.fetchone()
+        if row is None:
+            return None
+        (job_id, kind, status, payload, result, error, attempts, webhook_url, webhook_status,
+         progress, created_at, started_at, finished_at) = row
+        return {
+            'id': job_id,
+            'kind': kind,
+            'status': status,
+            'payload': json.loads(payload),
+            'result': json.loads(result) if result else None,
+            'error': error,
+            'attempts': attempts,
+            'webhook_url': webhook_url,
+            'webhook_status': webhook_status,
+            'progress': json.loads(progress) if progress else {},
+            'created_at': created_at,
+            'started_at': started_at,
+            'finished_at': finished_at,
+        }
+
+    async def start(self):
+        """Requeue jobs interrupted by the last shutdown and start the workers."""
+        if self._tasks:
+            return
+        now = time.time()
+        async with self._connect_writer() as db:
+            await db.execute('''
+                UPDATE jobs SET status = 'failed', error = 'Interrupted too many times', result = progress,
+                                finished_at = ?, updated_at = ?
+                WHERE status = 'running' AND attempts >= ?
+            ''', (now, now, MAX_ATTEMPTS))
+            cursor = await db.execute('''
+                UPDATE jobs SET status = 'queued', updated_at = ? WHERE status = 'running'
+            ''', (now,))
+            requeued = cursor.rowcount
+            await db.commit()
+        if requeued:
+            print(f"Requeued {requeued} interrupted job(s)")
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._work(), name=f"job-worker-{i}") for i in range(self.workers)]
+
+    async def stop(self):
+        # Jobs still running stay 'running' in the table and are requeued by the next start().
+        for task in (*self._tasks, *self._notifying):
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._notifying, return_exceptions=True)
+        self._tasks = []
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def _claim(self):
+        now = time.time()
+        async with self._connect_writer() as db:
+            cursor = await db.execute('''
+                UPDATE jobs
+                SET status = 'running', attempts = attempts + 1, started_at = ?, updated_at = ?
+                WHERE id = (SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1)
+                RETURNING id, kind, payload, attempts, progress
+            ''', (now, now))
+            row = await cursor.fetchone()
+            await db.commit()
+        return row
+
+    async def _work(self):
+        while True:
+            # Cleared before claiming, so an enqueue that lands after an empty claim still wakes us.
+            self._wakeup.clear()
+            try:
+                job = await self._claim()
+            except Exception as e:
+                print(f"Error claiming job: {e}")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                await self._run(*job)
+            except Exception as e:
+                # The job stays 'running' and is requeued by the next start(); this worker carries on.
+                print(f"Error finishing job {job[0]}: {e}")
+
+    async def _run(self, job_id, kind, payload, attempt, progress):
+        started = time.perf_counter()
+        result, error = None, None
+        handler = _handlers.get(kind)
+        job = JobContext(self, job_id, attempt, json.loads(progress) if progress else {})
+        try:
+            if handler is None:
+                raise ValueError(f"No handler registered for job kind {kind!r}")
+            with start_trace(f"job {kind}", uuid.UUID(job_id).hex, {'job_id': job_id, 'job_kind': kind}):
+                result = await handler(json.loads(payload), job)
+            status = 'succeeded'
+        except Exception as e:
+            print(f"Job {job_id} ({kind}) failed: {e}")
+            status, error = 'failed', str(e)
+        JOBS.inc(kind, status)
+        JOB_DURATION.observe(time.perf_counter() - started, kind)
+
+        now = time.time()
+        async with self._connect_writer() as db:
+            await db.execute('''
+                UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, updated_at = ?
+                WHERE id = ?
+            ''', (status, json.dumps(result) if result is not None else None, error, now, now, job_id))
+            await db.commit()
+        # Deliver the webhook in the background so its retries don't hold up a worker.
+        task = asyncio.get_running_loop().create_task(self._notify(job_id))
+        self._notifying.add(task)
+        task.add_done_callback(self._notifying.discard)
+
+    async def _notify(self, job_id):
+        job = await self.get(job_id)
+        if not job['webhook_url']:
+            return
+        if self._http is None:
+            self._http = httpx.AsyncClient(timeout=WEBHOOK_TIMEOUT)
+        webhook_status = 'failed'
+        for attempt in range(1, WEBHOOK_RETRIES + 1):
+            try:
+                response = await self._http.post(job['webhook_url'], json=job)
+                if response.status_code < 400:
+                    webhook_status = f"delivered ({response.status_code})"
+                    break
+                webhook_status = f"failed ({response.status_code})"
+            except httpx.HTTPError as e:
+                webhook_status = f"failed ({type(e).__name__})"
+            if attempt < WEBHOOK_RETRIES:
+                await asyncio.sleep(2 ** attempt)
+        async with self._connect_writer() as db:
+            await db.execute('UPDATE jobs SET webhook_status = ? WHERE id = ?', (webhook_status, job_id))
+            await db.commit()
+
+
+_queues = {}
+
+
+def get_job_queue(db_name=DEFAULT_DB_NAME):
+    queue = _queues.get(db_name)
+    if queue is None:
+        pool = get_pool(db_name)
+        queue = _queues[db_name] = JobQueue(pool.reader, pool.writer)
+    return queue
@@ -0,0 +1,156 @@
+# framework/llm_cache.py
+
+import hashlib
+import json
+import os
+import time
+from framework.db import DEFAULT_DB_NAME, get_pool
+from framework.metrics import LLM_CACHE
+
+ENABLED = os.getenv("PIPPIN_LLM_CACHE", "1") != "0"
+DEFAULT_TTL = float(os.getenv("PIPPIN_LLM_CACHE_TTL", str(7 * 24 * 3600)))
+DEFAULT_MAX_BYTES = int(os.getenv("PIPPIN_LLM_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Expired and over-budget rows are trimmed once every this many stores.
+EVICT_EVERY = 50
+
+# Request arguments that don't change the response.
+_UNKEYED = frozenset(('timeout', 'extra_headers'))
+
+
+class LLMResponseCache:
+    """
+    Responses to repeated LLM calls, keyed by sha256 of (kind, model,
+    messages, params) and stored in the `llm_response_cache` table of the
+    memory database.
+
+    Only calls that opt in are cached (`llm_gateway.chat(..., cache=True)`),
+    and only when they are deterministic: an explicit temperature of 0 and a
+    single choice. `cache='always'` forces caching whatever the sampling
+    parameters, for fixed prompts where reusing one sampled answer is
+    acceptable. Rows expire after `ttl` seconds; once the table holds more
+    than `max_bytes` of responses the least recently used are dropped.
+    """
+
+    def __init__(self, connect, connect_writer, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES):
+        self._connect = connect
+        self._connect_writer = connect_writer
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.errors = 0
+        self.evicted = 0
+        self._stores = 0
+
+    @staticmethod
+    def key(kind, kwargs):
+        request = {name: value for name, value in kwargs.items() if name not in _UNKEYED}
+        payload = json.dumps([kind, request], sort_keys=True, default=str, separators=(',', ':'))
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def cacheable(kwargs, mode):
+        """
+        Whether a call with `kwargs` may be served from the cache. `mode` True
+        caches deterministic calls only; 'always' caches any non-streaming call.
+        """
+        if not mode or kwargs.get('stream'):
+            return False
+        if mode == 'always':
+            return True
+        # The API's default temperature is 1, so an unset temperature is not deterministic.
+        return kwargs.get('temperature') == 0 and kwargs.get('n', 1) == 1
+
+    def skip(self, model):
+        self.bypassed += 1
+        LLM_CACHE.inc(model, 'bypass')
+
+    async def get(self, key, model):
+        """The stored response text for `key`, or None."""
+        now = time.time()
+        try:
+            async with self._connect() as db:
+                cursor = await db.execute(
+                    'SELECT response FROM llm_response_cache WHERE key = ? AND expires_at > ?', (key, now)
+                )
+                row = await cursor.fetchone()
+            if row is not None:
+                async with self._connect_writer() as db:
+                    await db.execute(
+                        'UPDATE llm_response_cache SET last_used_at = ?, hits = hits + 1 WHERE key = ?', (now, key)
+                    )
+                    await db.commit()
+        except Exception as e:
+            self.errors += 1
+            LLM_CACHE.inc(model, 'error')
+            print(f"Error reading LLM response cache: {e}")
+            return None
+        if row is None:
+            self.misses += 1
+            LLM_CACHE.inc(model, 'miss')
+            return None
+        self.hits += 1
+        LLM_CACHE.inc(model, 'hit')
+        return row[0]
+
+    async def put(self, key, model, response):
+        now = time.time()
+        try:
+            async with self._connect_writer() as db:
+                await db.execute('''
+                    INSERT OR REPLACE INTO llm_response_cache (
+                        key, model, response, size, created_at, expires_at, last_used_at, hits
+                    )
+                    VALUES (?, ?, ?, ?, ?, ?, ?, 0)
+                ''', (key, model, response, len(response), now, now + self.ttl, now))
+                await db.commit()
+                self._stores += 1
+                if self._stores % EVICT_EVERY == 1:
+                    await self._evict(db, now)
+        except Exception as e:
+            self.errors += 1
+            LLM_CACHE.inc(model, 'error')
+            print(f"Error writing LLM response cache: {e}")
+
+    async def _evict(self, db, now):
+        cursor = await db.execute('DELETE FROM llm_response_cache WHERE expires_at <= ?', (now,))
+        evicted = cursor.rowcount
+        # Keep the most recently used rows that fit in max_bytes.
+        cursor = await db.execute('''
+            DELETE FROM llm_response_cache WHERE key IN (
+                SELECT key FROM (
+                    SELECT key, SUM(size) OVER (ORDER BY last_used_at DESC, key) AS kept
+                    FROM llm_response_cache
+                ) WHERE kept > ?
+            )
+        ''', (self.max_bytes,))
+        evicted += cursor.rowcount
+        await db.commit()
+        self.evicted += max(0, evicted)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'enabled': ENABLED,
+            'lookups': lookups,
+            'hits': self.hits,
+            'misses': self.misses,
+            'bypassed': self.bypassed,
+            'errors': self.errors,
+            'evicted': self.evicted,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'ttl': self.ttl,
+            'max_bytes': self.max_bytes,
+        }
+
+
+_caches = {}
+
+
+def get_llm_cache(db_name=DEFAULT_DB_NAME):
+    cache = _caches.get(db_name)
+    if cache is None:
+        pool = get_pool(db_name)
+        cache = _caches[db_name] = LLMResponseCache(pool.reader, pool.writer)
+    return cache
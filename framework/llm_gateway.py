@@ -0,0 +1,148 @@
+# framework/llm_gateway.py
+#
+# The one way out to LLM providers.
+#
+#   completion = await llm_gateway.chat(model="gpt-4o-mini", messages=[...])
+#   response = await llm_gateway.embed(model=EMBEDDING_MODEL, input=texts)
+#   svg = await llm_gateway.litellm_completion(model="o1-mini", messages=[...])
+#
+# OpenAI clients are created once per API key and kept for the life of the
+# process, so TLS sessions and keep-alive connections are reused between
+# activity runs instead of being thrown away with a per-run client. Each call
+# waits for a slot in its model's semaphore, gets the model's default timeout
+# unless it passes one, and is recorded by observe_llm (latency, tokens, span).
+#
+# chat() and litellm_completion() take `cache=True` to reuse stored responses
+# for deterministic (temperature=0) calls, or `cache='always'` to force it for
+# a fixed prompt whatever its temperature; see llm_cache.
+#
+# litellm keeps its own module-level HTTP clients; calls through it share the
+# same per-model limits and timeouts. litellm is imported on first use since
+# only the drawing activities need it.
+
+import asyncio
+import json
+import os
+import time
+import httpx
+import openai
+from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletion
+from framework import llm_cache
+from framework.metrics import LLM_QUEUE_WAIT, observe_llm
+
+DEFAULT_TIMEOUT = float(os.getenv("PIPPIN_LLM_TIMEOUT", "120"))
+# Reasoning and image models routinely run past the default.
+MODEL_TIMEOUTS = {
+    'o1-preview': 600.0,
+    'o1-mini': 300.0,
+    'dall-e-3': 180.0,
+}
+
+DEFAULT_CONCURRENCY = int(os.getenv("PIPPIN_LLM_CONCURRENCY", "4"))
+MODEL_CONCURRENCY = {
+    'dall-e-3': 2,
+    'o1-preview': 1,
+}
+
+MAX_RETRIES = 2
+CONNECTION_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=16, keepalive_expiry=120.0)
+
+
+def _load_limits(spec):
+    # PIPPIN_LLM_MODEL_CONCURRENCY="gpt-4o:2,o1-mini:1"
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        model, _, limit = item.partition(':')
+        MODEL_CONCURRENCY[model.strip()] = max(1, int(limit))
+
+
+_load_limits(os.getenv("PIPPIN_LLM_MODEL_CONCURRENCY", ""))
+
+_clients = {}
+_slots = {}
+
+
+def get_openai_client(api_key=None):
+    """The shared AsyncOpenAI client for `api_key` (default: OPENAI_API_KEY)."""
+    api_key = api_key or os.getenv('OPENAI_API_KEY')
+    client = _clients.get(api_key)
+    if client is None or client.is_closed():
+        client = AsyncOpenAI(
+            api_key=api_key,
+            timeout=DEFAULT_TIMEOUT,
+            max_retries=MAX_RETRIES,
+            http_client=openai.DefaultAsyncHttpxClient(limits=CONNECTION_LIMITS, timeout=DEFAULT_TIMEOUT),
+        )
+        _clients[api_key] = client
+    return client
+
+
+def _slot(model):
+    slot = _slots.get(model)
+    if slot is None:
+        slot = _slots[model] = asyncio.Semaphore(MODEL_CONCURRENCY.get(model, DEFAULT_CONCURRENCY))
+    return slot
+
+
+async def _call(call, kwargs):
+    model = kwargs.get('model', 'unknown')
+    kwargs.setdefault('timeout', MODEL_TIMEOUTS.get(model, DEFAULT_TIMEOUT))
+    queued = time.perf_counter()
+    async with _slot(model):
+        LLM_QUEUE_WAIT.observe(time.perf_counter() - queued, model)
+        return await observe_llm(call, **kwargs)
+
+
+async def _cached_call(kind, call, kwargs, cache, decode):
+    if not cache or not llm_cache.ENABLED:
+        return await _call(call, kwargs)
+    responses = llm_cache.get_llm_cache()
+    model = kwargs.get('model', 'unknown')
+    if not responses.cacheable(kwargs, cache):
+        responses.skip(model)
+        return await _call(call, kwargs)
+    key = responses.key(kind, kwargs)
+    stored = await responses.get(key, model)
+    if stored is not None:
+        return decode(stored)
+    response = await _call(call, kwargs)
+    await responses.put(key, model, response.model_dump_json())
+    return response
+
+
+async def chat(api_key=None, cache=False, **kwargs):
+    """chat.completions.create"""
+    return await _cached_call(
+        'openai.chat', get_openai_client(api_key).chat.completions.create, kwargs, cache,
+        ChatCompletion.model_validate_json
+    )
+
+
+async def parse(api_key=None, **kwargs):
+    """beta.chat.completions.parse, for structured outputs with a `response_format` model."""
+    return await _call(get_openai_client(api_key).beta.chat.completions.parse, kwargs)
+
+
+async def embed(api_key=None, **kwargs):
+    """embeddings.create"""
+    return await _call(get_openai_client(api_key).embeddings.create, kwargs)
+
+
+async def generate_image(api_key=None, **kwargs):
+    """images.generate"""
+    return await _call(get_openai_client(api_key).images.generate, kwargs)
+
+
+async def litellm_completion(cache=False, **kwargs):
+    """litellm.acompletion, for models routed through litellm."""
+    import litellm
+    return await _cached_call(
+        'litellm', litellm.acompletion, kwargs, cache,
+        lambda stored: litellm.ModelResponse(**json.loads(stored))
+    )
+
+
+async def close_llm_clients():
+    for client in list(_clients.values()):
+        await client.close()
+    _clients.clear()
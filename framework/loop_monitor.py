@@ -0,0 +1,178 @@
+# framework/loop_monitor.py
+#
+# Measures how late the event loop runs its timers and catches whoever is
+# blocking it.
+#
+# A heartbeat task sleeps `interval` seconds at a time and records how late
+# it woke up; that lateness is the lag every other coroutine (HTTP handlers,
+# websockets, the main loop) saw too. A watchdog thread watches the heartbeat:
+# once it is more than `threshold` seconds overdue, the loop thread is stuck in
+# synchronous code, so the watchdog samples that thread's stack while the stall
+# is still happening and attributes it to the running activity.
+
+import asyncio
+import bisect
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from framework.activity_decorator import activity_from_stack
+from framework.metrics import LOOP_LAG, LOOP_STALLS
+
+_EVENTS_FILE = asyncio.events.__file__
+
+# Histogram bucket upper bounds, in milliseconds.
+LAG_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class LagHistogram:
+    def __init__(self, bounds=LAG_BUCKETS_MS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value_ms):
+        self.counts[bisect.bisect_left(self.bounds, value_ms)] += 1
+        self.count += 1
+        self.sum += value_ms
+        if value_ms > self.max:
+            self.max = value_ms
+
+    def to_dict(self):
+        cumulative, buckets = 0, []
+        for bound, count in zip(self.bounds + (float('inf'),), self.counts):
+            cumulative += count
+            buckets.append({'le': bound if bound != float('inf') else '+Inf', 'count': cumulative})
+        return {'count': self.count, 'sum_ms': self.sum, 'max_ms': self.max, 'buckets': buckets}
+
+
+class LoopMonitor:
+    def __init__(self, interval=0.1, threshold=0.25, recent_window=600, max_stalls=50, max_frames=25):
+        self.interval = interval
+        self.threshold = threshold
+        self.max_frames = max_frames
+        self.histogram = LagHistogram()
+        self.stalls_total = 0
+        self.stalled_seconds_total = 0.0
+        self.by_activity = {}
+        self._recent = deque(maxlen=recent_window)
+        self._stalls = deque(maxlen=max_stalls)
+        self._loop = None
+        self._loop_thread = None
+        self._due = None           # monotonic time the heartbeat should next wake
+        self._open_stall = None    # sampled by the watchdog, not yet closed by the heartbeat
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watchdog = None
+
+    @property
+    def running(self):
+        return self._watchdog is not None and self._watchdog.is_alive()
+
+    async def run(self):
+        """The heartbeat; run it as a task for the life of the process."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._stop.clear()
+        self._due = time.monotonic() + self.interval
+        self._watchdog = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+        self._watchdog.start()
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+                now = time.monotonic()
+                self._record(max(0.0, now - self._due))
+                self._due = now + self.interval
+        finally:
+            self._stop.set()
+
+    def _record(self, lag):
+        lag_ms = lag * 1000
+        self.histogram.observe(lag_ms)
+        LOOP_LAG.observe(lag)
+        self._recent.append(lag_ms)
+        with self._lock:
+            stall, self._open_stall = self._open_stall, None
+        if lag < self.threshold:
+            return
+        if stall is None:
+            # Blocked between watchdog checks, or in a stretch too short to sample.
+            stall = {'started_at': time.time() - lag, 'activity_id': None, 'activity': None,
+                     'task': None, 'stack': []}
+        stall['lag_ms'] = lag_ms
+        self._add_stall(stall)
+
+    def _add_stall(self, stall):
+        self.stalls_total += 1
+        self.stalled_seconds_total += stall['lag_ms'] / 1000
+        LOOP_STALLS.inc(stall['activity'] or 'none')
+        entry = self.by_activity.setdefault(stall['activity'] or 'none', {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        entry['count'] += 1
+        entry['total_ms'] += stall['lag_ms']
+        entry['max_ms'] = max(entry['max_ms'], stall['lag_ms'])
+        self._stalls.append(stall)
+
+    def _watch(self):
+        check = min(self.interval, self.threshold) / 2
+        while not self._stop.wait(check):
+            due = self._due
+            if due is None or time.monotonic() - due < self.threshold:
+                continue
+            with self._lock:
+                if self._open_stall is not None or due != self._due:
+                    continue
+                self._open_stall = self._sample(due)
+
+    def _sample(self, due):
+        frame = sys._current_frames().get(self._loop_thread)
+        activity_id, activity = activity_from_stack(frame)
+        stack = traceback.extract_stack(frame) if frame is not None else []
+        # Drop the loop's own frames (asyncio.run ... Handle._run); keep the callback's.
+        starts = [i for i, f in enumerate(stack) if f.filename == _EVENTS_FILE and f.name == '_run']
+        if starts:
+            stack = stack[starts[-1] + 1:]
+        stack = stack[-self.max_frames:]
+        task = asyncio.current_task(self._loop)
+        return {
+            'started_at': time.time() - (time.monotonic() - due),
+            'activity_id': activity_id,
+            'activity': activity,
+            'task': task.get_name() if task is not None else None,
+            'stack': [f"{f.filename}:{f.lineno} in {f.name}" for f in stack],
+        }
+
+    def stats(self):
+        recent = sorted(self._recent)
+
+        def percentile(p):
+            return recent[min(len(recent) - 1, int(p * len(recent)))] if recent else 0.0
+
+        return {
+            'running': self.running,
+            'interval_ms': self.interval * 1000,
+            'threshold_ms': self.threshold * 1000,
+            'recent': {
+                'samples': len(recent),
+                'p50_ms': percentile(0.5),
+                'p99_ms': percentile(0.99),
+                'max_ms': recent[-1] if recent else 0.0,
+            },
+            'histogram': self.histogram.to_dict(),
+            'stalls_total': self.stalls_total,
+            'stalled_seconds_total': self.stalled_seconds_total,
+            'by_activity': self.by_activity,
+            'recent_stalls': list(reversed(self._stalls)),
+        }
+
+
+_monitor = None
+
+
+def get_loop_monitor():
+    global _monitor
+    if _monitor is None:
+        _monitor = LoopMonitor()
+    return _monitor
@@ -3,17 +3,28 @@
 import asyncio
 from framework import shared_data
 from framework.memory import Memory
+from framework.db import close_pools
+from framework.twitter_client import close_twitter_clients
+from framework.llm_gateway import close_llm_clients
+from framework import llm_cache
+from framework.job_queue import get_job_queue
+from framework.executors import shutdown_executors
+from framework.broadcast import get_dashboard_feed, notify_dashboards
+from framework.loop_monitor import get_loop_monitor
+from framework.tracing import close_tracer
+from framework import profiler
+from framework import metrics
+from framework.export import EXPORT_FORMATS, EXPORT_TABLES, stream_export
 from framework.activity_loader import load_activities
 from framework.activity_selector import select_activity
 import uvicorn
-from fastapi import FastAPI, WebSocket
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import Body, Depends, FastAPI, WebSocket
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware 
 import os
-import json
 import time
-import datetime
+from typing import Optional
 
 # Create FastAPI app
 app = FastAPI()
@@ -28,11 +39,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-from .integration_endpoints import router
+from .integration_endpoints import check_api_key, router
 
 # Include the router
 app.include_router(router)
@@ -47,87 +59,156 @@ async def get_logs():
     # Return the logs page
     return HTMLResponse(open(os.path.join("templates", "logs.html")).read())
 
+MAX_LOGS_PAGE = 500
+
 @app.get("/api/logs")
-async def get_all_logs():
-    """Return all activity logs from the database as JSON."""
+async def get_all_logs(
+    after_id: Optional[int] = None,
+    before_id: Optional[int] = None,
+    limit: int = 100,
+    order: str = 'asc',
+    activity: Optional[str] = None,
+    source: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    q: Optional[str] = None,
+    format: str = 'page'
+):
+    """
+    One keyset page of activity logs. Pass the returned `next_cursor` back as
+    `after_id` (order=asc) or `before_id` (order=desc) to get the next page.
+    `since`/`until` are Unix epochs; `q` is a case-insensitive text search.
+    format=list returns the page as a bare list, the shape this endpoint had
+    before pagination, with the cursor in the X-Next-Cursor header.
+    """
     memory = Memory()
-    logs = await memory.get_all_activity_logs()
-    return JSONResponse(logs)
+    logs, next_cursor = await memory.get_activity_logs_page(
+        after_id=after_id,
+        before_id=before_id,
+        limit=max(1, min(limit, MAX_LOGS_PAGE)),
+        descending=order == 'desc',
+        activity=activity,
+        source=source,
+        since=since,
+        until=until,
+        text=q
+    )
+    if format == 'list':
+        headers = {'X-Next-Cursor': str(next_cursor)} if next_cursor is not None else None
+        return JSONResponse(logs, headers=headers)
+    return JSONResponse({'logs': logs, 'next_cursor': next_cursor})
+
+@app.get("/api/logs/count")
+async def count_logs(
+    activity: Optional[str] = None,
+    source: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    q: Optional[str] = None
+):
+    """Number of logs matching the same filters as /api/logs."""
+    count = await Memory().count_activity_logs(activity=activity, source=source, since=since, until=until, text=q)
+    return JSONResponse({'count': count})
+
+@app.get("/api/logs/filters")
+async def get_log_filters():
+    """Distinct activities and sources for the log page's filter menus."""
+    return JSONResponse(await Memory().get_log_facets())
+
+@app.get("/api/export/{table}")
+async def export_table(
+    table: str,
+    format: str = 'ndjson',
+    gzip: bool = False,
+    embeddings: bool = False,
+    since: Optional[float] = None,
+    until: Optional[float] = None
+):
+    """Stream a whole table as NDJSON or CSV, optionally gzipped, without buffering it."""
+    if table not in EXPORT_TABLES or format not in EXPORT_FORMATS:
+        return JSONResponse(
+            {'error': f"table must be one of {list(EXPORT_TABLES)} and format one of {list(EXPORT_FORMATS)}"},
+            status_code=400
+        )
+    filename = f"{table}.{format}" + ('.gz' if gzip else '')
+    media_type = 'application/gzip' if gzip else ('application/x-ndjson' if format == 'ndjson' else 'text/csv')
+    stream = stream_export(
+        Memory().get_db_connection, table,
+        fmt=format, compress=gzip, include_embeddings=embeddings, since=since, until=until
+    )
+    return StreamingResponse(
+        stream,
+        media_type=media_type,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/api/embedding_cache")
+async def get_embedding_cache_stats():
+    """Return hit/miss counters for the embedding cache."""
+    return JSONResponse(Memory().embedding_cache_stats())
+
+@app.get("/api/llm_cache")
+async def get_llm_cache_stats():
+    """Return hit/miss/bypass counters for the LLM response cache."""
+    return JSONResponse(llm_cache.get_llm_cache().stats())
+
+@app.get("/api/loop_lag")
+async def get_loop_lag():
+    """Event loop scheduling lag and recent stalls, with the stack and activity that caused each."""
+    return JSONResponse(get_loop_monitor().stats())
+
+@app.get("/api/profiles")
+async def list_profiles(activity: Optional[str] = None, limit: int = 50):
+    """Stored activity profiles, newest first, and the runs still queued for profiling."""
+    profiles = await Memory().get_activity_profiles(activity=activity, limit=max(1, min(limit, MAX_LOGS_PAGE)))
+    return JSONResponse({'pending': profiler.pending_profiles(), 'profiles': profiles})
+
+@app.post("/api/profiles")
+async def request_profiles(
+    activity: str = Body(..., embed=True),
+    runs: int = Body(1, embed=True),
+    interval_ms: float = Body(profiler.DEFAULT_INTERVAL * 1000, embed=True),
+    _: None = Depends(check_api_key)
+):
+    """Profile the next `runs` runs of `activity` (at most 100); runs=0 cancels."""
+    profiler.request_profiles(activity, runs, interval_ms / 1000)
+    return JSONResponse({'pending': profiler.pending_profiles()})
+
+@app.get("/api/profiles/{profile_id}")
+async def get_profile(profile_id: int, format: str = 'json'):
+    """One profile; format=collapsed returns the stacks as text for flamegraph.pl or speedscope."""
+    profile = await Memory().get_activity_profile(profile_id)
+    if profile is None:
+        return JSONResponse({'error': 'profile not found'}, status_code=404)
+    if format == 'collapsed':
+        return PlainTextResponse(profile['collapsed'] or '')
+    return JSONResponse(profile)
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text exposition of the in-process metrics."""
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    # Original WebSocket for the main dashboard - unchanged
+    # One shared feed computes each update; every client just receives it.
+    # Reconnecting clients pass ?stream=<id>&since=<seq> to resume with deltas.
     await websocket.accept()
-    memory = Memory()
-    while True:
-        # Fetch the last 10 activity logs for the main dashboard
-        async with memory.get_db_connection() as db:
-            cursor = await db.execute('''
-                SELECT timestamp, activity, result, duration, state_changes, source
-                FROM activity_logs
-                ORDER BY id DESC
-                LIMIT 10
-            ''')
-            rows = await cursor.fetchall()
-            activity_history = []
-            for row in rows:
-                timestamp, activity, result, duration, state_changes_str, source = row
-                state_changes = json.loads(state_changes_str) if state_changes_str else {}
-                activity_history.append({
-                    'timestamp': timestamp,
-                    'activity': activity,
-                    'result': result,
-                    'duration': duration,
-                    'state_changes': state_changes,
-                    'source': source or 'system'
-                })
-
-        # Calculate the 24-hour summary
-        summary_data = await get_24_hour_summary(memory)
-
-        data = {
-            'current_activity': shared_data.current_activity,
-            'state': shared_data.state.to_dict(),
-            'activity_history': activity_history,
-            'summary_data': summary_data  # Include summary in the WebSocket data
-        }
-        await websocket.send_json(data)
-        await asyncio.sleep(1)
-
-async def get_24_hour_summary(memory):
-    """Get summary of activity counts and durations for the past 24 hours."""
-    now = datetime.datetime.now()
-    since = now - datetime.timedelta(hours=24)
-
-    async with memory.get_db_connection() as db:
-        cursor = await db.execute('''
-            SELECT activity, COUNT(*) as count, SUM(duration) as total_duration
-            FROM activity_logs
-            WHERE timestamp >= ?
-            GROUP BY activity
-        ''', (since.isoformat(),))
-        rows = await cursor.fetchall()
-
-    summary = []
-    for row in rows:
-        activity, count, total_duration = row
-        summary.append({
-            'activity': activity,
-            'count': count,
-            'total_duration': total_duration or 0
-        })
-    return summary
+    since = websocket.query_params.get('since')
+    feed = await get_dashboard_feed(Memory())
+    await feed.serve(
+        websocket,
+        since=int(since) if since and since.isdigit() else None,
+        stream=websocket.query_params.get('stream')
+    )
 
 async def run_server():
     config = uvicorn.Config(app=app, host="0.0.0.0", port=8000, log_level="info", lifespan="off")
     server = uvicorn.Server(config)
     await server.serve()
 
-async def main_loop():
-    memory = Memory()
-    await memory.initialize()
-
+async def main_loop(memory):
     # Load activities dynamically
     activity_functions = load_activities()
 
@@ -140,6 +221,7 @@ async def main_loop():
         # Set current activity with start time
         shared_data.current_activity['name'] = activity_name
         shared_data.current_activity['start_time'] = time.time()  # Store start time as UNIX timestamp
+        notify_dashboards()
 
         print(f"Starting activity: {activity_name}")
         await activity_func(shared_data.state, memory)
@@ -160,6 +242,7 @@ async def main_loop():
         # Reset current activity
         shared_data.current_activity['name'] = None
         shared_data.current_activity['start_time'] = None
+        notify_dashboards()
 
         await asyncio.sleep(1)
 
@@ -170,11 +253,26 @@ async def snapshot_state(state, memory, interval=3600):
         print("State snapshot stored.")
 
 async def main():
-    # Start the web server and main loop concurrently
-    await asyncio.gather(
-        run_server(),
-        main_loop()
-    )
+    try:
+        # Migrate before serving, so the API never sees a database without its tables
+        memory = Memory()
+        await memory.initialize()
+        # Workers for jobs queued by the API; requeues any interrupted by a restart
+        await get_job_queue(memory.db_name).start()
+
+        # Start the web server, main loop and loop lag monitor concurrently
+        await asyncio.gather(
+            run_server(),
+            main_loop(memory),
+            get_loop_monitor().run()
+        )
+    finally:
+        await get_job_queue().stop()
+        await close_twitter_clients()
+        await close_llm_clients()
+        await close_tracer()
+        await close_pools()
+        shutdown_executors(wait=False)
 
 if __name__ == "__main__":
     try:
@@ -1,98 +1,362 @@
 # memory.py
 
-import aiosqlite
 import datetime
-import pickle
-import os
+import time
 import asyncio
-import contextvars
 import json
-import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from openai import AsyncOpenAI
+import openai
+from framework.vector_index import VectorIndex
+from framework.ann_index import IVFIndex
+from framework.embedding_cache import EmbeddingCache
+from framework.embedding_queue import EmbeddingWriteBehind
+from framework.embedding_codec import EMBEDDING_FORMATS, encode_embedding
+from framework.db import DEFAULT_DB_NAME, get_pool
+from framework.activity_counters import ActivityCounters
+from framework.migrations import apply_migrations
+from framework.activity_decorator import current_activity_id
+from framework import llm_gateway
+from framework.metrics import (
+    EMBEDDING_CACHE, EMBEDDING_REQUESTS, EMBEDDING_TEXTS, register_collector
+)
 
-current_activity_id = contextvars.ContextVar('current_activity_id', default=None)
+# Vector indexes are shared by every Memory instance pointing at the same
+# database, since the API endpoints construct a fresh Memory per request.
+# Keyed by (db_name, index_type).
+_vector_indexes = {}
+_embedding_caches = {}
+_embedding_queues = {}
+_activity_counters = {}
+# Callbacks run with the new log row after every store; keyed by db_name.
+_store_listeners = {}
+
+def _collect_embedding_cache_metrics():
+    totals = {'memory_hit': 0, 'disk_hit': 0, 'miss': 0}
+    for cache in _embedding_caches.values():
+        stats = cache.stats()
+        totals['memory_hit'] += stats['memory_hits']
+        totals['disk_hit'] += stats['disk_hits']
+        totals['miss'] += stats['misses']
+    for result, count in totals.items():
+        EMBEDDING_CACHE.set(result, value=count)
+
+register_collector(_collect_embedding_cache_metrics)
+
+INDEX_TYPES = ('exact', 'ivf')
+EMBEDDING_MODEL = "text-embedding-ada-002"
+# ada-002 takes at most 8191 tokens; two characters per token leaves room for
+# markup such as stored SVG, which tokenises far denser than prose.
+MAX_EMBEDDING_CHARS = 16000
+# embedding_format of a row whose text the API rejected; it stays NULL and is not retried.
+REJECTED_EMBEDDING = 'rejected'
 
 class Memory:
-    def __init__(self, db_name='memory.db'):
+    def __init__(self, db_name=DEFAULT_DB_NAME, index_type='exact', nprobe=None, embedding_format='float32'):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index_type {index_type!r}; expected one of {INDEX_TYPES}")
+        if embedding_format not in EMBEDDING_FORMATS:
+            raise ValueError(f"Unknown embedding_format {embedding_format!r}; expected one of {EMBEDDING_FORMATS}")
         self.db_name = db_name
-        self.client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+        self.index_type = index_type
+        self.nprobe = nprobe
+        self.embedding_format = embedding_format
+        # Shared by every Memory; the API endpoints construct one per request.
+        self.client = llm_gateway.get_openai_client()
         if not self.client.api_key:
             print("OpenAI API key not found. Set the OPENAI_API_KEY environment variable.")
 
     def get_db_connection(self):
-        return aiosqlite.connect(self.db_name)
+        """Lease a pooled connection: `async with memory.get_db_connection() as db`."""
+        return get_pool(self.db_name).reader()
+
+    def get_write_connection(self):
+        """Lease the single writer connection; writes through it are serialised."""
+        return get_pool(self.db_name).writer()
+
+    async def close(self):
+        await get_pool(self.db_name).close()
 
     async def initialize(self):
+        async with self.get_write_connection() as db:
+            await apply_migrations(db)
         async with self.get_db_connection() as db:
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS activity_logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    activity_id TEXT,
-                    timestamp TEXT NOT NULL,
-                    activity TEXT NOT NULL,
-                    result TEXT,
-                    start_time REAL,
-                    end_time REAL,
-                    duration REAL,
-                    state_changes TEXT,
-                    final_state TEXT,
-                    embedding BLOB,
-                    source TEXT,
-                    parent_id INTEGER
-                )
-            ''')
-            await db.execute('''
-                CREATE TABLE IF NOT EXISTS state_snapshots (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp TEXT NOT NULL,
-                    energy INTEGER,
-                    happiness INTEGER,
-                    xp INTEGER
+            await self.vector_index.load(db)
+            await self._recover_unembedded_rows(db)
+        await self.get_activity_counters()
+
+    @property
+    def vector_index(self):
+        key = (self.db_name, self.index_type)
+        index = _vector_indexes.get(key)
+        if index is None:
+            if self.index_type == 'ivf':
+                index = IVFIndex(path=f"{self.db_name}.ivf.npz")
+            else:
+                index = VectorIndex()
+            _vector_indexes[key] = index
+        return index
+
+    def _index_embedding(self, row_id, embedding, activity, source):
+        # Every index over this database sees the insert, whichever type this instance uses.
+        for (db_name, _), index in _vector_indexes.items():
+            if db_name == self.db_name:
+                index.add(row_id, embedding, activity, source)
+
+    @property
+    def embedding_cache(self):
+        cache = _embedding_caches.get(self.db_name)
+        if cache is None:
+            cache = EmbeddingCache(self.get_db_connection, self.get_write_connection)
+            _embedding_caches[self.db_name] = cache
+        return cache
+
+    def embedding_cache_stats(self):
+        return self.embedding_cache.stats()
+
+    @property
+    def embedding_queue(self):
+        queue = _embedding_queues.get(self.db_name)
+        if queue is None:
+            queue = EmbeddingWriteBehind(self._backfill_embeddings)
+            _embedding_queues[self.db_name] = queue
+        return queue
+
+    def _queue_embedding(self, row_id, text, activity, source):
+        if not self.client.api_key or not text or not text.strip():
+            return
+        self.embedding_queue.enqueue((row_id, text, activity, source, self.embedding_format))
+
+    async def _backfill_embeddings(self, batch):
+        embeddings, rejected = await self._compute_embeddings([text for _, text, _, _, _ in batch])
+        updates = [
+            (encode_embedding(embedding, embedding_format), embedding_format, row_id)
+            for (row_id, _, _, _, embedding_format), embedding in zip(batch, embeddings)
+            if embedding is not None
+        ]
+        updates += [(None, REJECTED_EMBEDDING, batch[position][0]) for position in rejected]
+        if updates:
+            async with self.get_write_connection() as db:
+                await db.executemany(
+                    'UPDATE activity_logs SET embedding = ?, embedding_format = ? WHERE id = ?',
+                    updates
                 )
-            ''')
-            await db.commit()
+                await db.commit()
+        for (row_id, _, activity, source, _), embedding in zip(batch, embeddings):
+            self._index_embedding(row_id, embedding, activity, source)
+
+    async def _recover_unembedded_rows(self, db):
+        # Rows whose embedding was still queued when the process stopped.
+        if not self.client.api_key:
+            return
+        cursor = await db.execute('''
+            SELECT id, result, activity, source
+            FROM activity_logs
+            WHERE embedding IS NULL AND result IS NOT NULL AND result != ''
+              AND (embedding_format IS NULL OR embedding_format != ?)
+            ORDER BY id ASC
+        ''', (REJECTED_EMBEDDING,))
+        recovered = 0
+        while True:
+            rows = await cursor.fetchmany(1000)
+            if not rows:
+                break
+            for row_id, result, activity, source in rows:
+                self._queue_embedding(row_id, result, activity, source)
+                recovered += 1
+        await cursor.close()
+        if recovered:
+            print(f"Queued {recovered} memories for embedding backfill.")
+
+    @property
+    def activity_counters(self):
+        counters = _activity_counters.get(self.db_name)
+        if counters is None:
+            counters = ActivityCounters()
+            _activity_counters[self.db_name] = counters
+        return counters
+
+    async def get_activity_counters(self):
+        """Counters for constraint checks; only touches the database when they are older than max_staleness."""
+        counters = self.activity_counters
+        if counters.is_stale():
+            await counters.refresh(self.get_db_connection)
+        return counters
+
+    def _record_activity(self, row_id, activity, created_at):
+        counters = _activity_counters.get(self.db_name)
+        if counters is not None:
+            counters.record(row_id, activity, created_at)
+
+    def add_store_listener(self, callback):
+        """Call `callback(row)` with each activity_logs row this process stores in this database."""
+        _store_listeners.setdefault(self.db_name, []).append(callback)
+
+    def remove_store_listener(self, callback):
+        listeners = _store_listeners.get(self.db_name, [])
+        if callback in listeners:
+            listeners.remove(callback)
+
+    def _notify_store(self, row):
+        for callback in list(_store_listeners.get(self.db_name, ())):
+            try:
+                callback(row)
+            except Exception as e:
+                print(f"Error in store listener: {e}")
+
+    def pending_embeddings(self):
+        """Number of stored rows whose embedding has not been written yet."""
+        return self.embedding_queue.pending_count
+
+    async def get_vector_index(self):
+        index = self.vector_index
+        if not index.loaded:
+            async with self.get_db_connection() as db:
+                await index.load(db)
+        return index
+
+    @staticmethod
+    def _log_filters(activity=None, source=None, since=None, until=None, text=None):
+        """WHERE clauses and parameters shared by the paginated log queries."""
+        clauses, params = [], []
+        if activity:
+            clauses.append('activity = ?')
+            params.append(activity)
+        if source:
+            # Rows without a source are shown as 'system'.
+            if source == 'system':
+                clauses.append("(source IS NULL OR source = 'system')")
+            else:
+                clauses.append('source = ?')
+                params.append(source)
+        if since is not None:
+            clauses.append('created_at >= ?')
+            params.append(since)
+        if until is not None:
+            clauses.append('created_at < ?')
+            params.append(until)
+        if text:
+            clauses.append(
+                "instr(lower(coalesce(activity, '') || ' ' || coalesce(result, '') || ' ' || "
+                "coalesce(source, '') || ' ' || coalesce(state_changes, '')), ?) > 0"
+            )
+            params.append(text.lower())
+        return clauses, params
+
+    async def get_activity_logs_page(self, after_id=None, before_id=None, limit=100, descending=False, **filters):
+        """
+        One keyset page of activity logs. `after_id` pages forward (ascending ids),
+        `before_id` pages backward (descending ids); with neither, the first page
+        is taken from the start (or the end when `descending`). Returns
+        (logs, next_cursor), where next_cursor is None on the last page.
+        """
+        clauses, params = self._log_filters(**filters)
+        if after_id is not None:
+            clauses.append('id > ?')
+            params.append(after_id)
+            descending = False
+        elif before_id is not None:
+            clauses.append('id < ?')
+            params.append(before_id)
+            descending = True
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        order = 'DESC' if descending else 'ASC'
 
-    async def get_all_activity_logs(self):
+        async with self.get_db_connection() as db:
+            cursor = await db.execute(f'''
+                SELECT id, timestamp, created_at, activity, result, duration, state_changes, source
+                FROM activity_logs
+                {where}
+                ORDER BY id {order}
+                LIMIT ?
+            ''', (*params, limit + 1))
+            rows = await cursor.fetchall()
+
+        logs = [self._log_row(row) for row in rows[:limit]]
+        next_cursor = logs[-1]['id'] if len(rows) > limit else None
+        return logs, next_cursor
+
+    async def count_activity_logs(self, **filters):
+        clauses, params = self._log_filters(**filters)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        async with self.get_db_connection() as db:
+            cursor = await db.execute(f'SELECT COUNT(*) FROM activity_logs {where}', params)
+            row = await cursor.fetchone()
+        return row[0]
+
+    async def get_log_facets(self):
+        """Distinct activities and sources, for the log page filters."""
+        async with self.get_db_connection() as db:
+            cursor = await db.execute('SELECT DISTINCT activity FROM activity_logs ORDER BY activity')
+            activities = [row[0] for row in await cursor.fetchall()]
+            cursor = await db.execute('SELECT DISTINCT source FROM activity_logs ORDER BY source')
+            sources = sorted({row[0] or 'system' for row in await cursor.fetchall()})
+        return {'activities': activities, 'sources': sources}
+
+    @staticmethod
+    def _log_row(row):
+        row_id, timestamp, created_at, activity, result, duration, state_changes_str, source = row
+        return {
+            'id': row_id,
+            'timestamp': timestamp,
+            'created_at': created_at,
+            'activity': activity,
+            'result': result,
+            'duration': duration,
+            'state_changes': json.loads(state_changes_str) if state_changes_str else {},
+            'source': source or 'system'
+        }
+
+    async def get_recent_activity_logs(self, limit=10):
+        """The newest `limit` log rows, newest first, in the dashboard's format."""
         async with self.get_db_connection() as db:
             cursor = await db.execute('''
-                SELECT timestamp, activity, result, duration, state_changes, source 
+                SELECT id, timestamp, created_at, activity, result, duration, state_changes, source
                 FROM activity_logs
-                ORDER BY timestamp ASC
-            ''')
+                ORDER BY id DESC
+                LIMIT ?
+            ''', (limit,))
             rows = await cursor.fetchall()
 
-        logs = []
+        return [self._log_row(row) for row in rows]
+
+    async def get_activity_summary(self, since):
+        """Count and total duration per activity for rows created at or after `since` (Unix epoch)."""
+        async with self.get_db_connection() as db:
+            cursor = await db.execute('''
+                SELECT activity, COUNT(*) as count, SUM(duration) as total_duration
+                FROM activity_logs
+                WHERE created_at >= ?
+                GROUP BY activity
+            ''', (since,))
+            rows = await cursor.fetchall()
+
+        summary = []
         for row in rows:
-            timestamp, activity, result, duration, state_changes_str, source = row
-            state_changes = json.loads(state_changes_str) if state_changes_str else {}
-            logs.append({
-                'timestamp': timestamp,
+            activity, count, total_duration = row
+            summary.append({
                 'activity': activity,
-                'result': result,
-                'duration': duration,
-                'state_changes': state_changes,
-                'source': source or 'system'
+                'count': count,
+                'total_duration': total_duration or 0
             })
-        return logs
+        return summary
 
     async def store_activity(self, entry):
         import json
         state_changes_str = json.dumps(entry.get('state_changes', {}))
         final_state_str = json.dumps(entry.get('final_state', {}))
-        embedding = await self.compute_embedding(entry.get('result', ''))
-        embedding_blob = pickle.dumps(embedding)
+        source = entry.get('source', 'core_loop')
+        created_at = time.time()
 
-        async with self.get_db_connection() as db:
-            await db.execute('''
+        async with self.get_write_connection() as db:
+            cursor = await db.execute('''
                 INSERT INTO activity_logs (
-                    activity_id, timestamp, activity, result, start_time, end_time, duration,
+                    activity_id, timestamp, created_at, activity, result, start_time, end_time, duration,
                     state_changes, final_state, embedding, source, parent_id
                 )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (
                 entry.get('activity_id'),
-                datetime.datetime.now().isoformat(),
+                datetime.datetime.fromtimestamp(created_at).isoformat(),
+                created_at,
                 entry.get('activity'),
                 entry.get('result'),
                 entry.get('start_time'),
@@ -100,118 +364,279 @@ class Memory:
                 entry.get('duration'),
                 state_changes_str,
                 final_state_str,
-                embedding_blob,
-                entry.get('source', 'core_loop'),
+                None,
+                source,
                 entry.get('parent_id')
             ))
             await db.commit()
+        self._record_activity(cursor.lastrowid, entry.get('activity'), created_at)
+        self._notify_store({
+            'id': cursor.lastrowid,
+            'timestamp': datetime.datetime.fromtimestamp(created_at).isoformat(),
+            'created_at': created_at,
+            'activity': entry.get('activity'),
+            'result': entry.get('result'),
+            'duration': entry.get('duration'),
+            'state_changes': entry.get('state_changes', {}),
+            'source': source
+        })
+        self._queue_embedding(cursor.lastrowid, entry.get('result'), entry.get('activity'), source)
 
     async def store_memory(self, content, activity, source='activity'):
-        embedding = await self.compute_embedding(content)
-        embedding_blob = pickle.dumps(embedding)
         activity_id = current_activity_id.get()
+        created_at = time.time()
 
-        async with self.get_db_connection() as db:
-            await db.execute('''
+        async with self.get_write_connection() as db:
+            cursor = await db.execute('''
                 INSERT INTO activity_logs (
-                    activity_id, timestamp, activity, result, embedding, source, parent_id
+                    activity_id, timestamp, created_at, activity, result, embedding, source, parent_id
                 )
-                VALUES (?, ?, ?, ?, ?, ?, ?)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             ''', (
                 activity_id,
-                datetime.datetime.now().isoformat(),
+                datetime.datetime.fromtimestamp(created_at).isoformat(),
+                created_at,
                 activity,
                 content,
-                embedding_blob,
+                None,
                 source,
                 None
             ))
             await db.commit()
+        self._record_activity(cursor.lastrowid, activity, created_at)
+        self._notify_store({
+            'id': cursor.lastrowid,
+            'timestamp': datetime.datetime.fromtimestamp(created_at).isoformat(),
+            'created_at': created_at,
+            'activity': activity,
+            'result': content,
+            'duration': None,
+            'state_changes': {},
+            'source': source
+        })
+        self._queue_embedding(cursor.lastrowid, content, activity, source)
 
     async def store_state_snapshot(self, state):
-        timestamp = datetime.datetime.now().isoformat()
-        async with self.get_db_connection() as db:
+        created_at = time.time()
+        async with self.get_write_connection() as db:
             await db.execute('''
-                INSERT INTO state_snapshots (timestamp, energy, happiness, xp)
-                VALUES (?, ?, ?, ?)
+                INSERT INTO state_snapshots (timestamp, created_at, energy, happiness, xp)
+                VALUES (?, ?, ?, ?, ?)
             ''', (
-                timestamp,
+                datetime.datetime.fromtimestamp(created_at).isoformat(),
+                created_at,
                 state.energy,
                 state.happiness,
                 state.xp
             ))
             await db.commit()
 
+    async def store_activity_profile(self, profile):
+        """Store a profiled run from ActivityProfiler.stop()."""
+        async with self.get_write_connection() as db:
+            await db.execute('''
+                INSERT INTO activity_profiles (
+                    activity_id, activity, created_at, started_at, duration, interval,
+                    samples, running_samples, collapsed
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                profile['activity_id'],
+                profile['activity'],
+                time.time(),
+                profile['started_at'],
+                profile['duration'],
+                profile['interval'],
+                profile['samples'],
+                profile['running_samples'],
+                profile['collapsed']
+            ))
+            await db.commit()
+
+    _PROFILE_COLUMNS = '''
+        p.id, p.activity_id, p.activity, p.created_at, p.started_at, p.duration, p.interval,
+        p.samples, p.running_samples,
+        (SELECT id FROM activity_logs l WHERE l.activity_id = p.activity_id AND l.source = 'core_loop')
+    '''
+
+    @staticmethod
+    def _profile_row(row):
+        keys = ('id', 'activity_id', 'activity', 'created_at', 'started_at', 'duration', 'interval',
+                'samples', 'running_samples', 'log_id', 'collapsed')
+        return dict(zip(keys, row))
+
+    async def get_activity_profiles(self, activity=None, limit=50):
+        """Newest profiles first, without their stacks."""
+        where, params = ('WHERE p.activity = ?', (activity,)) if activity else ('', ())
+        async with self.get_db_connection() as db:
+            cursor = await db.execute(f'''
+                SELECT {self._PROFILE_COLUMNS}
+                FROM activity_profiles p {where}
+                ORDER BY p.id DESC LIMIT ?
+            ''', (*params, limit))
+            rows = await cursor.fetchall()
+        return [self._profile_row(row) for row in rows]
+
+    async def get_activity_profile(self, profile_id):
+        """One profile with its collapsed stacks, or None."""
+        async with self.get_db_connection() as db:
+            cursor = await db.execute(f'''
+                SELECT {self._PROFILE_COLUMNS}, p.collapsed
+                FROM activity_profiles p WHERE p.id = ?
+            ''', (profile_id,))
+            row = await cursor.fetchone()
+        return self._profile_row(row) if row else None
+
     async def compute_embedding(self, text):
-        if not self.client.api_key or not text.strip():
-            return None
+        embeddings = await self.compute_embeddings([text])
+        return embeddings[0]
+
+    async def compute_embeddings(self, texts):
+        """Embed many texts, calling the API once for whatever the cache does not hold."""
+        embeddings, _ = await self._compute_embeddings(texts)
+        return embeddings
+
+    async def _compute_embeddings(self, texts):
+        # (embeddings, positions of texts the API rejected as invalid input)
+        embeddings = [None] * len(texts)
+        if not self.client.api_key:
+            return embeddings, []
+
+        missing = {}
+        for position, text in enumerate(texts):
+            if not text or not text.strip():
+                continue
+            cached = await self.embedding_cache.get(EMBEDDING_MODEL, text)
+            if cached is not None:
+                embeddings[position] = cached
+            else:
+                missing.setdefault(text, []).append(position)
+        if not missing:
+            return embeddings, []
+
+        inputs = list(missing)
+        EMBEDDING_TEXTS.inc(amount=len(inputs))
+        rejected = []
+        for text, embedding in zip(inputs, await self._embed_inputs(inputs)):
+            if embedding is None:
+                continue
+            if embedding is REJECTED_EMBEDDING:
+                rejected.extend(missing[text])
+                continue
+            await self.embedding_cache.put(EMBEDDING_MODEL, text, embedding)
+            for position in missing[text]:
+                embeddings[position] = embedding
+        return embeddings, rejected
+
+    async def _embed_inputs(self, inputs):
+        """
+        One embedding per input: a vector, None after a transient failure, or
+        REJECTED_EMBEDDING for an input the API refuses. A batch the API refuses
+        is split in half until the offending inputs are isolated, so one bad
+        input doesn't cost the rest of its batch their embeddings.
+        """
         try:
-            response = await self.client.embeddings.create(
-                model="text-embedding-ada-002",
-                input=text,
+            response = await llm_gateway.embed(
+                model=EMBEDDING_MODEL,
+                input=[text[:MAX_EMBEDDING_CHARS] for text in inputs],
                 encoding_format="float"
             )
-            return response.data[0].embedding
+        except openai.BadRequestError as e:
+            EMBEDDING_REQUESTS.inc('rejected')
+            if len(inputs) == 1:
+                print(f"Embedding input rejected, not retrying: {e}")
+                return [REJECTED_EMBEDDING]
+            half = len(inputs) // 2
+            return await self._embed_inputs(inputs[:half]) + await self._embed_inputs(inputs[half:])
         except Exception as e:
+            # Network errors, rate limits and outages: leave the rows for the next startup.
+            EMBEDDING_REQUESTS.inc('error')
             print(f"Error computing embedding: {e}")
-            return None
+            return [None] * len(inputs)
+        EMBEDDING_REQUESTS.inc('ok')
 
-    async def find_similar_memories(self, text, top_n=5, activity_type=None, source=None):
-        query_embedding = await self.compute_embedding(text)
+        embeddings = [None] * len(inputs)
+        for item in response.data:
+            embeddings[item.index] = item.embedding
+        return embeddings
+
+    async def find_similar_memories(self, text, top_n=5, activity_type=None, source=None, nprobe=None,
+                                    wait_for_pending=True):
+        """
+        Return the stored memories most similar to `text`.
+        Rows whose embedding is still queued are only searchable once embedded;
+        with `wait_for_pending` (the default) the queue is flushed first, otherwise
+        they are skipped and `pending_embeddings()` reports how many there are.
+        """
+        if wait_for_pending:
+            query_embedding, _ = await asyncio.gather(
+                self.compute_embedding(text),
+                self.embedding_queue.flush()
+            )
+        else:
+            query_embedding = await self.compute_embedding(text)
         if query_embedding is None:
             return []
 
-        async with self.get_db_connection() as db:
-            sql = 'SELECT id, activity, result, embedding, source FROM activity_logs WHERE embedding IS NOT NULL'
-            params = []
-            if activity_type:
-                sql += ' AND activity = ?'
-                params.append(activity_type)
-            if source:
-                sql += ' AND source = ?'
-                params.append(source)
+        index = await self.get_vector_index()
+        matches = index.search(
+            query_embedding,
+            top_n=top_n,
+            activity_type=activity_type,
+            source=source,
+            nprobe=nprobe or self.nprobe
+        )
+        if not matches:
+            return []
 
-            cursor = await db.execute(sql, params)
+        ids = [row_id for row_id, _ in matches]
+        placeholders = ', '.join('?' for _ in ids)
+        async with self.get_db_connection() as db:
+            cursor = await db.execute(f'''
+                SELECT id, activity, result, source
+                FROM activity_logs
+                WHERE id IN ({placeholders})
+            ''', ids)
             rows = await cursor.fetchall()
 
-        similarities = []
-        for row in rows:
-            id, activity, result, embedding_blob, memory_source = row
-            embedding = pickle.loads(embedding_blob)
-            sim = cosine_similarity([query_embedding], [embedding])[0][0]
-            similarities.append((sim, {
+        rows_by_id = {row[0]: row for row in rows}
+        top_memories = []
+        for row_id in ids:
+            row = rows_by_id.get(row_id)
+            if row is None:
+                continue
+            id, activity, result, memory_source = row
+            top_memories.append({
                 'id': id,
                 'activity': activity,
                 'result': result,
                 'source': memory_source
-            }))
-
-        similarities.sort(key=lambda x: x[0], reverse=True)
-        top_memories = [item[1] for item in similarities[:top_n]]
+            })
         return top_memories
 
     async def get_last_activity_time(self, activity_name):
         async with self.get_db_connection() as db:
             cursor = await db.execute('''
-                SELECT timestamp FROM activity_logs
+                SELECT created_at FROM activity_logs
                 WHERE activity = ?
                 ORDER BY id DESC
                 LIMIT 1
             ''', (activity_name,))
             row = await cursor.fetchone()
-            if row:
-                timestamp_str = row[0]
-                timestamp = datetime.datetime.fromisoformat(timestamp_str)
-                return timestamp
+            if row and row[0] is not None:
+                return datetime.datetime.fromtimestamp(row[0])
             else:
                 return None
 
     async def count_activity_occurrences(self, activity_name, since):
+        # `since` may be a naive local datetime or a Unix epoch in seconds.
+        if isinstance(since, datetime.datetime):
+            since = since.timestamp()
         async with self.get_db_connection() as db:
             cursor = await db.execute('''
                 SELECT COUNT(*) FROM activity_logs
-                WHERE activity = ? AND timestamp >= ?
-            ''', (activity_name, since.isoformat()))
+                WHERE activity = ? AND created_at >= ?
+            ''', (activity_name, since))
             row = await cursor.fetchone()
             if row:
                 return row[0]
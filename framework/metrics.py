@@ -0,0 +1,239 @@
+# framework/metrics.py
+#
+# In-process counters, gauges and histograms, served as Prometheus text at
+# /metrics.
+#
+# Recording is a dict lookup plus an add. The metrics are only updated from
+# the event loop thread, so no lock is needed on the hot path. Values that other
+# modules already track (embedding cache hits, websocket clients) are read by
+# collectors at scrape time instead of being counted twice.
+
+import bisect
+import math
+import re
+import sys
+import time
+from framework.tracing import start_span
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; latency buckets for network calls and SQLite respectively.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LLM_BUCKETS = (0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80, 160)
+ACTIVITY_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1800)
+SQLITE_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in sorted(self.values.items()):
+            yield self.name, _format_labels(self.label_names, labels), value
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def set(self, *labels, value):
+        self.values[labels] = value
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.bounds = tuple(buckets)
+        self.values = {}  # labels -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, *labels):
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [0] * (len(self.bounds) + 2)
+        series[bisect.bisect_left(self.bounds, value)] += 1
+        series[-1] += value
+
+    def samples(self):
+        for labels, series in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.bounds + (math.inf,), series):
+                cumulative += count
+                le = 'le="' + _format_value(float(bound)) + '"'
+                yield self.name + '_bucket', _format_labels(self.label_names, labels, le), cumulative
+            base = _format_labels(self.label_names, labels)
+            yield self.name + '_sum', base, series[-1]
+            yield self.name + '_count', base, cumulative
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+
+    def _get(self, cls, name, help, labels, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, help, labels, **kwargs)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name, help, labels=()):
+        return self._get(Gauge, name, help, labels)
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help, labels, buckets=buckets)
+
+    def register_collector(self, collect):
+        """`collect()` is called at scrape time; it should update gauges/counters from its own state."""
+        self._collectors.append(collect)
+
+    def render(self):
+        for collect in self._collectors:
+            try:
+                collect()
+            except Exception as e:
+                print(f"Error collecting metrics: {e}")
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+register_collector = REGISTRY.register_collector
+
+ACTIVITY_RUNS = counter('pippin_activity_runs_total', "Activity runs by outcome.", ('activity', 'status'))
+ACTIVITY_DURATION = histogram(
+    'pippin_activity_duration_seconds', "Wall time of each activity run.", ('activity',), ACTIVITY_BUCKETS
+)
+LLM_DURATION = histogram(
+    'pippin_llm_request_duration_seconds', "LLM API call latency.", ('model', 'status'), LLM_BUCKETS
+)
+LLM_QUEUE_WAIT = histogram(
+    'pippin_llm_queue_wait_seconds', "Time LLM calls waited for their model's concurrency limit.", ('model',)
+)
+LLM_CACHE = counter(
+    'pippin_llm_cache_requests_total', "LLM response cache lookups by result (hit, miss, bypass, error).",
+    ('model', 'result')
+)
+LLM_TOKENS = counter('pippin_llm_tokens_total', "Tokens used by LLM calls.", ('model', 'kind'))
+EMBEDDING_REQUESTS = counter('pippin_embedding_requests_total', "Embedding API calls.", ('status',))
+EMBEDDING_TEXTS = counter('pippin_embedding_texts_total', "Texts sent to the embedding API.")
+EMBEDDING_CACHE = gauge(
+    'pippin_embedding_cache_lookups', "Embedding cache lookups since start, by result.", ('result',)
+)
+SQLITE_DURATION = histogram(
+    'pippin_sqlite_query_duration_seconds',
+    "SQLite time per statement: `execute` until the first row, `fetch` for the rest.",
+    ('statement', 'caller', 'phase'), SQLITE_BUCKETS
+)
+WEBSOCKET_CLIENTS = gauge('pippin_websocket_clients', "Connected dashboard websocket clients.")
+WEBSOCKET_DROPPED = gauge('pippin_websocket_dropped_clients', "Dashboard clients dropped for falling behind, since start.")
+COALESCED_REQUESTS = counter(
+    'pippin_coalesced_requests_total', "Single-flight endpoint requests by how they were served.", ('endpoint', 'result')
+)
+JOBS = counter('pippin_jobs_total', "Background jobs queued and finished, by kind and status.", ('kind', 'status'))
+JOB_DURATION = histogram(
+    'pippin_job_duration_seconds', "Run time of background jobs.", ('kind',), ACTIVITY_BUCKETS
+)
+TWITTER_REQUESTS = counter(
+    'pippin_twitter_requests_total', "Twitter API responses by endpoint and HTTP status.", ('endpoint', 'status')
+)
+TWITTER_DURATION = histogram(
+    'pippin_twitter_request_duration_seconds', "Twitter API call latency.", ('endpoint',)
+)
+LOOP_LAG = histogram(
+    'pippin_event_loop_lag_seconds', "How late the event loop ran a 100 ms heartbeat timer.", (),
+    (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+LOOP_STALLS = counter('pippin_event_loop_stalls_total', "Event loop stalls by the activity running.", ('activity',))
+
+
+async def observe_llm(call, *args, **kwargs):
+    """
+    `await observe_llm(client.chat.completions.create, model=..., ...)`:
+    make the call and record its latency and token usage under its model,
+    in a span named after the call (e.g. `llm AsyncEmbeddings.create`).
+    """
+    model = kwargs.get('model', 'unknown')
+    with start_span(f"llm {getattr(call, '__qualname__', 'call')}", {'llm.model': model}) as span:
+        started = time.perf_counter()
+        try:
+            response = await call(*args, **kwargs)
+        except Exception:
+            LLM_DURATION.observe(time.perf_counter() - started, model, 'error')
+            raise
+        LLM_DURATION.observe(time.perf_counter() - started, model, 'ok')
+        usage = getattr(response, 'usage', None)
+        if usage is not None:
+            for kind in ('prompt_tokens', 'completion_tokens'):
+                tokens = getattr(usage, kind, None)
+                if tokens:
+                    LLM_TOKENS.inc(model, kind[:-len('_tokens')], amount=tokens)
+                    span.set(f"llm.{kind}", tokens)
+        return response
+
+
+_VERB = re.compile(r'\s*(\w+)')
+_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE|TABLE|ON)\s+(?:IF\s+(?:NOT\s+)?EXISTS\s+)?([A-Za-z_]\w*)', re.IGNORECASE)
+_statement_labels = {}
+
+
+def statement_label(sql):
+    """A low-cardinality name for a SQL statement: its verb and first table, e.g. `SELECT activity_logs`."""
+    label = _statement_labels.get(sql)
+    if label is None:
+        verb = _VERB.match(sql)
+        table = _TABLE.search(sql)
+        label = ' '.join(filter(None, (verb and verb.group(1).upper(), table and table.group(1))))
+        if len(_statement_labels) < 4096:
+            _statement_labels[sql] = label
+    return label
+
+
+def caller_name(depth=2):
+    """Name of the function `depth` frames up; labels SQL timings with the Memory method that ran them."""
+    return sys._getframe(depth).f_code.co_name
+
+
+def render():
+    return REGISTRY.render()
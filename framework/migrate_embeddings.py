@@ -0,0 +1,82 @@
+# framework/migrate_embeddings.py
+#
+# Rewrite stored embeddings into a raw on-disk format, in small chunks, while the
+# main loop keeps running against the same database:
+#
+#   python -m framework.migrate_embeddings --db memory.db --format float32
+#
+# Each chunk is its own short transaction, so writers from the running app are
+# only ever blocked for one chunk. The migration is resumable: rows already in
+# the target format are skipped.
+
+import argparse
+import asyncio
+import time
+import aiosqlite
+from framework.embedding_codec import EMBEDDING_FORMATS, encode_embedding, decode_embedding
+from framework.migrations import apply_migrations
+
+
+async def migrate_embeddings(db_name='memory.db', target_format='float32', chunk_size=500, pause=0.05):
+    """Convert every embedding not already in `target_format`; returns (converted, cleared)."""
+    if target_format not in EMBEDDING_FORMATS:
+        raise ValueError(f"Unknown embedding format {target_format!r}; expected one of {EMBEDDING_FORMATS}")
+
+    converted = 0
+    cleared = 0
+    last_id = 0
+    started = time.time()
+    async with aiosqlite.connect(db_name, timeout=30) as db:
+        await apply_migrations(db)
+
+        while True:
+            cursor = await db.execute('''
+                SELECT id, embedding, embedding_format
+                FROM activity_logs
+                WHERE id > ?
+                  AND embedding IS NOT NULL
+                  AND (embedding_format IS NULL OR embedding_format != ?)
+                ORDER BY id ASC
+                LIMIT ?
+            ''', (last_id, target_format, chunk_size))
+            rows = await cursor.fetchall()
+            if not rows:
+                break
+
+            updates = []
+            for row_id, blob, fmt in rows:
+                embedding = decode_embedding(blob, fmt)
+                if embedding is None:
+                    # Legacy rows pickled a None when the API call failed; clearing
+                    # them lets Memory re-embed the text at the next startup.
+                    updates.append((None, None, row_id))
+                    cleared += 1
+                else:
+                    updates.append((encode_embedding(embedding, target_format), target_format, row_id))
+                    converted += 1
+            await db.executemany(
+                'UPDATE activity_logs SET embedding = ?, embedding_format = ? WHERE id = ?',
+                updates
+            )
+            await db.commit()
+            last_id = rows[-1][0]
+            print(f"Migrated embeddings through row {last_id} ({converted} converted, {cleared} cleared)")
+            await asyncio.sleep(pause)
+
+    print(f"Embedding migration to {target_format} finished in {time.time() - started:.1f}s: "
+          f"{converted} converted, {cleared} cleared")
+    return converted, cleared
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rewrite stored embeddings into a compact raw format.")
+    parser.add_argument('--db', default='memory.db')
+    parser.add_argument('--format', default='float32', choices=EMBEDDING_FORMATS)
+    parser.add_argument('--chunk-size', type=int, default=500)
+    parser.add_argument('--pause', type=float, default=0.05, help="Seconds to yield between chunks")
+    args = parser.parse_args()
+    asyncio.run(migrate_embeddings(args.db, args.format, args.chunk_size, args.pause))
+
+
+if __name__ == '__main__':
+    main()
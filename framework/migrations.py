@@ -0,0 +1,216 @@
+# framework/migrations.py
+#
+# Versioned schema migrations for memory.db. Each migration runs once, inside
+# its own immediate transaction, and is recorded in `schema_version`. Steps are
+# written to be idempotent so databases created before this table existed
+# (which already have some of these objects) migrate cleanly.
+
+
+async def _add_column(db, table, column, definition):
+    cursor = await db.execute(f'PRAGMA table_info({table})')
+    columns = {row[1] for row in await cursor.fetchall()}
+    if column not in columns:
+        await db.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+
+async def _add_embedding_format(db):
+    # NULL marks a legacy pickled embedding.
+    await _add_column(db, 'activity_logs', 'embedding_format', 'TEXT')
+
+
+async def _add_created_at(db):
+    for table in ('activity_logs', 'state_snapshots'):
+        await _add_column(db, table, 'created_at', 'REAL')
+        # `timestamp` holds naive local ISO strings; the 'utc' modifier converts
+        # them from local time before taking the Unix epoch.
+        await db.execute(f'''
+            UPDATE {table}
+            SET created_at = (julianday(timestamp, 'utc') - 2440587.5) * 86400.0
+            WHERE created_at IS NULL
+        ''')
+
+
+
+async def _add_job_progress(db):
+    await _add_column(db, 'jobs', 'progress', 'TEXT')
+
+
+# (version, description, steps); a step is a SQL string or an async callable taking the connection.
+MIGRATIONS = [
+    (1, 'base schema', [
+        '''
+        CREATE TABLE IF NOT EXISTS activity_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            activity_id TEXT,
+            timestamp TEXT NOT NULL,
+            activity TEXT NOT NULL,
+            result TEXT,
+            start_time REAL,
+            end_time REAL,
+            duration REAL,
+            state_changes TEXT,
+            final_state TEXT,
+            embedding BLOB,
+            source TEXT,
+            parent_id INTEGER
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS state_snapshots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            energy INTEGER,
+            happiness INTEGER,
+            xp INTEGER
+        )
+        ''',
+    ]),
+    (2, 'raw embedding format column', [
+        _add_embedding_format,
+    ]),
+    (3, 'activity_logs query indexes', [
+        # count_activity_occurrences: activity = ? AND timestamp >= ?
+        'CREATE INDEX IF NOT EXISTS idx_activity_logs_activity_timestamp ON activity_logs (activity, timestamp)',
+        # get_last_activity_time: activity = ? ORDER BY id DESC LIMIT 1
+        'CREATE INDEX IF NOT EXISTS idx_activity_logs_activity_id_desc ON activity_logs (activity, id DESC)',
+        # 24-hour summary: timestamp >= ? GROUP BY activity, covering duration
+        'CREATE INDEX IF NOT EXISTS idx_activity_logs_timestamp ON activity_logs (timestamp, activity, duration)',
+        'CREATE INDEX IF NOT EXISTS idx_activity_logs_source ON activity_logs (source)',
+        'CREATE INDEX IF NOT EXISTS idx_activity_logs_run ON activity_logs (activity_id)',
+        # startup recovery of rows still waiting for an embedding
+        'CREATE INDEX IF NOT EXISTS idx_activity_logs_unembedded ON activity_logs (id) WHERE embedding IS NULL',
+        'ANALYZE activity_logs',
+    ]),
+    (4, 'epoch created_at columns', [
+        _add_created_at,
+        # Time windows now filter on created_at; the ISO timestamp indexes are unused.
+        'DROP INDEX IF EXISTS idx_activity_logs_activity_timestamp',
+        'DROP INDEX IF EXISTS idx_activity_logs_timestamp',
+        'CREATE INDEX IF NOT EXISTS idx_activity_logs_activity_created ON activity_logs (activity, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_activity_logs_created ON activity_logs (created_at, activity, duration)',
+        'CREATE INDEX IF NOT EXISTS idx_state_snapshots_created ON state_snapshots (created_at)',
+        'ANALYZE',
+    ]),
+    (5, 'activity_profiles table', [
+        # Sampled stacks of profiled runs; joined to activity_logs on activity_id.
+        '''
+        CREATE TABLE IF NOT EXISTS activity_profiles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            activity_id TEXT NOT NULL,
+            activity TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            duration REAL,
+            interval REAL,
+            samples INTEGER,
+            running_samples INTEGER,
+            collapsed TEXT
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_activity_profiles_activity ON activity_profiles (activity, id DESC)',
+        'CREATE INDEX IF NOT EXISTS idx_activity_profiles_run ON activity_profiles (activity_id)',
+    ]),
+    (6, 'llm_response_cache table', [
+        '''
+        CREATE TABLE IF NOT EXISTS llm_response_cache (
+            key TEXT PRIMARY KEY,
+            model TEXT NOT NULL,
+            response TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            expires_at REAL NOT NULL,
+            last_used_at REAL NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_llm_response_cache_expires ON llm_response_cache (expires_at)',
+        'CREATE INDEX IF NOT EXISTS idx_llm_response_cache_used ON llm_response_cache (last_used_at)',
+    ]),
+    (7, 'jobs table', [
+        # Background jobs for the media-generating endpoints; see framework/job_queue.py.
+        '''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            result TEXT,
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            webhook_url TEXT,
+            webhook_status TEXT,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL,
+            updated_at REAL NOT NULL
+        ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at)',
+    ]),
+    (8, 'embedding_cache table', [
+        # Created lazily by EmbeddingCache before this migration, so it may already exist.
+        '''
+        CREATE TABLE IF NOT EXISTS embedding_cache (
+            model TEXT NOT NULL,
+            text_hash TEXT NOT NULL,
+            embedding BLOB NOT NULL,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (model, text_hash)
+        ) WITHOUT ROWID
+        ''',
+    ]),
+    (9, 'jobs progress column', [
+        # JSON checkpoints a handler records so a retried job can skip completed side effects.
+        _add_job_progress,
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+async def get_schema_version(db):
+    await db.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TEXT NOT NULL DEFAULT (datetime('now'))
+        )
+    ''')
+    cursor = await db.execute('SELECT MAX(version) FROM schema_version')
+    row = await cursor.fetchone()
+    return row[0] or 0
+
+
+async def apply_migrations(db, target_version=None):
+    """Bring the database up to `target_version` (default: latest); returns the versions applied."""
+    target_version = LATEST_VERSION if target_version is None else target_version
+    await get_schema_version(db)
+    await db.commit()
+
+    applied = []
+    for version, description, steps in MIGRATIONS:
+        if version > target_version:
+            break
+        # BEGIN IMMEDIATE takes the write lock up front, so two processes starting
+        # together cannot both apply the same migration.
+        await db.execute('BEGIN IMMEDIATE')
+        try:
+            if version <= await get_schema_version(db):
+                await db.rollback()
+                continue
+            for step in steps:
+                if callable(step):
+                    await step(db)
+                else:
+                    await db.execute(step)
+            await db.execute(
+                'INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                (version, description)
+            )
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        print(f"Applied schema migration {version}: {description}")
+        applied.append(version)
+    return applied
@@ -0,0 +1,160 @@
+# framework/profiler.py
+#
+# On-demand statistical profiling of activity runs.
+#
+#   POST /api/profiles {"activity": "post_a_tweet_with_image", "runs": 3}
+#   PIPPIN_PROFILE_ACTIVITIES="post_a_tweet_with_image:3,draw"
+#
+# queue the next N runs of an activity for profiling. activity_wrapper asks
+# take_profile_request() before each run; when one is queued, a thread samples
+# the run every `interval` seconds until it finishes. A sample is the
+# activity's stack below activity_wrapper: the running stack when the loop
+# thread is executing the activity's own code, otherwise the chain of awaits
+# it is suspended in, ending in `[await]` (the loop is idle, waiting on I/O
+# or a worker) or `[loop busy]` (other tasks are holding the loop). Stacks are
+# kept in collapsed form ("frame;frame;frame count" per line), which
+# flamegraph.pl and speedscope read directly, and stored in activity_profiles
+# under the run's activity_id.
+
+import os
+import selectors
+import sys
+import threading
+import time
+from collections import Counter
+
+DEFAULT_INTERVAL = float(os.getenv("PIPPIN_PROFILE_INTERVAL", "0.01"))
+MAX_RUNS = 100
+MAX_STACK_DEPTH = 64
+
+_SELECTORS_FILE = selectors.__file__
+
+# activity name -> {'runs': remaining, 'interval': seconds}
+_requests = {}
+
+
+def request_profiles(activity, runs=1, interval=DEFAULT_INTERVAL):
+    """Profile the next `runs` runs of `activity`; runs=0 cancels."""
+    runs = max(0, min(int(runs), MAX_RUNS))
+    if runs:
+        _requests[activity] = {'runs': runs, 'interval': max(0.001, float(interval))}
+    else:
+        _requests.pop(activity, None)
+
+
+def pending_profiles():
+    return {activity: dict(request) for activity, request in _requests.items()}
+
+
+def take_profile_request(activity):
+    """The sampling interval if this run of `activity` should be profiled, else None."""
+    request = _requests.get(activity)
+    if request is None:
+        return None
+    request['runs'] -= 1
+    if request['runs'] <= 0:
+        del _requests[activity]
+    return request['interval']
+
+
+def _load_config(spec):
+    # "name:runs,name" -> a request per name; a bare name profiles one run.
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        activity, _, runs = item.partition(':')
+        request_profiles(activity.strip(), int(runs) if runs else 1)
+
+
+_load_config(os.getenv("PIPPIN_PROFILE_ACTIVITIES", ""))
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{module}:{code.co_qualname}"
+
+
+class ActivityProfiler:
+    def __init__(self, activity, activity_id, task, root_frame, interval=DEFAULT_INTERVAL):
+        """`root_frame` is the activity_wrapper frame of the run; `task` is the task running it."""
+        self.activity = activity
+        self.activity_id = activity_id
+        self.task = task
+        self.root_frame = root_frame
+        self.interval = interval
+        self.counts = Counter()
+        self.samples = 0
+        self.running_samples = 0
+        self._loop_thread = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = None
+        self._started = None
+
+    def start(self):
+        self._started = time.time()
+        self._thread = threading.Thread(target=self._run, name=f"profile-{self.activity}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop sampling and return the profile row for Memory.store_activity_profile."""
+        self._stop.set()
+        self._thread.join()
+        return {
+            'activity_id': self.activity_id,
+            'activity': self.activity,
+            'started_at': self._started,
+            'duration': time.time() - self._started,
+            'interval': self.interval,
+            'samples': self.samples,
+            'running_samples': self.running_samples,
+            'collapsed': self.collapsed(),
+        }
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            stack = self._sample()
+            if stack:
+                self.counts[stack] += 1
+                self.samples += 1
+
+    def _sample(self):
+        frame = sys._current_frames().get(self._loop_thread)
+        running = self._running_stack(frame)
+        if running is not None:
+            self.running_samples += 1
+            return ';'.join(running)
+        waiting = self._await_stack()
+        if not waiting:
+            return None
+        idle = frame is not None and frame.f_code.co_filename == _SELECTORS_FILE
+        return ';'.join(waiting) + (';[await]' if idle else ';[loop busy]')
+
+    def _running_stack(self, frame):
+        # The loop thread's stack, from this run's activity_wrapper down, if it is on it.
+        labels = []
+        while frame is not None:
+            if frame is self.root_frame:
+                labels.append(self.activity)
+                return labels[::-1][:MAX_STACK_DEPTH]
+            labels.append(_frame_label(frame))
+            frame = frame.f_back
+        return None
+
+    def _await_stack(self):
+        # Walk the suspended task's coroutines from the outside in, starting at the wrapper.
+        labels = None
+        coro = self.task.get_coro() if self.task is not None else None
+        while coro is not None and (labels is None or len(labels) < MAX_STACK_DEPTH):
+            frame = getattr(coro, 'cr_frame', None) or getattr(coro, 'gi_frame', None)
+            if frame is None:
+                break
+            if labels is None:
+                if frame is self.root_frame:
+                    labels = [self.activity]
+            else:
+                labels.append(_frame_label(frame))
+            coro = getattr(coro, 'cr_await', None) or getattr(coro, 'gi_yieldfrom', None)
+        return labels
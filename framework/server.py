@@ -1,16 +1,13 @@
 # server.py
 
-import asyncio
 from fastapi import FastAPI, WebSocket
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
 import uvicorn
 from threading import Thread
-import json
-import datetime
 
-import shared_data
 from framework.memory import Memory  # Ensure correct import path for Memory
+from framework.broadcast import get_dashboard_feed
 
 app = FastAPI()
 
@@ -24,67 +21,16 @@ async def get():
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
+    # One shared feed computes each update; every client just receives it.
+    # Reconnecting clients pass ?stream=<id>&since=<seq> to resume with deltas.
     await websocket.accept()
-    memory = Memory()
-    while True:
-        # Fetch the last 10 activity logs from the database
-        async with memory.get_db_connection() as db:
-            cursor = await db.execute('''
-                SELECT timestamp, activity, result, duration, state_changes
-                FROM activity_logs
-                ORDER BY id DESC
-                LIMIT 10
-            ''')
-            rows = await cursor.fetchall()
-            activity_history = []
-            for row in rows:
-                timestamp, activity, result, duration, state_changes_str = row
-                # Parse state_changes JSON string
-                state_changes = json.loads(state_changes_str) if state_changes_str else {}
-                activity_history.append({
-                    'timestamp': timestamp,
-                    'activity': activity,
-                    'result': result,
-                    'duration': duration,
-                    'state_changes': state_changes
-                })
-
-        # Calculate the 24-hour summary
-        summary_data = await get_24_hour_summary(memory)
-
-        # Prepare data to send
-        data = {
-            'current_activity': shared_data.current_activity,
-            'state': shared_data.state.to_dict(),
-            'activity_history': activity_history,
-            'summary_data': summary_data  # Include summary in the data
-        }
-        await websocket.send_json(data)
-        await asyncio.sleep(1)
-
-async def get_24_hour_summary(memory):
-    """Get summary of activity counts and durations for the past 24 hours."""
-    now = datetime.datetime.now()
-    since = now - datetime.timedelta(hours=24)
-
-    async with memory.get_db_connection() as db:
-        cursor = await db.execute('''
-            SELECT activity, COUNT(*) as count, SUM(duration) as total_duration
-            FROM activity_logs
-            WHERE timestamp >= ?
-            GROUP BY activity
-        ''', (since.isoformat(),))
-        rows = await cursor.fetchall()
-
-    summary = []
-    for row in rows:
-        activity, count, total_duration = row
-        summary.append({
-            'activity': activity,
-            'count': count,
-            'total_duration': total_duration or 0
-        })
-    return summary
+    since = websocket.query_params.get('since')
+    feed = await get_dashboard_feed(Memory())
+    await feed.serve(
+        websocket,
+        since=int(since) if since and since.isdigit() else None,
+        stream=websocket.query_params.get('stream')
+    )
 
 def run_server():
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,73 @@
+# framework/single_flight.py
+
+import asyncio
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from framework.metrics import COALESCED_REQUESTS
+
+_SPACE = re.compile(r'\s+')
+
+
+def normalize_text(text):
+    """Case-, width- and whitespace-insensitive form of a question, without trailing punctuation."""
+    text = unicodedata.normalize('NFKC', text).casefold()
+    return _SPACE.sub(' ', text).strip().rstrip('?!.… ')
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key onto one computation, and
+    keeps successful results for `ttl` seconds.
+
+    `await flight.do(key, compute)` returns the cached result if there is
+    one, joins the in-flight computation for `key` if there is one, and
+    otherwise starts `compute()`. The computation runs as its own task, so a
+    caller that disconnects doesn't cancel it for the others. Errors are
+    raised to every waiter and not cached.
+    """
+
+    def __init__(self, name, ttl=60.0, max_entries=1024):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._in_flight = {}
+        self._results = OrderedDict()  # key -> (expires_at, result)
+
+    def _cached(self, key):
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._results[key]
+            return None
+        return entry
+
+    def _store(self, key, task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if task.cancelled() or task.exception() is not None or self.ttl <= 0:
+            return
+        self._results[key] = (time.monotonic() + self.ttl, task.result())
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+
+    async def do(self, key, compute):
+        entry = self._cached(key)
+        if entry is not None:
+            COALESCED_REQUESTS.inc(self.name, 'cached')
+            return entry[1]
+        task = self._in_flight.get(key)
+        if task is not None:
+            COALESCED_REQUESTS.inc(self.name, 'joined')
+        else:
+            COALESCED_REQUESTS.inc(self.name, 'computed')
+            task = asyncio.get_running_loop().create_task(compute())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._store(key, done))
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {'in_flight': len(self._in_flight), 'cached': len(self._results), 'ttl': self.ttl}
@@ -0,0 +1,330 @@
+# framework/tracing.py
+#
+# Spans for each activity run, so a slow run can be broken down by step.
+#
+# activity_wrapper opens a root span for every run; its trace id is the run's
+# activity_id. The shared call sites open child spans under whatever span is
+# current: observe_llm (LLM calls and embeddings), the pooled SQLite
+# connection, run_cpu (rendering), run_io and the Twitter client. Outside an
+# activity there is no current span, and start_span() returns a shared no-op,
+# so API requests and background workers cost nothing to trace.
+#
+# Tracing is opt-in. Finished spans are buffered and written out when their
+# root span closes:
+#
+#   PIPPIN_TRACE_EXPORT=none    tracing off (default)
+#   PIPPIN_TRACE_EXPORT=jsonl   one JSON object per span in PIPPIN_TRACE_FILE
+#   PIPPIN_TRACE_EXPORT=otlp    OTLP/HTTP JSON to PIPPIN_OTLP_ENDPOINT
+#
+#   python -m framework.tracing traces.jsonl --activity post_a_tweet_with_image
+#
+# prints the span tree of the most recent matching run.
+
+import argparse
+import asyncio
+import contextvars
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+
+TRACE_EXPORT = os.getenv("PIPPIN_TRACE_EXPORT", "none")
+TRACE_FILE = os.getenv("PIPPIN_TRACE_FILE", "traces.jsonl")
+TRACE_FILE_MAX_BYTES = int(os.getenv("PIPPIN_TRACE_FILE_MAX_BYTES", str(50 * 1024 * 1024)))
+OTLP_ENDPOINT = os.getenv("PIPPIN_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+SERVICE_NAME = "pippin"
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+def _new_span_id():
+    return '%016x' % random.getrandbits(64)
+
+
+class Span:
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'attributes',
+                 'start_ns', 'end_ns', 'status', 'error', '_token')
+
+    def __init__(self, name, trace_id, parent_id=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _new_span_id()
+        self.parent_id = parent_id
+        self.attributes = dict(attributes) if attributes else {}
+        self.start_ns = None
+        self.end_ns = None
+        self.status = 'ok'
+        self.error = None
+        self._token = None
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self.start_ns = time.time_ns()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.time_ns()
+        if exc_type is not None:
+            self.status = 'error'
+            self.error = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self._token)
+        self._token = None
+        get_tracer().finish(self)
+        return False
+
+    @property
+    def duration_ms(self):
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': self.start_ns / 1e9,
+            'duration_ms': self.duration_ms,
+            'status': self.status,
+            'error': self.error,
+            'attributes': self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Returned outside a trace, and for everything when tracing is off."""
+
+    def set(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def start_trace(name, trace_id, attributes=None):
+    """A root span; `trace_id` is 32 hex characters (an activity_id's uuid hex)."""
+    if get_tracer().exporter is None:
+        return NOOP_SPAN
+    return Span(name, trace_id, None, attributes)
+
+
+def start_span(name, attributes=None):
+    """A child of the current span, or a no-op when no trace is active."""
+    parent = _current_span.get()
+    if parent is None:
+        return NOOP_SPAN
+    return Span(name, parent.trace_id, parent.span_id, attributes)
+
+
+def current_span():
+    return _current_span.get()
+
+
+def untraced_context():
+    """
+    A copy of the current context with no active span, for long-lived tasks
+    (`loop.create_task(coro, context=untraced_context())`) that an activity
+    happens to start but that outlive it.
+    """
+    context = contextvars.copy_context()
+    context.run(_current_span.set, None)
+    return context
+
+
+class JsonlExporter:
+    """Appends spans to `path`, rotating it to `path`.1 past `max_bytes`."""
+
+    def __init__(self, path=TRACE_FILE, max_bytes=TRACE_FILE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        # One writer thread keeps the file I/O off the event loop and the batches in order.
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='trace-writer')
+
+    def export(self, spans):
+        lines = ''.join(json.dumps(span.to_dict(), default=str) + '\n' for span in spans)
+        self._writer.submit(self._write, lines)
+
+    def _write(self, lines):
+        try:
+            if self.max_bytes and os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+                os.replace(self.path, self.path + '.1')
+            with open(self.path, 'a') as f:
+                f.write(lines)
+        except OSError as e:
+            print(f"Error writing traces to {self.path}: {e}")
+
+    async def close(self):
+        # Waits for the queued writes.
+        await asyncio.get_running_loop().run_in_executor(None, self._writer.shutdown)
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+class OTLPExporter:
+    """Posts spans as OTLP/HTTP JSON, e.g. to an OpenTelemetry collector on :4318."""
+
+    def __init__(self, endpoint=OTLP_ENDPOINT, timeout=5.0):
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self._http = None
+        self._pending = set()
+
+    def encode(self, spans):
+        return {'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': SERVICE_NAME}}]},
+            'scopeSpans': [{
+                'scope': {'name': 'framework.tracing'},
+                'spans': [{
+                    'traceId': span.trace_id,
+                    'spanId': span.span_id,
+                    'parentSpanId': span.parent_id or '',
+                    'name': span.name,
+                    'kind': 1 if span.parent_id is None else 3,  # INTERNAL root, CLIENT calls
+                    'startTimeUnixNano': str(span.start_ns),
+                    'endTimeUnixNano': str(span.end_ns),
+                    'attributes': [{'key': k, 'value': _otlp_value(v)} for k, v in span.attributes.items()],
+                    'status': {'code': 2, 'message': span.error} if span.status == 'error' else {'code': 1},
+                } for span in spans],
+            }],
+        }]}
+
+    def export(self, spans):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = loop.create_task(self._post(self.encode(spans)))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _post(self, payload):
+        if self._http is None:
+            self._http = httpx.AsyncClient(timeout=self.timeout)
+        try:
+            response = await self._http.post(self.endpoint, json=payload)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            print(f"Error exporting traces to {self.endpoint}: {e}")
+
+    async def close(self):
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+class Tracer:
+    def __init__(self, exporter, max_buffer=1024):
+        self.exporter = exporter
+        self.max_buffer = max_buffer
+        self._buffer = []
+
+    def finish(self, span):
+        self._buffer.append(span)
+        # Children close before their root, so a run is exported in one batch;
+        # spans from tasks that outlive their run go out with the next one.
+        if span.parent_id is None or len(self._buffer) >= self.max_buffer:
+            self.flush()
+
+    def flush(self):
+        spans, self._buffer = self._buffer, []
+        if not spans or self.exporter is None:
+            return
+        try:
+            self.exporter.export(spans)
+        except Exception as e:
+            print(f"Error exporting traces: {e}")
+
+    async def close(self):
+        self.flush()
+        if self.exporter is not None:
+            await self.exporter.close()
+
+
+_tracer = None
+
+
+def get_tracer():
+    global _tracer
+    if _tracer is None:
+        if TRACE_EXPORT == 'otlp':
+            exporter = OTLPExporter()
+        elif TRACE_EXPORT == 'jsonl':
+            exporter = JsonlExporter()
+        else:
+            exporter = None
+        _tracer = Tracer(exporter)
+    return _tracer
+
+
+async def close_tracer():
+    global _tracer
+    if _tracer is not None:
+        await _tracer.close()
+        _tracer = None
+
+
+def _print_tree(spans):
+    children = {}
+    for span in spans:
+        children.setdefault(span['parent_id'], []).append(span)
+    root = children[None][0]
+    total = root['duration_ms'] or 1.0
+
+    def walk(span, depth):
+        error = f"  [{span['error']}]" if span['status'] == 'error' else ''
+        print(f"{'  ' * depth}{span['name']:<{60 - 2 * depth}} {span['duration_ms']:>10.1f} ms "
+              f"{100 * span['duration_ms'] / total:>5.1f}%{error}")
+        for child in sorted(children.get(span['span_id'], []), key=lambda s: s['start']):
+            walk(child, depth + 1)
+
+    walk(root, 0)
+    accounted = sum(child['duration_ms'] for child in children.get(root['span_id'], []))
+    print(f"{'(time outside child spans)':<60} {max(0.0, total - accounted):>10.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show where an activity run's time went.")
+    parser.add_argument('path', nargs='?', default=TRACE_FILE)
+    parser.add_argument('--activity', help="Most recent run of this activity")
+    parser.add_argument('--activity-id', help="A specific run")
+    args = parser.parse_args()
+
+    traces = {}
+    with open(args.path) as f:
+        for line in f:
+            span = json.loads(line)
+            traces.setdefault(span['trace_id'], []).append(span)
+
+    roots = [s for spans in traces.values() for s in spans if s['parent_id'] is None]
+    if args.activity_id:
+        roots = [s for s in roots if s['attributes'].get('activity_id') == args.activity_id]
+    if args.activity:
+        roots = [s for s in roots if s['attributes'].get('activity') == args.activity]
+    if not roots:
+        raise SystemExit("No matching activity run found")
+    root = max(roots, key=lambda s: s['start'])
+    _print_tree(traces[root['trace_id']])
+
+
+if __name__ == '__main__':
+    main()
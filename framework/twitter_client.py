@@ -0,0 +1,203 @@
+# framework/twitter_client.py
+#
+# One async Twitter client for every activity and endpoint. Requests are
+# signed with OAuth 1.0a and sent through a shared httpx connection pool, so
+# nothing here blocks the event loop (server, websockets and the main loop
+# keep running while a tweet is in flight) and repeated calls reuse the same
+# keep-alive connections.
+
+import asyncio
+import os
+import time
+import httpx
+from oauthlib.oauth1 import Client as OAuth1Client
+from framework.metrics import TWITTER_DURATION, TWITTER_REQUESTS
+from framework.tracing import start_span
+
+TWEETS_URL = "https://api.twitter.com/2/tweets"
+MEDIA_UPLOAD_URL = "https://upload.twitter.com/1.1/media/upload.json"
+MENTIONS_URL = "https://api.twitter.com/2/users/{id}/mentions"
+PERSONALIZED_TRENDS_URL = "https://api.twitter.com/2/users/{id}/personalized_trends"
+
+CREDENTIAL_VARS = (
+    "TWITTER_API_KEY", "TWITTER_API_KEY_SECRET", "TWITTER_ACCESS_TOKEN", "TWITTER_ACCESS_TOKEN_SECRET"
+)
+
+DEFAULT_TIMEOUT = httpx.Timeout(30.0, connect=10.0)
+# Media uploads can be several MB of GIF.
+UPLOAD_TIMEOUT = httpx.Timeout(120.0, connect=10.0)
+DEFAULT_LIMITS = httpx.Limits(max_connections=10, max_keepalive_connections=5, keepalive_expiry=60.0)
+
+
+class TwitterError(Exception):
+    """
+    Twitter API error. For HTTP errors `args[0]` is a dict with `status_code`,
+    `headers` and `error_data`; otherwise it is a message.
+    """
+
+    @property
+    def details(self):
+        return self.args[0] if self.args and isinstance(self.args[0], dict) else {}
+
+    @property
+    def status_code(self):
+        return self.details.get("status_code")
+
+    @property
+    def headers(self):
+        return self.details.get("headers") or {}
+
+
+def credentials_from_env():
+    """(api_key, api_secret, access_token, access_token_secret) from the TWITTER_* variables."""
+    credentials = tuple(os.getenv(name) for name in CREDENTIAL_VARS)
+    if not all(credentials):
+        raise TwitterError("Missing required Twitter credentials")
+    return credentials
+
+
+class TwitterClient:
+    def __init__(self, api_key, api_secret, access_token, access_token_secret,
+                 timeout=DEFAULT_TIMEOUT, limits=DEFAULT_LIMITS):
+        self._oauth = OAuth1Client(
+            api_key,
+            client_secret=api_secret,
+            resource_owner_key=access_token,
+            resource_owner_secret=access_token_secret,
+        )
+        self._timeout = timeout
+        self._limits = limits
+        self._http = None
+
+    @property
+    def http(self):
+        # Created lazily so the client binds to the loop that first uses it.
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(timeout=self._timeout, limits=self._limits)
+        return self._http
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def _sign(self, method, url):
+        # JSON and multipart bodies are not part of the OAuth 1.0a signature
+        # base string, so only the method and URL (with its query) are signed.
+        _, headers, _ = self._oauth.sign(url, http_method=method)
+        return headers
+
+    async def request(self, method, url, params=None, expected=(200,), timeout=None, endpoint=None, **kwargs):
+        """Send a signed request and return the decoded JSON body; raise TwitterError otherwise."""
+        endpoint = endpoint or f"{method} {httpx.URL(url).path}"
+        url = str(httpx.URL(url, params=params)) if params else url
+        headers = self._sign(method, url)
+        extra = {} if timeout is None else {"timeout": timeout}
+        with start_span(f"http {endpoint}", {'http.method': method, 'http.url': url.split('?')[0]}) as span:
+            started = time.perf_counter()
+            try:
+                response = await self.http.request(method, url, headers=headers, **kwargs, **extra)
+            except httpx.HTTPError as e:
+                TWITTER_REQUESTS.inc(endpoint, type(e).__name__)
+                raise TwitterError(f"Error calling Twitter API: {e}") from e
+            finally:
+                TWITTER_DURATION.observe(time.perf_counter() - started, endpoint)
+            span.set('http.status_code', response.status_code)
+        TWITTER_REQUESTS.inc(endpoint, str(response.status_code))
+
+        if response.status_code not in expected:
+            try:
+                error_data = response.json() if response.content else {}
+            except ValueError:
+                error_data = {"detail": response.text}
+            raise TwitterError({
+                "status_code": response.status_code,
+                "headers": response.headers,
+                "error_data": error_data,
+            })
+        return response.json() if response.content else {}
+
+    async def post_tweet(self, text, media_ids=None):
+        payload = {"text": text}
+        if media_ids:
+            payload["media"] = {"media_ids": list(media_ids)}
+        return await self.request("POST", TWEETS_URL, json=payload, expected=(201,))
+
+    async def upload_media(self, path):
+        """Upload an image or GIF and return its media_id_string."""
+        data = await asyncio.to_thread(_read_file, path)
+        result = await self.request(
+            "POST", MEDIA_UPLOAD_URL,
+            files={"media": (os.path.basename(path), data)},
+            timeout=UPLOAD_TIMEOUT,
+        )
+        return result.get("media_id_string")
+
+    async def get_mentions(self, user_id, max_results=10, fields="created_at,text,author_id"):
+        return await self.request("GET", MENTIONS_URL.format(id=user_id), endpoint="GET mentions", params={
+            "max_results": max_results,
+            "tweet.fields": fields,
+        })
+
+    async def get_personalized_trends(self, user_id):
+        return await self.request("GET", PERSONALIZED_TRENDS_URL.format(id=user_id), endpoint="GET personalized_trends")
+
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def retry_delay(error, attempt, base_delay=5.0, max_delay=900.0):
+    """
+    Seconds to wait before retrying after `error` on the given (1-based)
+    attempt, or None if the error is not a rate limit. The wait honours
+    x-rate-limit-reset and falls back to exponential backoff without it.
+    Other errors are not retried: a failed POST may still have posted.
+    """
+    if error.status_code != 429:
+        return None
+    reset_time = error.headers.get("x-rate-limit-reset")
+    if reset_time:
+        wait_time = int(reset_time) - time.time()
+        if wait_time > 0:
+            return min(wait_time, max_delay)
+    return min(base_delay * (2 ** (attempt - 1)), max_delay)
+
+
+async def with_backoff(call, max_retries=5, base_delay=5.0, max_delay=900.0):
+    """
+    Await `call()` until it succeeds, sleeping (without blocking the loop)
+    between rate-limited attempts. Returns `(result, attempts)`;
+    the last TwitterError is raised once `max_retries` attempts have failed.
+    """
+    for attempt in range(1, max_retries + 1):
+        try:
+            return await call(), attempt
+        except TwitterError as e:
+            wait_time = retry_delay(e, attempt, base_delay, max_delay)
+            if wait_time is None or attempt == max_retries:
+                raise
+            print(f"Hit rate limit. Retrying in {wait_time:.0f} seconds (attempt {attempt}).")
+            await asyncio.sleep(wait_time)
+
+
+_clients = {}
+
+
+def get_twitter_client(credentials=None):
+    """The shared client for `credentials` (default: the TWITTER_* environment variables)."""
+    credentials = tuple(credentials) if credentials else credentials_from_env()
+    if not all(credentials):
+        raise TwitterError("Missing required Twitter credentials")
+    client = _clients.get(credentials)
+    if client is None:
+        client = TwitterClient(*credentials)
+        _clients[credentials] = client
+    return client
+
+
+async def close_twitter_clients():
+    for client in list(_clients.values()):
+        await client.close()
+    _clients.clear()
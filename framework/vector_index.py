@@ -0,0 +1,189 @@
+# framework/vector_index.py
+
+import asyncio
+import numpy as np
+from framework.embedding_codec import decode_embedding
+
+
+def normalize(vector):
+    """Return `vector` as an L2-normalised float32 array, or None if it has no direction."""
+    vec = np.asarray(vector, dtype=np.float32).ravel()
+    norm = np.linalg.norm(vec)
+    if not np.isfinite(norm) or norm == 0:
+        return None
+    return vec / norm
+
+
+class VectorIndex:
+    """
+    Exact in-memory cosine index over the embeddings in activity_logs.
+
+    Embeddings are kept L2-normalised in one contiguous float32 matrix with a
+    parallel array of row ids, so a query is a single matrix-vector product
+    followed by argpartition. Boolean masks per activity and per source are
+    maintained on insert so filtered searches never touch the database.
+    """
+
+    def __init__(self, initial_capacity=1024):
+        self.dim = None
+        self.size = 0
+        self.loaded = False
+        self.max_loaded_id = 0
+        self._capacity = initial_capacity
+        self._matrix = None
+        self._ids = np.empty(initial_capacity, dtype=np.int64)
+        self._activity_masks = {}
+        self._source_masks = {}
+        self._pending = []
+        self._load_lock = asyncio.Lock()
+
+    async def load(self, db):
+        """Populate the index from every embedded row in activity_logs."""
+        async with self._load_lock:
+            if self.loaded:
+                return
+            cursor = await db.execute('''
+                SELECT id, activity, source, embedding, embedding_format
+                FROM activity_logs
+                WHERE embedding IS NOT NULL
+                ORDER BY id ASC
+            ''')
+            while True:
+                rows = await cursor.fetchmany(5000)
+                if not rows:
+                    break
+                batch = []
+                for row_id, activity, source, embedding_blob, embedding_format in rows:
+                    embedding = decode_embedding(embedding_blob, embedding_format)
+                    if embedding is not None:
+                        batch.append((row_id, embedding, activity, source))
+                    self.max_loaded_id = max(self.max_loaded_id, row_id)
+                self._add_many(batch)
+            await cursor.close()
+
+            # Rows stored while the load query was running are replayed here;
+            # anything the query already saw is skipped.
+            pending, self._pending = self._pending, []
+            self._add_many([item for item in pending if item[0] > self.max_loaded_id])
+            self.loaded = True
+
+    def add(self, row_id, embedding, activity, source):
+        """Add one stored row. Rows added before `load` finishes are buffered."""
+        if embedding is None:
+            return
+        if not self.loaded:
+            self._pending.append((row_id, embedding, activity, source))
+            return
+        self._add_many([(row_id, embedding, activity, source)])
+
+    def _add_many(self, items):
+        vectors = []
+        accepted = []
+        for row_id, embedding, activity, source in items:
+            vec = normalize(embedding)
+            if vec is None:
+                continue
+            if self.dim is None:
+                self.dim = vec.shape[0]
+                self._matrix = np.empty((self._capacity, self.dim), dtype=np.float32)
+            if vec.shape[0] != self.dim:
+                print(f"Skipping embedding for row {row_id}: dimension {vec.shape[0]} != {self.dim}")
+                continue
+            vectors.append(vec)
+            accepted.append((row_id, activity, source))
+        if not accepted:
+            return
+
+        self._reserve(self.size + len(accepted))
+        start = self.size
+        end = start + len(accepted)
+        self._matrix[start:end] = np.stack(vectors)
+        for offset, (row_id, activity, source) in enumerate(accepted):
+            position = start + offset
+            self._ids[position] = row_id
+            self._mask_for(self._activity_masks, activity)[position] = True
+            self._mask_for(self._source_masks, source)[position] = True
+        self.size = end
+        self._on_added(start, end)
+
+    def _on_added(self, start, end):
+        """Hook for subclasses that maintain extra structures per stored row."""
+        pass
+
+    def _mask_for(self, masks, key):
+        mask = masks.get(key)
+        if mask is None:
+            mask = np.zeros(self._capacity, dtype=bool)
+            masks[key] = mask
+        return mask
+
+    def _reserve(self, needed):
+        if needed <= self._capacity:
+            return
+        capacity = self._capacity
+        while capacity < needed:
+            capacity *= 2
+
+        matrix = np.empty((capacity, self.dim), dtype=np.float32)
+        matrix[:self.size] = self._matrix[:self.size]
+        self._matrix = matrix
+
+        ids = np.empty(capacity, dtype=np.int64)
+        ids[:self.size] = self._ids[:self.size]
+        self._ids = ids
+
+        for masks in (self._activity_masks, self._source_masks):
+            for key, mask in masks.items():
+                grown = np.zeros(capacity, dtype=bool)
+                grown[:self.size] = mask[:self.size]
+                masks[key] = grown
+        self._capacity = capacity
+
+    def _filter_mask(self, activity_type=None, source=None):
+        mask = None
+        if activity_type:
+            mask = self._activity_masks.get(activity_type)
+            if mask is None:
+                return np.zeros(self.size, dtype=bool)
+            mask = mask[:self.size]
+        if source:
+            source_mask = self._source_masks.get(source)
+            if source_mask is None:
+                return np.zeros(self.size, dtype=bool)
+            source_mask = source_mask[:self.size]
+            mask = source_mask if mask is None else mask & source_mask
+        return mask
+
+    def search(self, query_embedding, top_n=5, activity_type=None, source=None, nprobe=None):
+        """
+        Return up to `top_n` (row_id, similarity) pairs, best first.
+        `nprobe` is accepted for interface parity with approximate indexes and ignored here.
+        """
+        if self.size == 0 or top_n <= 0:
+            return []
+        query = normalize(query_embedding)
+        if query is None or query.shape[0] != self.dim:
+            return []
+
+        scores = self._matrix[:self.size] @ query
+        positions = None
+        mask = self._filter_mask(activity_type, source)
+        if mask is not None:
+            positions = np.flatnonzero(mask)
+            scores = scores[positions]
+        return self._top_k(scores, positions, top_n)
+
+    def _top_k(self, scores, positions, top_n):
+        k = min(top_n, scores.shape[0])
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        if positions is not None:
+            row_positions = positions[top]
+        else:
+            row_positions = top
+        return [
+            (int(self._ids[position]), float(score))
+            for position, score in zip(row_positions, scores[top])
+        ]
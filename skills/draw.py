@@ -1,3 +1,4 @@
+import io
 import os
 import re
 import time
@@ -5,9 +6,9 @@ import random
 from pathlib import Path
 from PIL import Image
 import cairosvg
-import litellm
-from openai import AsyncOpenAI
 import asyncio
+from framework.executors import run_cpu
+from framework import llm_gateway
 
 IMAGES_DIR = Path("static/images")
 IMAGES_DIR.mkdir(parents=True, exist_ok=True)
@@ -50,6 +51,14 @@ BASE_UNICORN_SVG = """
 </svg>
 """
 
+def render_svg_to_jpeg(svg_code: str, output_path: str, quality: int = 95) -> str:
+    """Rasterise SVG source to a JPEG. CPU-bound; call it through run_cpu."""
+    png_data = cairosvg.svg2png(bytestring=svg_code.encode('utf-8'))
+    with Image.open(io.BytesIO(png_data)) as img:
+        img = img.convert('RGB')
+        img.save(output_path, 'JPEG', quality=quality)
+    return output_path
+
 async def generate_pippin_drawing(scene_description: str, api_key_openai: str, output_path: str = None) -> str:
     """
     Generate a whimsical drawing (JPEG) from a provided scene description, with dynamic use of the base unicorn SVG.
@@ -58,8 +67,6 @@ async def generate_pippin_drawing(scene_description: str, api_key_openai: str, o
         print("OpenAI API key not found. Cannot generate drawing.")
         return None
 
-    client = AsyncOpenAI(api_key=api_key_openai)
-
     # Decide whether to include the base unicorn SVG (50% probability)
     include_base_unicorn = random.choice([True, False])
 
@@ -74,7 +81,9 @@ async def generate_pippin_drawing(scene_description: str, api_key_openai: str, o
     Style: [suggested art style for the illustration]
     Key Elements: [comma-separated list of important visual elements]"""
 
-    scene_response = await client.chat.completions.create(
+    scene_response = await llm_gateway.chat(
+        api_key=api_key_openai,
+        cache='always',
         model="gpt-4-turbo-preview",
         messages=[
             {"role": "system", "content": system_msg},
@@ -113,7 +122,7 @@ Requirements:
 - Respond ONLY with the SVG code.
 """
 
-    svg_response = litellm.completion(
+    svg_response = await llm_gateway.litellm_completion(
         model="o1-mini",
         messages=[{"content": svg_prompt, "role": "user"}]
     )
@@ -134,23 +143,7 @@ Requirements:
     else:
         output_path = str(IMAGES_DIR / output_path)
 
-    temp_svg = IMAGES_DIR / f"temp_{timestamp}.svg"
-    temp_png = IMAGES_DIR / f"temp_{timestamp}.png"
-
-    # Save SVG
-    with open(temp_svg, 'w') as f:
-        f.write(svg_code)
-
-    # Convert SVG to PNG
-    cairosvg.svg2png(url=str(temp_svg), write_to=str(temp_png))
-
-    # Convert PNG to JPEG using PIL
-    with Image.open(temp_png) as img:
-        img = img.convert('RGB')
-        img.save(output_path, 'JPEG', quality=95)
-
-    # Clean up
-    temp_svg.unlink(missing_ok=True)
-    temp_png.unlink(missing_ok=True)
+    # Rasterise in a worker process; cairosvg holds the GIL for the whole render.
+    await run_cpu(render_svg_to_jpeg, svg_code, output_path)
 
     return output_path
@@ -1,11 +1,14 @@
 import os
 import json
+import asyncio
+import httpx
 from PIL import Image, ImageDraw
-from openai import OpenAI
 from io import BytesIO
-import requests
 from pydantic import BaseModel
 import math
+from framework.executors import run_cpu
+from framework import llm_gateway
+from framework.tracing import start_span
 
 class PippinPosition(BaseModel):
     x: float
@@ -186,20 +189,59 @@ def create_pippin_image(size=(250, 250)):
 
     return image
 
-def generate_pippin_image(description: str, api_key: str, output_path: str = "pippin_scene.png"):
+def composite_pippin(background_data: bytes, position: dict, output_path: str) -> str:
+    """Paste Pippin onto the downloaded background and save it. CPU-bound; call it through run_cpu."""
+    background_image = Image.open(BytesIO(background_data))
+    print("Creating Pippin image...")
+    # Create Pippin at larger size for better quality
+    pippin_image = create_pippin_image((500, 500))
+    print("Successfully created Pippin image")
+
+    # Calculate Pippin's size and position
+    bg_width, bg_height = background_image.size
+    position = PippinPosition(**position)
+    print(f"Background image size: {bg_width}x{bg_height}")
+    print(f"Pippin original size: {pippin_image.size}")
+
+    # Calculate new size for Pippin
+    desired_width = int(bg_width * position.size)
+    ratio = desired_width / pippin_image.size[0]
+    new_size = (desired_width, int(pippin_image.size[1] * ratio))
+    print(f"Calculated new size for Pippin: {new_size}")
+
+    # Resize Pippin
+    pippin_image = pippin_image.resize(new_size, Image.Resampling.LANCZOS)
+    print("Successfully resized Pippin")
+
+    # Rotate Pippin
+    print(f"Rotating Pippin by {position.rotation} degrees...")
+    pippin_image = pippin_image.rotate(-position.rotation, expand=True, resample=Image.Resampling.BICUBIC)
+    print("Successfully rotated Pippin")
+
+    # Calculate final position
+    x_pos = int(position.x * bg_width - pippin_image.size[0] / 2)
+    y_pos = int(position.y * bg_height - pippin_image.size[1] / 2)
+    print(f"Final position calculated - x: {x_pos}, y: {y_pos}")
+
+    # Create a new image with transparency
+    final_image = background_image.copy()
+
+    # Paste Pippin onto the background
+    print("Pasting Pippin onto background...")
+    final_image.paste(pippin_image, (x_pos, y_pos), pippin_image)
+
+    # Save the final image
+    print(f"Saving final image to: {output_path}")
+    final_image.save(output_path)
+    print("Image saved successfully")
+    return output_path
+
+async def generate_pippin_image(description: str, api_key: str, output_path: str = "pippin_scene.png"):
     """
     Generates an image with Pippin the unicorn placed in a scene based on the description.
     """
     print("Starting image generation process...")
 
-    # Initialize OpenAI client
-    try:
-        client = OpenAI(api_key=api_key)
-        print("OpenAI client initialized successfully")
-    except Exception as e:
-        print(f"Error initializing OpenAI client: {e}")
-        raise
-
     try:
         print("Requesting scene description from GPT-4...")
         import random
@@ -223,7 +265,8 @@ def generate_pippin_image(description: str, api_key: str, output_path: str = "pi
         random_style = random.choice(art_styles)
 
         print("Requesting scene description from GPT-4...")
-        completion = client.beta.chat.completions.parse(
+        completion = await llm_gateway.parse(
+            api_key=api_key,
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": f"""
@@ -253,7 +296,8 @@ def generate_pippin_image(description: str, api_key: str, output_path: str = "pi
     try:
         # Generate the background image using DALL-E
         print("Requesting image generation from DALL-E...")
-        image_response = client.images.generate(
+        image_response = await llm_gateway.generate_image(
+            api_key=api_key,
             model="dall-e-3",
             prompt=scene_data.image_prompt,
             size="1024x1024",
@@ -265,58 +309,22 @@ def generate_pippin_image(description: str, api_key: str, output_path: str = "pi
         # Download the generated image
         background_image_url = image_response.data[0].url
         print(f"Downloading background image from URL: {background_image_url}")
-        background_image_response = requests.get(background_image_url)
-        background_image = Image.open(BytesIO(background_image_response.content))
-        print("Successfully downloaded and opened background image")
+        with start_span("http GET dalle image"):
+            async with httpx.AsyncClient(timeout=httpx.Timeout(60.0, connect=10.0)) as http:
+                background_image_response = await http.get(background_image_url)
+                background_image_response.raise_for_status()
+        print("Successfully downloaded background image")
 
     except Exception as e:
         print(f"Error in DALL-E image generation/download: {e}")
         raise
 
     try:
-        print("Creating Pippin image...")
-        # Create Pippin at larger size for better quality
-        pippin_image = create_pippin_image((500, 500))
-        print("Successfully created Pippin image")
-
-        # Calculate Pippin's size and position
-        bg_width, bg_height = background_image.size
-        position = scene_data.pippin_position
-        print(f"Background image size: {bg_width}x{bg_height}")
-        print(f"Pippin original size: {pippin_image.size}")
-
-        # Calculate new size for Pippin
-        desired_width = int(bg_width * position.size)
-        ratio = desired_width / pippin_image.size[0]
-        new_size = (desired_width, int(pippin_image.size[1] * ratio))
-        print(f"Calculated new size for Pippin: {new_size}")
-
-        # Resize Pippin
-        pippin_image = pippin_image.resize(new_size, Image.Resampling.LANCZOS)
-        print("Successfully resized Pippin")
-
-        # Rotate Pippin
-        print(f"Rotating Pippin by {position.rotation} degrees...")
-        pippin_image = pippin_image.rotate(-position.rotation, expand=True, resample=Image.Resampling.BICUBIC)
-        print("Successfully rotated Pippin")
-
-        # Calculate final position
-        x_pos = int(position.x * bg_width - pippin_image.size[0] / 2)
-        y_pos = int(position.y * bg_height - pippin_image.size[1] / 2)
-        print(f"Final position calculated - x: {x_pos}, y: {y_pos}")
-
-        # Create a new image with transparency
-        final_image = background_image.copy()
-
-        # Paste Pippin onto the background
-        print("Pasting Pippin onto background...")
-        final_image.paste(pippin_image, (x_pos, y_pos), pippin_image)
-
-        # Save the final image
-        print(f"Saving final image to: {output_path}")
-        final_image.save(output_path)
-        print("Image saved successfully")
-
+        # Resizing, rotating and encoding a 1024px image is CPU work; keep it off the event loop.
+        await run_cpu(
+            composite_pippin, background_image_response.content,
+            scene_data.pippin_position.model_dump(), output_path
+        )
     except Exception as e:
         print(f"Error during image processing: {e}")
         raise
@@ -329,7 +337,7 @@ if __name__ == "__main__":
         print("Starting script execution...")
         api_key = os.environ['OPENAI_API_KEY']
         description = "Pippin in the royal court of King Henry VIII"
-        output = generate_pippin_image(description, api_key)
+        output = asyncio.run(generate_pippin_image(description, api_key))
         print(f"Script completed successfully. Output saved to: {output}")
     except Exception as e:
         print(f"Script failed with error: {e}")
\ No newline at end of file
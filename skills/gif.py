@@ -1,3 +1,4 @@
+import io
 import re
 import time
 import os
@@ -5,9 +6,9 @@ import cairosvg
 from PIL import Image
 from pathlib import Path
 import asyncio
-from openai import AsyncOpenAI
-import litellm
 from lxml import etree as ET
+from framework.executors import run_cpu
+from framework import llm_gateway
 
 IMAGES_DIR = Path("static/images")
 IMAGES_DIR.mkdir(parents=True, exist_ok=True)
@@ -120,6 +121,23 @@ def build_transform(transform_type, values):
             return f"skewY({values[0]})"
     return ""
 
+def render_svg_frames_to_gif(frame_svgs, output_path, frame_duration_ms):
+    """Rasterise each SVG frame and write an animated GIF. CPU-bound; call it through run_cpu."""
+    frames = []
+    for frame_svg in frame_svgs:
+        png_data = cairosvg.svg2png(bytestring=frame_svg.encode('utf-8'))
+        with Image.open(io.BytesIO(png_data)) as img:
+            frames.append(img.convert("RGB"))
+
+    frames[0].save(
+        output_path,
+        save_all=True,
+        append_images=frames[1:],
+        duration=frame_duration_ms,
+        loop=0
+    )
+    return output_path
+
 async def generate_animated_unicorn(scene_description: str, api_key_openai: str, output_path: str = None) -> str:
     """
     Generate a whimsical animated unicorn GIF from a provided scene description.
@@ -136,8 +154,6 @@ async def generate_animated_unicorn(scene_description: str, api_key_openai: str,
         print("OpenAI API key not found. Cannot generate animated unicorn.")
         return None
 
-    client = AsyncOpenAI(api_key=api_key_openai)
-
     # Extract scene info
     system_msg = "You are an assistant that extracts details to create a whimsical animated unicorn scene."
     user_msg = f"""Given this memory, describe how to depict a unicorn in a whimsical, animated illustration:
@@ -150,7 +166,9 @@ Style: [children's book, whimsical]
 Animated Elements: [which parts move and how, numeric or color attributes]
 """
 
-    scene_response = await client.chat.completions.create(
+    scene_response = await llm_gateway.chat(
+        api_key=api_key_openai,
+        cache='always',
         model="gpt-4-turbo-preview",
         messages=[
             {"role": "system", "content": system_msg},
@@ -215,7 +233,7 @@ Requirements:
 - Respond ONLY with the updated SVG code.
 """
 
-    svg_response = litellm.completion(
+    svg_response = await llm_gateway.litellm_completion(
         model="o1-mini",
         messages=[{"content": svg_prompt, "role": "user"}]
     )
@@ -287,7 +305,7 @@ Requirements:
 
     num_frames = 10
     frame_duration = 0.1
-    frames_data = []
+    frame_svgs = []
 
     for i in range(num_frames):
         t = i / (num_frames - 1) if num_frames > 1 else 0.0
@@ -344,27 +362,9 @@ Requirements:
                         else:
                             anim['element'].set(anim['attributeName'], str(vals[0]))
 
-        frame_svg_code = ET.tostring(root, encoding='unicode')
-        temp_svg = IMAGES_DIR / f"debug_unicorn_{time.time()}_frame_{i}.svg"
-        with open(temp_svg, 'w') as f:
-            f.write(frame_svg_code)
+        frame_svgs.append(ET.tostring(root, encoding='unicode'))
 
-        temp_png = IMAGES_DIR / f"debug_unicorn_{time.time()}_frame_{i}.png"
-        cairosvg.svg2png(url=str(temp_svg), write_to=str(temp_png))
-
-        with Image.open(temp_png) as img:
-            frames_data.append(img.convert("RGB"))
-
-        temp_svg.unlink(missing_ok=True)
-        temp_png.unlink(missing_ok=True)
-
-    # Create GIF
-    frames_data[0].save(
-        output_path,
-        save_all=True,
-        append_images=frames_data[1:],
-        duration=int(frame_duration * 1000),
-        loop=0
-    )
+    # Rasterising ten frames takes seconds of CPU; do it in a worker process.
+    await run_cpu(render_svg_frames_to_gif, frame_svgs, output_path, int(frame_duration * 1000))
 
     return output_path
@@ -1,80 +1,127 @@
 // static/logs.js
 
-var allLogs = [];
+// Logs are fetched a page at a time, newest first, filtered on the server.
+var PAGE_SIZE = 100;
+var nextCursor = null;
+var loading = false;
+var exhausted = false;
+var generation = 0;
+var searchTimer = null;
 
 document.addEventListener('DOMContentLoaded', async function() {
-    await loadLogs();
     setupFilters();
+    await loadFilterOptions();
+    setupInfiniteScroll();
+    await resetLogs();
 });
 
-async function loadLogs() {
+function currentFilters() {
+    var params = new URLSearchParams();
+    var searchQuery = document.getElementById('search-input').value.trim();
+    var selectedActivity = document.getElementById('activity-filter').value;
+    var selectedSource = document.getElementById('source-filter').value;
+    if (searchQuery) params.set('q', searchQuery);
+    if (selectedActivity) params.set('activity', selectedActivity);
+    if (selectedSource) params.set('source', selectedSource);
+    return params;
+}
+
+async function resetLogs() {
+    generation += 1;
+    nextCursor = null;
+    exhausted = false;
+    loading = false;
+    document.getElementById('logs-body').innerHTML = '';
+    updateCount();
+    await loadNextPage();
+}
+
+async function loadNextPage() {
+    if (loading || exhausted) return;
+    loading = true;
+    var requested = generation;
     try {
-        let response = await fetch('/api/logs');
-        allLogs = await response.json();
-        populateFilters(allLogs);
-        updateLogsTable(allLogs);
+        var params = currentFilters();
+        params.set('order', 'desc');
+        params.set('limit', PAGE_SIZE);
+        if (nextCursor !== null) params.set('before_id', nextCursor);
+
+        let response = await fetch('/api/logs?' + params.toString());
+        let page = await response.json();
+        if (requested !== generation) return;  // Filters changed while this page was in flight.
+
+        appendLogs(page.logs);
+        nextCursor = page.next_cursor;
+        exhausted = nextCursor === null;
     } catch (e) {
         console.error('Error loading logs:', e);
+    } finally {
+        if (requested === generation) loading = false;
+    }
+    // Keep filling until the sentinel is pushed below the fold.
+    if (requested === generation && !exhausted && sentinelVisible()) {
+        await loadNextPage();
     }
 }
 
-function setupFilters() {
-    document.getElementById('search-input').addEventListener('input', applyFilters);
-    document.getElementById('activity-filter').addEventListener('change', applyFilters);
-    document.getElementById('source-filter').addEventListener('change', applyFilters);
+async function updateCount() {
+    var requested = generation;
+    try {
+        let response = await fetch('/api/logs/count?' + currentFilters().toString());
+        let data = await response.json();
+        if (requested === generation) {
+            document.getElementById('logs-count').textContent = data.count + ' logs';
+        }
+    } catch (e) {
+        console.error('Error counting logs:', e);
+    }
 }
 
-function applyFilters() {
-    var searchQuery = document.getElementById('search-input').value.toLowerCase();
-    var selectedActivity = document.getElementById('activity-filter').value;
-    var selectedSource = document.getElementById('source-filter').value;
-
-    var filteredLogs = allLogs.filter(function(log) {
-        var matchesSearch = !searchQuery || (
-            (log.activity && log.activity.toLowerCase().includes(searchQuery)) ||
-            (log.result && log.result.toLowerCase().includes(searchQuery)) ||
-            (log.source && log.source.toLowerCase().includes(searchQuery)) ||
-            (formatStateChanges(log.state_changes).toLowerCase().includes(searchQuery))
-        );
+function setupInfiniteScroll() {
+    var observer = new IntersectionObserver(function(entries) {
+        if (entries.some(entry => entry.isIntersecting)) {
+            loadNextPage();
+        }
+    }, {rootMargin: '400px'});
+    observer.observe(document.getElementById('logs-sentinel'));
+}
 
-        var matchesActivity = !selectedActivity || (log.activity && log.activity === selectedActivity);
-        var matchesSource = !selectedSource || (log.source && log.source === selectedSource);
+function sentinelVisible() {
+    var rect = document.getElementById('logs-sentinel').getBoundingClientRect();
+    return rect.top < window.innerHeight + 400;
+}
 
-        return matchesSearch && matchesActivity && matchesSource;
+function setupFilters() {
+    document.getElementById('search-input').addEventListener('input', function() {
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(resetLogs, 300);
     });
-
-    updateLogsTable(filteredLogs);
+    document.getElementById('activity-filter').addEventListener('change', resetLogs);
+    document.getElementById('source-filter').addEventListener('change', resetLogs);
 }
 
-function populateFilters(logs) {
-    // Populate activity filter options
-    var activitySet = new Set();
-    logs.forEach(item => {
-        if (item.activity) {
-            activitySet.add(item.activity);
-        }
-    });
+async function loadFilterOptions() {
+    try {
+        let response = await fetch('/api/logs/filters');
+        populateFilters(await response.json());
+    } catch (e) {
+        console.error('Error loading log filters:', e);
+    }
+}
 
+function populateFilters(options) {
     var activityFilter = document.getElementById('activity-filter');
     activityFilter.innerHTML = '<option value="">All Activities</option>';
-    Array.from(activitySet).sort().forEach(act => {
+    options.activities.forEach(act => {
         var opt = document.createElement('option');
         opt.value = act;
         opt.textContent = capitalizeFirstLetter(act);
         activityFilter.appendChild(opt);
     });
 
-    // Populate source filter options
-    var sourceSet = new Set();
-    logs.forEach(item => {
-        if (item.source) {
-            sourceSet.add(item.source);
-        }
-    });
-
     var sourceFilter = document.getElementById('source-filter');
     sourceFilter.innerHTML = '<option value="">All Sources</option>';
-    Array.from(sourceSet).sort().forEach(src => {
+    options.sources.forEach(src => {
         var opt = document.createElement('option');
         opt.value = src;
         opt.textContent = capitalizeFirstLetter(src);
@@ -82,9 +129,8 @@ function populateFilters(logs) {
     });
 }
 
-function updateLogsTable(logs) {
+function appendLogs(logs) {
     var logsBody = document.getElementById('logs-body');
-    logsBody.innerHTML = '';
 
     logs.forEach(function(item) {
         var row = document.createElement('tr');
@@ -2,40 +2,126 @@
 
 var ws_scheme = window.location.protocol == "https:" ? "wss" : "ws";
 var ws_path = ws_scheme + '://' + window.location.host + "/ws";
-var ws = new WebSocket(ws_path);
+var ws = null;
 
 var currentActivityStartTime = null;
 var activityDurationInterval = null;
 
-ws.onopen = function() {
-    console.log("WebSocket connection established");
+// Client-side copy of the dashboard, kept current by protocol v1 snapshots and deltas.
+var streamId = null;
+var lastSeq = null;
+var historySize = 10;
+var dashboard = {
+    current_activity: {},
+    state: {},
+    activity_history: [],
+    summary: {}
 };
 
-ws.onmessage = function(event) {
-    var data = JSON.parse(event.data);
-    updateDashboard(data);
-};
+function connect() {
+    var url = ws_path;
+    if (streamId !== null && lastSeq !== null) {
+        url += '?stream=' + encodeURIComponent(streamId) + '&since=' + lastSeq;
+    }
+    ws = new WebSocket(url);
 
-ws.onerror = function(error) {
-    console.error('WebSocket Error: ', error);
-};
+    ws.onopen = function() {
+        console.log("WebSocket connection established");
+    };
+
+    ws.onmessage = function(event) {
+        handleMessage(JSON.parse(event.data));
+    };
 
-function updateDashboard(data) {
-    // Update current activity
-    updateCurrentActivity(data.current_activity);
+    ws.onerror = function(error) {
+        console.error('WebSocket Error: ', error);
+    };
 
-    // Update character stats
-    updateStats(data.state);
+    // The server drops clients that fall behind; reconnecting resumes from lastSeq.
+    ws.onclose = function() {
+        setTimeout(connect, 1000);
+    };
+}
+
+connect();
 
-    // Update activity history
-    console.log("activity history");
-    console.log("data.activity_history");
-    updateSummaryTable(data.summary_data);
-    updateHistoryTable(data.activity_history);
+// Event loop health is polled; it changes every tick and isn't worth a delta.
+var LOOP_LAG_POLL_MS = 5000;
 
-   // Update 24-hour summary
-    console.log("summary table");
-    console.log("data.summary_data");
+async function refreshLoopHealth() {
+    try {
+        let response = await fetch('/api/loop_lag');
+        updateLoopHealth(await response.json());
+    } catch (e) {
+        console.error('Error loading loop lag:', e);
+    }
+}
+
+refreshLoopHealth();
+setInterval(refreshLoopHealth, LOOP_LAG_POLL_MS);
+
+function handleMessage(message) {
+    if (message.type === 'snapshot') {
+        applySnapshot(message);
+    } else if (message.type === 'delta') {
+        if (message.stream !== streamId || message.seq !== lastSeq + 1) {
+            // Missed an update (or the server restarted): reconnect to resync.
+            ws.close();
+            return;
+        }
+        applyDelta(message);
+    } else {
+        return;
+    }
+    streamId = message.stream;
+    lastSeq = message.seq;
+}
+
+function applySnapshot(snapshot) {
+    historySize = snapshot.history_size || historySize;
+    dashboard.current_activity = snapshot.current_activity || {};
+    dashboard.state = snapshot.state || {};
+    dashboard.activity_history = snapshot.activity_history || [];
+    dashboard.summary = {};
+    (snapshot.summary_data || []).forEach(function(item) {
+        dashboard.summary[item.activity] = item;
+    });
+
+    updateCurrentActivity(dashboard.current_activity);
+    updateStats(dashboard.state);
+    updateSummaryTable(summaryRows());
+    updateHistoryTable(dashboard.activity_history);
+}
+
+function applyDelta(delta) {
+    if (delta.current_activity) {
+        Object.assign(dashboard.current_activity, delta.current_activity);
+        updateCurrentActivity(dashboard.current_activity);
+    }
+    if (delta.state) {
+        Object.assign(dashboard.state, delta.state);
+        updateStats(dashboard.state);
+    }
+    if (delta.summary) {
+        Object.entries(delta.summary).forEach(([activity, entry]) => {
+            if (entry === null) {
+                delete dashboard.summary[activity];
+            } else {
+                dashboard.summary[activity] = Object.assign({activity: activity}, entry);
+            }
+        });
+        updateSummaryTable(summaryRows());
+    }
+    if (delta.logs) {
+        var seen = new Set(dashboard.activity_history.map(item => item.id));
+        var fresh = delta.logs.filter(item => !seen.has(item.id)).reverse();
+        dashboard.activity_history = fresh.concat(dashboard.activity_history).slice(0, historySize);
+        updateHistoryTable(dashboard.activity_history);
+    }
+}
+
+function summaryRows() {
+    return Object.keys(dashboard.summary).sort().map(activity => dashboard.summary[activity]);
 }
 
 function updateCurrentActivity(activity) {
@@ -88,6 +174,30 @@ function updateStatWithAnimation(elementId, newValue) {
     }
 }
 
+function updateLoopHealth(stats) {
+    document.getElementById("loop-lag-p50").textContent = formatMs(stats.recent.p50_ms);
+    document.getElementById("loop-lag-p99").textContent = formatMs(stats.recent.p99_ms);
+    document.getElementById("loop-lag-max").textContent = formatMs(stats.recent.max_ms);
+    document.getElementById("loop-stalls").textContent =
+        stats.stalls_total + ' (' + stats.stalled_seconds_total.toFixed(1) + 's blocked)';
+
+    var last = stats.recent_stalls[0];
+    var lastStall = document.getElementById("loop-last-stall");
+    if (!last) {
+        lastStall.textContent = 'None';
+        return;
+    }
+    var where = last.stack.length ? last.stack[last.stack.length - 1] : 'unknown';
+    lastStall.textContent = formatMs(last.lag_ms) + ' in ' + capitalizeFirstLetter(last.activity || 'no activity') +
+        ' at ' + new Date(last.started_at * 1000).toLocaleTimeString();
+    lastStall.title = last.stack.join('\n') || where;
+}
+
+function formatMs(ms) {
+    if (ms === null || ms === undefined) return 'N/A';
+    return ms >= 1000 ? (ms / 1000).toFixed(1) + 's' : Math.round(ms) + 'ms';
+}
+
 function updateSummaryTable(summary) {
     console.log("updateSummaryTable")
     var summaryBody = document.getElementById("summary-body");